@@ -0,0 +1,320 @@
+"""
+Бенчмарк горячих путей менеджера на синтетической библиотеке.
+
+    python -m benchmarks.run --scale 1k --output results.json
+    python -m benchmarks.run --scale 100k --compare results_old.json
+
+Все данные (папка игры, архивы, библиотека, SQLite БД) создаются во временной папке
+и удаляются после прогона (если не указан --keep).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synth import SCALES, make_game_root, make_mod_archives, dir_size  # noqa: E402
+
+RESULTS_FORMAT = 1
+
+# Потолок пикового прироста памяти Python (tracemalloc) за полную синхронизацию.
+# Синхронизация потоковая, поэтому потолок не зависит от масштаба (--scale)
+SYNC_MEMORY_CEILING_MB = 48
+
+
+class QuietLogger:
+    """Логгер-заглушка с интерфейсом UILogger: сообщения уровня error/warning копит для отчета."""
+
+    def __init__(self):
+        self.problems = []
+
+    def log(self, message, level="info", progress=None):
+        if level in ("error", "warning"):
+            self.problems.append(f"{level}: {message}")
+
+
+class Bench:
+    def __init__(self, workdir, scale):
+        self.workdir = Path(workdir)
+        self.scale = scale
+        self.logger = QuietLogger()
+        self.results = {}
+        self.config = None
+        self.archives = []
+
+    def measure(self, name, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            info = func(*args, **kwargs) or {}
+            status = info.pop("status", "ok")
+        except Exception as e:
+            info, status = {"error": f"{type(e).__name__}: {e}"}, "error"
+        elapsed = time.perf_counter() - t0
+        self.results[name] = {"status": status, "seconds": round(elapsed, 4), **info}
+        print(f"  {name:<16} {status:<8} {elapsed:9.3f}s  {info if info else ''}", file=sys.stderr)
+        return status == "ok"
+
+    # --- Подготовка ---
+
+    def prepare(self):
+        from core.config import ConfigManager
+
+        t0 = time.perf_counter()
+        self.game_root = make_game_root(self.workdir / "game", self.scale)
+        self.second_root = make_game_root(self.workdir / "game_b", "1k", seed=7)
+        self.archives = make_mod_archives(self.workdir / "archives", self.scale)
+        self.results["generate"] = {"status": "ok", "seconds": round(time.perf_counter() - t0, 4),
+                                    "archives": len(self.archives)}
+
+        self.config = ConfigManager(app_data_dir=str(self.workdir / "appdata"))
+        ok, msg = self.config.set_game_path(str(self.game_root))
+        if not ok:
+            raise RuntimeError(msg)
+        self.config.set_library_path(str(self.workdir / "library"))
+
+    # --- Сценарии ---
+
+    def bench_import(self):
+        from core.importer import ModImporter
+
+        imported = 0
+        for archive in self.archives:
+            with ModImporter(self.config, self.logger) as importer:
+                preview = importer.step1_prepare_preview(str(archive))
+                if not preview:
+                    return {"status": "skipped", "reason": "extraction failed (no 7z / fallback extractor?)"}
+                if importer.step2_confirm_import(preview["temp_id"]):
+                    imported += 1
+        return {"mods": imported, "library_bytes": dir_size(self.config.library_path)}
+
+    def bench_analyze(self):
+        from core.analyzer import ModAnalyzer
+        from core.database import Mod
+
+        with self.config.read_session() as session:
+            paths = [mod.storage_path for mod in session.query(Mod)]
+        if not paths:
+            return {"status": "skipped", "reason": "no imported mods"}
+        for path in paths:
+            ModAnalyzer(path).analyze()
+        return {"mods": len(paths)}
+
+    def _set_all_enabled(self, enabled):
+        from core.database import Mod
+
+        with self.config.session_scope() as session:
+            mods = session.query(Mod).order_by(Mod.id).all()
+            for index, mod in enumerate(mods):
+                mod.is_enabled = enabled
+                mod.priority = index
+            return len(mods)
+
+    def bench_sync(self):
+        from core.database import InstalledFile
+        from core.installer import ModInstaller
+
+        if not self._set_all_enabled(True):
+            return {"status": "skipped", "reason": "no imported mods"}
+
+        with ModInstaller(self.config, self.logger) as installer:
+            t0 = time.perf_counter()
+            installer.sync_state()
+            cold = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            installer.sync_state()
+            noop = time.perf_counter() - t0
+
+        with self.config.read_session() as session:
+            installed = session.query(InstalledFile).count()
+        return {"cold_seconds": round(cold, 4), "noop_seconds": round(noop, 4), "installed": installed}
+
+    def bench_sync_memory(self):
+        """Пик памяти при полном снятии и полной установке всех модов — должен быть ограничен."""
+        import tracemalloc
+        from core.installer import ModInstaller
+
+        peaks = {}
+        for label, enabled in (("remove_all", False), ("install_all", True)):
+            if not self._set_all_enabled(enabled):
+                return {"status": "skipped", "reason": "no imported mods"}
+            tracemalloc.start()
+            try:
+                with ModInstaller(self.config, self.logger) as installer:
+                    installer.sync_state()
+                peaks[label] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        peak_mb = max(peaks.values()) / 1024 / 1024
+        info = {f"{k}_peak_mb": round(v / 1024 / 1024, 2) for k, v in peaks.items()}
+        info["ceiling_mb"] = SYNC_MEMORY_CEILING_MB
+        if peak_mb > SYNC_MEMORY_CEILING_MB:
+            info["status"] = "error"
+            info["error"] = f"peak {peak_mb:.1f} MB exceeds ceiling"
+        return info
+
+    def bench_conflicts(self):
+        from core.installer import ModInstaller
+
+        with ModInstaller(self.config, self.logger) as installer:
+            conflicts = installer.list_conflicts()
+        return {"conflicting_mods": len(conflicts)}
+
+    def bench_mod_list(self):
+        from core.mod_list import ModListQuery
+
+        with self.config.read_session() as session:
+            query = ModListQuery(session)
+            page = query.page(limit=100, sort="name")
+            query.page(limit=100, search="mod", sort="date", descending=True)
+            query.changes_since(0)
+        return {"total": page["total"]}
+
+    def bench_search(self):
+        from core.database import ModFile
+        from core.search import LibrarySearch
+
+        with self.config.read_session() as session:
+            sample = session.query(ModFile.target_game_path).filter(
+                ModFile.target_game_path.isnot(None)).first()
+            if not sample:
+                return {"status": "skipped", "reason": "no imported files"}
+            search = LibrarySearch(session)
+            result = search.search(sample[0])
+            search.search("mod")
+        return {"engine": result["engine"], "hits": len(result["results"])}
+
+    def bench_profile_switch(self):
+        from core.profiles import ProfileManager
+
+        with ProfileManager(self.config) as profiles:
+            ok, msg = profiles.switch(str(self.second_root))
+            if not ok:
+                return {"status": "error", "error": msg}
+            ok, msg = profiles.switch(str(self.game_root))
+        return {} if ok else {"status": "error", "error": msg}
+
+    def bench_hof_scan(self):
+        from core.hof_tools import HofTools
+
+        with HofTools(self.config, self.logger) as tools:
+            buses = tools.scan_for_buses()
+            found = tools.scan_existing_game_hofs()
+        self._found_hofs = found
+        return {"buses": len(buses), "game_hofs": len(found)}
+
+    def bench_hof_inject(self):
+        from core.database import HofFile
+        from core.hof_tools import HofTools
+
+        with HofTools(self.config, self.logger) as tools:
+            tools.import_game_hofs(getattr(self, "_found_hofs", []))
+            hof_ids = [h.id for h in tools.session.query(HofFile).limit(20)]
+            buses = [b["folder"] for b in tools.scan_for_buses()]
+            if not hof_ids or not buses:
+                return {"status": "skipped", "reason": "no HOFs or buses"}
+
+            t0 = time.perf_counter()
+            tools.install_hofs_to_buses(hof_ids, buses)
+            inject = time.perf_counter() - t0
+            tools.uninstall_all_hofs()
+        return {"links": len(hof_ids) * len(buses), "inject_seconds": round(inject, 4)}
+
+    def run(self):
+        self.prepare()
+        self.measure("import", self.bench_import)
+        self.measure("analyze", self.bench_analyze)
+        self.measure("sync", self.bench_sync)
+        self.measure("sync_memory", self.bench_sync_memory)
+        self.measure("conflicts", self.bench_conflicts)
+        self.measure("mod_list", self.bench_mod_list)
+        self.measure("search", self.bench_search)
+        self.measure("profile_switch", self.bench_profile_switch)
+        self.measure("hof_scan", self.bench_hof_scan)
+        self.measure("hof_inject", self.bench_hof_inject)
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=Path(__file__).resolve().parent, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current, baseline_path):
+    """Печатает отношение времени к базовому прогону (>1.0 — медленнее)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"Compare with {baseline.get('revision')} ({baseline.get('scale')}):", file=sys.stderr)
+    for name, res in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("seconds") or res.get("status") != "ok":
+            continue
+        ratio = res["seconds"] / old["seconds"]
+        flag = "  <-- REGRESSION" if ratio > 1.2 else ""
+        print(f"  {name:<16} {old['seconds']:9.3f}s -> {res['seconds']:9.3f}s  x{ratio:.2f}{flag}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OMSI 2 Mod Manager benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--workdir", help="Папка для данных (по умолчанию временная)")
+    parser.add_argument("--keep", action="store_true", help="Не удалять данные после прогона")
+    parser.add_argument("--output", help="Куда сохранить JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="omsi_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    print(f"Benchmark scale={args.scale} workdir={workdir}", file=sys.stderr)
+
+    bench = Bench(workdir, args.scale)
+    try:
+        bench.run()
+    finally:
+        # Фоновые хеширование бэкапов и корзина доделываются до отчета и удаления папки
+        from core.backups import hasher
+        from core.perf import perf
+        from core.trash import purger
+        hasher.wait()
+        purger.wait()
+        operations = perf.read_recent(1000)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "format": RESULTS_FORMAT,
+        "revision": _git_revision(),
+        "scale": args.scale,
+        "scale_params": SCALES[args.scale],
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "results": bench.results,
+        "operations": operations,
+        "problems": bench.logger.problems[:100],
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Генератор синтетических OMSI-подобных данных для бенчмарков.
+Все размеры детерминированы seed'ом, поэтому результаты сравнимы между версиями.
+"""
+import os
+import random
+import zipfile
+from pathlib import Path
+
+# Пресеты масштаба: файлы в папке игры, автобусы, HOF на автобус, моды, файлов на мод,
+# из них общих для всех модов с корнем игры (пересечения есть на любом масштабе)
+SCALES = {
+    "1k": {"game_files": 1_000, "buses": 10, "hofs_per_bus": 2, "mods": 5, "files_per_mod": 100, "depth": 4,
+           "shared_files": 10},
+    "100k": {"game_files": 100_000, "buses": 200, "hofs_per_bus": 3, "mods": 50, "files_per_mod": 2_000, "depth": 6,
+             "shared_files": 50},
+    "1m": {"game_files": 1_000_000, "buses": 1_000, "hofs_per_bus": 3, "mods": 200, "files_per_mod": 5_000, "depth": 8,
+           "shared_files": 100},
+}
+
+# Папка игры, в которую пишут общие файлы все моды с корнем игры
+SHARED_DIR = "Vehicles/Bus_0000/texture"
+
+BUS_TEMPLATE = """[friendlyname]
+{maker}
+{model}
+Bus {idx}
+
+[passengercabin]
+model\\passengercabin.cfg
+
+[script]
+3
+script\\antrieb.osc
+script\\engine.osc
+script\\cockpit.osc
+"""
+
+AI_TEMPLATE = """[friendlyname]
+AI
+Traffic {idx}
+
+[ai_cars]
+"""
+
+HOF_TEMPLATE = """[name]
+Synthetic HOF {idx}
+
+[addterminus]
+0
+Terminus {idx} A
+
+[addterminus]
+0
+Terminus {idx} B
+
+[infosystem_busstop_list]
+{stops}
+{stop_names}
+"""
+
+PAYLOAD = b"x" * 64
+
+
+def _write(path, data=PAYLOAD):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _hof_text(idx):
+    stops = 5 + idx % 20
+    return HOF_TEMPLATE.format(idx=idx, stops=stops, stop_names="\n".join(f"Stop {i}" for i in range(stops)))
+
+
+def _scenery_paths(rng, count, depth, top="Sceneryobjects"):
+    """Глубокое дерево сценарных объектов: Sceneryobjects/a_1/b_3/.../obj_N.sco"""
+    for i in range(count):
+        levels = rng.randint(1, depth)
+        parts = [f"lvl{d}_{rng.randint(0, 9)}" for d in range(levels)]
+        ext = rng.choice([".sco", ".o3d", ".dds", ".cfg"])
+        yield Path(top, *parts, f"obj_{i}{ext}")
+
+
+def make_game_root(path, scale, seed=42):
+    """Создает папку игры: Omsi.exe, Vehicles с автобусами/.bus/HOF и глубокие деревья Sceneryobjects/maps."""
+    cfg = SCALES[scale]
+    rng = random.Random(seed)
+    root = Path(path)
+    _write(root / "Omsi.exe", b"MZ")
+
+    written = 1
+    hof_idx = 0
+    for b in range(cfg["buses"]):
+        bus_dir = root / "Vehicles" / f"Bus_{b:04d}"
+        # Каждый пятый — трафик (не должен попасть в список управляемых)
+        if b % 5 == 4:
+            _write(bus_dir / f"ai_{b}.ovh", AI_TEMPLATE.format(idx=b))
+        else:
+            _write(bus_dir / f"bus_{b}.bus", BUS_TEMPLATE.format(maker="Synth", model=f"SD{b}", idx=b))
+        _write(bus_dir / "model" / "model.cfg")
+        _write(bus_dir / "sound" / "sound.cfg")
+        _write(bus_dir / "script" / "engine.osc")
+        for _ in range(cfg["hofs_per_bus"]):
+            _write(bus_dir / f"route_{hof_idx}.hof", _hof_text(hof_idx))
+            hof_idx += 1
+        written += 4 + cfg["hofs_per_bus"]
+
+    remaining = max(cfg["game_files"] - written, 0)
+    half = remaining // 2
+    for rel in _scenery_paths(rng, half, cfg["depth"]):
+        _write(root / rel)
+    for rel in _scenery_paths(rng, remaining - half, cfg["depth"], top="maps"):
+        _write(root / rel)
+
+    return root
+
+
+def make_mod_archives(out_dir, scale, seed=42):
+    """
+    Создает ZIP-архивы модов разных форм: с корнем игры (Vehicles/maps),
+    «голый» автобус и репейнт. Часть путей пересекается между модами — для конфликтов:
+    репейнты между собой, а все моды с корнем игры (кроме «голых» автобусов) — по shared_files
+    общим файлам, чтобы конфликты были и на малом масштабе, где репейнт всего один.
+    """
+    cfg = SCALES[scale]
+    rng = random.Random(seed + 1)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    archives = []
+    for m in range(cfg["mods"]):
+        kind = ("root", "flat_bus", "repaint", "map")[m % 4]
+        archive_path = out / f"mod_{m:04d}_{kind}.zip"
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            prefix = f"Mod_{m}/" if m % 2 else ""
+            n = cfg["files_per_mod"]
+            if kind != "flat_bus":
+                shared = min(cfg["shared_files"], n // 2)
+                for i in range(shared):
+                    zf.writestr(f"{prefix}{SHARED_DIR}/shared_{i}.dds", PAYLOAD)
+                n -= shared
+            if kind == "root":
+                bus = f"Vehicles/ModBus_{m}"
+                zf.writestr(f"{prefix}{bus}/modbus_{m}.bus", BUS_TEMPLATE.format(maker="Mod", model=str(m), idx=m))
+                zf.writestr(f"{prefix}{bus}/route_mod_{m}.hof", _hof_text(10_000 + m))
+                for i in range(n - 2):
+                    zf.writestr(f"{prefix}{bus}/model/part_{i}.o3d", PAYLOAD)
+            elif kind == "flat_bus":
+                zf.writestr(f"{prefix}model/model.cfg", PAYLOAD)
+                zf.writestr(f"{prefix}sound/sound.cfg", PAYLOAD)
+                zf.writestr(f"{prefix}flat_{m}.bus", BUS_TEMPLATE.format(maker="Flat", model=str(m), idx=m))
+                for i in range(n - 3):
+                    zf.writestr(f"{prefix}texture/tex_{i}.dds", PAYLOAD)
+            elif kind == "repaint":
+                # Репейнты перекрывают текстуры первых автобусов игры — источник конфликтов
+                for i in range(n):
+                    zf.writestr(f"{prefix}Vehicles/Bus_{i % max(cfg['buses'], 1):04d}/texture/repaint_{i}.dds",
+                                PAYLOAD)
+            else:
+                for rel in _scenery_paths(rng, n, cfg["depth"], top="maps"):
+                    zf.writestr(f"{prefix}{rel.as_posix()}", PAYLOAD)
+        archives.append(archive_path)
+
+    return archives
+
+
+def dir_size(path):
+    """Реальный объем на диске: жесткие ссылки на одну inode считаются один раз."""
+    total = 0
+    seen = set()
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                st = os.lstat(os.path.join(root, f))
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+    return total
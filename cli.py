@@ -0,0 +1,380 @@
+"""
+Консольный режим без GUI (сервер без дисплея, подготовка образов игры, бенчмарки).
+
+    python cli.py setup --game /srv/omsi --library /srv/omsi_library
+    python cli.py import archives/*.zip --enable
+    python cli.py update 12 Map_v2.zip
+    python cli.py order load_order.txt
+    python cli.py sync
+    python cli.py verify
+    python cli.py export-setup rig.omsisetup
+    python cli.py apply-setup rig.omsisetup --game D:/OMSI2_rig07
+    python cli.py timings --limit 20
+
+Результат каждой команды — один JSON на stdout; лог и прогресс — в stderr (с --verbose).
+Код выхода: 0 — успешно, 1 — операция завершилась с ошибкой, 2 — неверные аргументы.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ARCHIVE_SUFFIXES = (".zip", ".7z", ".rar")
+
+
+class CliLogger:
+    """Логгер с интерфейсом UILogger: ошибки и предупреждения копятся для JSON-ответа."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.problems = []
+
+    def log(self, message, level="info", progress=None):
+        if level in ("error", "warning"):
+            self.problems.append({"level": level, "message": str(message)})
+        if not self.verbose:
+            return
+        if level == "progress":
+            print(f"[{progress:>3}%] {message or ''}", file=sys.stderr)
+        else:
+            print(f"[{level}] {message}", file=sys.stderr)
+
+
+# --- Команды ---
+# Каждая возвращает (успех, словарь с результатом)
+
+def cmd_setup(config, logger, args):
+    result = {}
+    if args.game:
+        ok, msg = config.set_game_path(args.game)
+        if not ok:
+            return False, {"message": msg}
+    if args.library:
+        ok, msg = config.set_library_path(args.library)
+        if not ok:
+            return False, {"message": msg}
+    if args.storage_mode:
+        ok, msg = config.set_storage_options(args.storage_mode, args.cache_budget_mb)
+        if not ok:
+            return False, {"message": msg}
+    result.update(game_path=config.game_path, library_path=config.library_path,
+                  storage_mode=config.get_storage_mode(),
+                  cache_budget_mb=config.get_cache_budget_bytes() // (1024 * 1024))
+    return True, result
+
+
+def _collect_archives(paths):
+    """Файлы архивов; папки раскрываются в архивы внутри них (без рекурсии)."""
+    archives = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            archives.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in ARCHIVE_SUFFIXES))
+        else:
+            archives.append(path)
+    return archives
+
+
+def cmd_import(config, logger, args):
+    from core.database import Mod
+    from core.importer import ModImporter
+    from core.previews import previews
+    from core.installer import ModInstaller
+
+    results = []
+    imported_ids = []
+    for archive in _collect_archives(args.archives):
+        started = time.perf_counter()
+        entry = {"archive": str(archive), "ok": False}
+        if not archive.is_file():
+            entry["message"] = "Файл не найден"
+            results.append(entry)
+            continue
+
+        with ModImporter(config, logger) as importer:
+            preview = importer.step1_prepare_preview(str(archive))
+            storage_path = previews.get(preview["temp_id"])["extract_path"] if preview else None
+            if preview and importer.step2_confirm_import(preview["temp_id"]):
+                mod = importer.session.query(Mod).filter_by(storage_path=storage_path).first()
+                entry.update(ok=True, mod_id=mod.id, name=mod.name, type=preview["type"],
+                             files=preview["total_files"])
+                imported_ids.append(mod.id)
+        entry["seconds"] = round(time.perf_counter() - started, 3)
+        results.append(entry)
+
+    ok = all(entry["ok"] for entry in results)
+    result = {"imported": results}
+
+    if args.enable and imported_ids:
+        # Новые моды встают в конец порядка загрузки (выше приоритетом), одной синхронизацией
+        with ModInstaller(config, logger) as installer:
+            session = installer.session
+            order = [m.id for m in session.query(Mod).filter_by(is_enabled=True).order_by(Mod.priority)]
+            for mod in session.query(Mod).filter(Mod.id.in_(imported_ids)):
+                mod.is_enabled = True
+            sync_ok, msg = installer.update_load_order(order + imported_ids)
+        result["sync"] = {"ok": sync_ok, "message": msg}
+        ok = ok and sync_ok
+
+    return ok, result
+
+
+def cmd_update(config, logger, args):
+    """Новая версия мода из архива: меняются только отличающиеся файлы, приоритет сохраняется."""
+    from core.importer import ModImporter
+    from core.installer import ModInstaller
+
+    with ModImporter(config, logger) as importer:
+        preview = importer.step1_prepare_update(args.mod_id, args.archive)
+        if not preview:
+            return False, {"message": "Мод не найден или архив не читается"}
+        if args.dry_run:
+            return True, {"mod_id": args.mod_id, "diff": preview["diff"]}
+        ok, msg, summary = importer.confirm_update(preview["temp_id"])
+    if not ok:
+        return False, {"message": msg}
+
+    changed_targets = summary.pop("changed_targets")
+    with ModInstaller(config, logger) as installer:
+        sync_ok, sync_msg = installer.apply_mod_update(args.mod_id, changed_targets)
+    return sync_ok, {"message": msg, "sync": sync_msg, **summary}
+
+
+def _read_load_order(path):
+    """Список модов из файла: .json — массив id/названий, иначе по одному на строку (# — комментарий)."""
+    text = Path(path).read_text(encoding="utf-8")
+    if Path(path).suffix.lower() == ".json":
+        return [str(item) for item in json.loads(text)]
+    lines = (line.strip() for line in text.splitlines())
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def cmd_order(config, logger, args):
+    from core.database import Mod
+    from core.installer import ModInstaller
+
+    wanted = _read_load_order(args.file)
+    with ModInstaller(config, logger) as installer:
+        session = installer.session
+        mods = session.query(Mod).all()
+        by_id = {str(m.id): m for m in mods}
+        by_name = {}
+        for m in mods:
+            by_name.setdefault(m.name.casefold(), []).append(m)
+
+        ordered, unknown, ambiguous = [], [], []
+        for item in wanted:
+            if item in by_id:
+                ordered.append(by_id[item])
+            elif len(by_name.get(item.casefold(), [])) == 1:
+                ordered.append(by_name[item.casefold()][0])
+            elif item.casefold() in by_name:
+                ambiguous.append(item)
+            else:
+                unknown.append(item)
+        if unknown or ambiguous:
+            # Ничего не меняем: частично примененный порядок хуже, чем никакой
+            return False, {"unknown": unknown, "ambiguous": ambiguous}
+
+        listed = {m.id for m in ordered}
+        for mod in mods:
+            if mod.id in listed:
+                mod.is_enabled = True
+            elif not args.keep_others:
+                mod.is_enabled = False
+
+        # Последний в списке — высший приоритет (как в update_load_order)
+        order_ids = [m.id for m in ordered]
+        if args.keep_others:
+            order_ids = [m.id for m in sorted(mods, key=lambda m: m.priority)
+                         if m.is_enabled and m.id not in listed] + order_ids
+
+        if args.no_sync:
+            for index, mod_id in enumerate(order_ids):
+                by_id[str(mod_id)].priority = index
+            session.commit()
+            return True, {"enabled": order_ids, "synced": False}
+
+        ok, msg = installer.update_load_order(order_ids)
+    return ok, {"enabled": order_ids, "synced": True, "message": msg}
+
+
+def cmd_sync(config, logger, args):
+    from core.installer import ModInstaller
+
+    with ModInstaller(config, logger) as installer:
+        ok, msg = installer.sync_state()
+    return ok, {"message": msg}
+
+
+def cmd_verify(config, logger, args):
+    """Полная сверка установленных файлов с диском; расхождения — код выхода 1."""
+    from core.installer import ModInstaller
+
+    with ModInstaller(config, logger) as installer:
+        installer.check_drift(full=True)
+        drift = installer.list_drift()
+        conflicts = installer.list_conflicts()
+    return not drift, {"drift": drift, "conflicts": conflicts}
+
+
+def cmd_export_setup(config, logger, args):
+    from core.setup_snapshot import SetupSnapshot
+
+    with SetupSnapshot(config, logger) as snapshot:
+        ok, msg, summary = snapshot.export(args.file)
+    return ok, {"message": msg, **summary}
+
+
+def cmd_apply_setup(config, logger, args):
+    """Снимок настройки на другую папку игры (--game) или на текущую."""
+    from core.setup_snapshot import SetupSnapshot
+
+    if args.game and args.game != config.game_path:
+        from core.profiles import ProfileManager
+        with ProfileManager(config) as profiles:
+            ok, msg = profiles.switch(args.game)
+        if not ok:
+            return False, {"message": msg}
+    with SetupSnapshot(config, logger) as snapshot:
+        ok, msg, summary = snapshot.apply(args.file)
+    return ok, {"message": msg, "game_path": config.game_path, **summary}
+
+
+def cmd_list(config, logger, args):
+    from core.database import Mod
+    from core.mod_list import serialize_mod
+
+    with config.read_session() as session:
+        query = session.query(Mod)
+        if args.enabled:
+            query = query.filter_by(is_enabled=True)
+        mods = [serialize_mod(m) for m in query.order_by(Mod.priority, Mod.name)]
+    return True, {"mods": mods}
+
+
+def cmd_hofs(config, logger, args):
+    from core.hof_tools import HofTools
+
+    with HofTools(config, logger) as tools:
+        library_hofs = tools.get_library_hofs()
+        buses = tools.scan_for_buses()
+        if not args.install:
+            return True, {"library_hofs": library_hofs, "buses": buses}
+
+        names = set(args.install)
+        ids = [h["id"] for h in library_hofs if h["name"] in names]
+        missing = sorted(names - {h["name"] for h in library_hofs})
+        bus_names = [b["folder"] for b in buses] if args.all_buses else args.bus
+        if missing or not bus_names:
+            return False, {"missing_hofs": missing, "buses": bus_names}
+        ok, msg = tools.install_hofs_to_buses(ids, bus_names)
+    return ok, {"message": msg, "hofs": len(ids), "buses": len(bus_names)}
+
+
+def cmd_timings(config, logger, args):
+    from core.perf import perf
+
+    return True, {"log_path": perf.log_path, "operations": perf.read_recent(args.limit)}
+
+
+# --- Разбор аргументов ---
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="OMSI 2 Mod Manager без GUI")
+    parser.add_argument("--data-dir", help="Папка данных менеджера (БД, журнал замеров); по умолчанию как у GUI")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Лог и прогресс в stderr")
+    parser.add_argument("--indent", type=int, default=None, help="Отступ JSON (по умолчанию в одну строку)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("setup", help="Пути к игре и библиотеке, режим хранения")
+    p.add_argument("--game")
+    p.add_argument("--library")
+    p.add_argument("--storage-mode", choices=["extract", "archive"])
+    p.add_argument("--cache-budget-mb", type=int)
+    p.set_defaults(func=cmd_setup)
+
+    p = sub.add_parser("import", help="Импорт архивов (файлы или папки с архивами)")
+    p.add_argument("archives", nargs="+")
+    p.add_argument("--enable", action="store_true", help="Включить импортированные моды и синхронизировать")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("update", help="Обновить мод новой версией архива (только измененные файлы)")
+    p.add_argument("mod_id", type=int)
+    p.add_argument("archive")
+    p.add_argument("--dry-run", action="store_true", help="Только показать отличия")
+    p.set_defaults(func=cmd_update)
+
+    p = sub.add_parser("order", help="Порядок загрузки из файла (id или названия, последний — главный)")
+    p.add_argument("file")
+    p.add_argument("--keep-others", action="store_true", help="Не выключать моды, которых нет в файле")
+    p.add_argument("--no-sync", action="store_true", help="Только записать порядок, без синхронизации")
+    p.set_defaults(func=cmd_order)
+
+    p = sub.add_parser("sync", help="Привести папку игры к включенным модам")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("verify", help="Сверить установленные файлы с диском")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("export-setup", help="Снимок настройки (порядок модов, план ссылок, HOF) в файл")
+    p.add_argument("file")
+    p.set_defaults(func=cmd_export_setup)
+
+    p = sub.add_parser("apply-setup", help="Применить снимок настройки (моды — те же архивы в библиотеке)")
+    p.add_argument("file")
+    p.add_argument("--game", help="Папка игры, к которой применить (по умолчанию текущая)")
+    p.set_defaults(func=cmd_apply_setup)
+
+    p = sub.add_parser("list", help="Список модов")
+    p.add_argument("--enabled", action="store_true")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("hofs", help="HOF библиотеки и автобусы; с --install — установка")
+    p.add_argument("--install", nargs="+", metavar="HOF", help="Имена HOF файлов из библиотеки")
+    p.add_argument("--bus", nargs="+", default=[], metavar="FOLDER", help="Папки автобусов в Vehicles")
+    p.add_argument("--all-buses", action="store_true")
+    p.set_defaults(func=cmd_hofs)
+
+    p = sub.add_parser("timings", help="Последние замеры операций (журнал perf)")
+    p.add_argument("--limit", type=int, default=50)
+    p.set_defaults(func=cmd_timings)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logger = CliLogger(args.verbose)
+
+    from core.config import ConfigManager
+    config = ConfigManager(app_data_dir=args.data_dir)
+
+    needs_paths = args.command not in ("setup", "timings")
+    if needs_paths and not (config.game_path and config.library_path):
+        ok, result = False, {"message": "Не заданы пути к игре и библиотеке (cli.py setup --game ... --library ...)"}
+        seconds = 0.0
+    else:
+        started = time.perf_counter()
+        try:
+            ok, result = args.func(config, logger, args)
+        except Exception as e:
+            ok, result = False, {"message": f"{type(e).__name__}: {e}"}
+        seconds = time.perf_counter() - started
+        # Бэкапы и корзина обрабатываются в фоновых потоках-демонах: без ожидания процесс
+        # завершится посреди их работы (в замер команды ожидание не входит)
+        from core.backups import hasher
+        from core.trash import purger
+        hasher.wait()
+        purger.wait()
+
+    output = {"command": args.command, "ok": ok, "seconds": round(seconds, 3), **result}
+    if logger.problems:
+        output["log"] = logger.problems
+    print(json.dumps(output, ensure_ascii=False, indent=args.indent, default=str))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from core.database import ModType
+from core.perf import perf
 
 
 class ModAnalyzer:
@@ -28,7 +29,11 @@ class ModAnalyzer:
         'addons', '_commonredist', '_activation'
     }
 
-    def __init__(self, mod_path):
+    def __init__(self, mod_path, files=None, dirs=None):
+        """
+        mod_path — папка мода. Если передан files (POSIX-пути из оглавления архива),
+        анализ идет по списку без обращения к диску — мод можно еще не распаковывать.
+        """
         self.mod_path = Path(mod_path)
         self.structure = {
             'type': ModType.UNKNOWN,
@@ -37,20 +42,29 @@ class ModAnalyzer:
             'implicit_buses': [],  # Список папок, которые надо закинуть в Vehicles
             'is_flat_bus': False
         }
+        # Дерево в памяти: {"a/b": ([подпапки], [файлы])}, "" — корень мода
+        if files is not None:
+            self._tree = self._build_tree(files, dirs or [])
+        else:
+            self._tree = self._scan_tree()
 
+    @perf.timed("analyze")
     def analyze(self):
+        perf.phase("hof_scan")
         self._find_hof_files()
 
         # Поиск корня
+        perf.phase("root_search")
         root_candidate, implicit_buses = self._find_omsi_root_smart()
 
-        if root_candidate:
-            self.structure['root_path'] = root_candidate
+        perf.phase("detect_type")
+        if root_candidate is not None:
+            self.structure['root_path'] = self._abs(root_candidate)
             self.structure['implicit_buses'] = implicit_buses
             self.structure['type'] = self._determine_type_by_content(root_candidate, implicit_buses)
         else:
             # Если совсем ничего не нашли, проверяем на "голый" автобус
-            if self._is_bus_dir(self.mod_path):
+            if self._is_bus_dir(""):
                 self.structure['type'] = ModType.BUS
                 self.structure['is_flat_bus'] = True
                 self.structure['root_path'] = self.mod_path
@@ -59,45 +73,79 @@ class ModAnalyzer:
 
         return self.structure
 
+    # --- Дерево папок ---
+
+    def _scan_tree(self):
+        """Один проход os.walk по распакованной папке."""
+        tree = {}
+        for root, dirs, files in os.walk(self.mod_path):
+            rel = Path(root).relative_to(self.mod_path).as_posix()
+            tree["" if rel == "." else rel] = (sorted(dirs), files)
+        return tree
+
+    @staticmethod
+    def _build_tree(files, dirs):
+        tree = {"": ([], [])}
+
+        def ensure_dir(rel):
+            if rel in tree:
+                return
+            parent, _, name = rel.rpartition("/")
+            ensure_dir(parent)
+            tree[rel] = ([], [])
+            tree[parent][0].append(name)
+
+        for d in dirs:
+            ensure_dir(d)
+        for f in files:
+            parent, _, name = f.rpartition("/")
+            ensure_dir(parent)
+            tree[parent][1].append(name)
+        for subdirs, _ in tree.values():
+            subdirs.sort()
+        return tree
+
+    def _walk(self):
+        """Обход сверху вниз, как os.walk: (rel_path, dirs, files)."""
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            dirs, files = self._tree[rel]
+            yield rel, dirs, files
+            stack.extend(f"{rel}/{d}" if rel else d for d in reversed(dirs))
+
+    def _abs(self, rel):
+        return self.mod_path.joinpath(*rel.split("/")) if rel else self.mod_path
+
+    def _child_dirs_lower(self, rel):
+        return {d.lower() for d in self._tree.get(rel, ((), ()))[0]}
+
+    # --- Анализ ---
+
     def _find_hof_files(self):
-        for path in self.mod_path.rglob('*.hof'):
-            try:
-                rel_path = path.relative_to(self.mod_path)
-                self.structure['hof_files'].append(str(rel_path))
-            except:
-                pass
-
-    def _is_bus_dir(self, path):
+        for rel, _, files in self._walk():
+            for name in files:
+                if name.lower().endswith('.hof'):
+                    self.structure['hof_files'].append(str(Path(rel, name)))
+
+    def _is_bus_dir(self, rel):
         """Проверяет, похоже ли содержимое папки на автобус (есть Model + Sound)"""
-        has_model = False
-        has_sound = False
-        if not path.is_dir(): return False
-        try:
-            for item in path.iterdir():
-                if item.is_dir():
-                    if item.name.lower() == 'model': has_model = True
-                    if item.name.lower() == 'sound': has_sound = True
-        except:
-            pass
-        return has_model and has_sound
+        children = self._child_dirs_lower(rel)
+        return 'model' in children and 'sound' in children
 
     def _find_omsi_root_smart(self):
         """
         Ищет корень, учитывая и стандартные папки, и папки-автобусы, лежащие рядом.
-        Возвращает (Path root, List[str] implicit_buses)
+        Возвращает (rel_path корня или None, List[str] implicit_buses)
         """
         max_score = 0
         best_root = None
         best_buses = []
 
         # Сканируем в глубину до 3 уровней
-        for root, dirs, files in os.walk(self.mod_path):
-            current_path = Path(root)
+        for rel, dirs, files in self._walk():
             # Защита от глубокого ухода
-            try:
-                if len(current_path.relative_to(self.mod_path).parts) > 3:
-                    continue
-            except:
+            if rel and rel.count("/") + 1 > 3:
                 continue
 
             score = 0
@@ -113,20 +161,20 @@ class ModAnalyzer:
 
                 # 2. Проверяем, не является ли папка "скрытым автобусом"
                 # (То есть внутри неё есть Model/Sound, но сама она не Vehicles)
-                elif self._is_bus_dir(current_path / d):
+                elif self._is_bus_dir(f"{rel}/{d}" if rel else d):
                     score += 3
                     current_buses.append(d)
 
             # Если мы нашли хоть что-то значимое
             if score > max_score:
                 max_score = score
-                best_root = current_path
+                best_root = rel
                 best_buses = current_buses
 
             # Если score одинаковый, предпочитаем тот путь, который короче (ближе к началу)
             elif score == max_score and score > 0:
-                if best_root and len(str(current_path)) < len(str(best_root)):
-                    best_root = current_path
+                if best_root is not None and len(rel) < len(best_root):
+                    best_root = rel
                     best_buses = current_buses
 
         if max_score > 0:
@@ -134,17 +182,18 @@ class ModAnalyzer:
 
         return None, []
 
-    def _determine_type_by_content(self, root_path, implicit_buses):
-        has_vehicles = (root_path / 'vehicles').exists() or (root_path / 'Vehicles').exists() or len(implicit_buses) > 0
-        has_maps = (root_path / 'maps').exists() or (root_path / 'Maps').exists()
+    def _determine_type_by_content(self, root_rel, implicit_buses):
+        children = self._child_dirs_lower(root_rel)
+        has_vehicles = 'vehicles' in children or len(implicit_buses) > 0
+        has_maps = 'maps' in children
 
         if has_vehicles and has_maps: return ModType.MIXED
         if has_vehicles: return ModType.BUS
         if has_maps: return ModType.MAP
 
         # Проверка на Scenery/Splines
-        for folder in ['Sceneryobjects', 'Splines', 'Texture', 'Fonts']:
-            if (root_path / folder).exists() or (root_path / folder.lower()).exists():
+        for folder in ['sceneryobjects', 'splines', 'texture', 'fonts']:
+            if folder in children:
                 return ModType.SCENERY
 
-        return ModType.UNKNOWN
\ No newline at end of file
+        return ModType.UNKNOWN
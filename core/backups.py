@@ -0,0 +1,251 @@
+import hashlib
+import os
+import re
+import secrets
+import shutil
+import threading
+from pathlib import Path
+from sqlalchemy import select, update
+from core.database import InstalledFile, HofInstall
+from core.journal import SyncJournal
+from core.mod_list import escape_like
+from core.perf import perf
+from core.trash import lower_thread_priority
+
+# Папка ожидающих бэкапов: в Library/Backups или, если игра на другом диске, в корне игры
+STAGING_DIR = ".backup_staging"
+# Бэкапов на одну транзакцию фонового обработчика
+HASH_BATCH_SIZE = 200
+# Имя окончательного бэкапа: <md5>_<имя> (только такие файлы обработчик считает своими)
+HASHED_NAME = re.compile(r"^[0-9a-f]{32}_")
+
+# Перенос бэкапа на окончательное место и запись пути в БД не должны пересечься с
+# восстановлением оригинала: синхронизация и снятие HOF держат этот замок, обработчик —
+# только на время коммита своей пачки
+backup_lock = threading.RLock()
+
+
+def restore_backup(backup, target):
+    """
+    Возвращает оригинал из бэкапа на место в игре. Одинаковые бэкапы — жесткие ссылки на один
+    файл (BackupHasher): такой бэкап копируется, а его имя удаляется — иначе файл игры остался бы
+    общим с чужим бэкапом, и правка файла на месте испортила бы тот бэкап.
+    """
+    if os.stat(backup).st_nlink > 1:
+        shutil.copy2(backup, target)
+        os.unlink(backup)
+    else:
+        shutil.move(str(backup), str(target))
+
+
+def md5_file(path):
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+class BackupStager:
+    """
+    Быстрый бэкап оригинала при установке: rename в папку ожидания на том же диске,
+    без чтения файла. Хеш (original_hash), дедупликация и перенос в Library/Backups —
+    позже, в BackupHasher. До этого запись InstalledFile/HofInstall указывает на файл
+    в папке ожидания, и восстановление берет оригинал оттуда.
+    """
+
+    def __init__(self, game_root, library_path):
+        self.library_staging = Path(library_path) / "Backups" / STAGING_DIR
+        self.library_staging.mkdir(parents=True, exist_ok=True)
+        game_root = Path(game_root)
+        try:
+            same_volume = os.stat(game_root).st_dev == os.stat(self.library_staging).st_dev
+        except OSError:
+            same_volume = True
+        # Игра на другом диске: rename возможен только в пределах ее диска
+        self.staging = self.library_staging if same_volume else game_root / STAGING_DIR
+
+    def path_for(self, name):
+        return self.staging / f"{secrets.token_hex(6)}_{name}"
+
+    def stage(self, target_path, staged_path):
+        """Переносит оригинал в папку ожидания (rename; OSError — другой том, см. fallback_for)."""
+        staged_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(target_path, staged_path)
+
+    def fallback_for(self, staged_path):
+        """Куда переносить копированием, если rename не вышел (точка монтирования внутри игры)."""
+        return self.library_staging / staged_path.name
+
+
+class BackupHasher:
+    """
+    Фоновая обработка ожидающих бэкапов (один поток на процесс, низкий приоритет):
+    MD5 файла, окончательное место Library/Backups/<md5>_<имя>. Одинаковые оригиналы
+    (например, один и тот же HOF в разных автобусах) становятся жесткими ссылками на один
+    файл, но у каждой записи свой путь — восстановление одной не забирает бэкап у другой.
+
+    Путь в БД меняется условным UPDATE (где путь еще прежний) под backup_lock, файл
+    в папке ожидания удаляется только после коммита — восстановление в любой момент
+    находит оригинал по пути из своей записи.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._config = None
+        self._logger = None
+        self._wakeup = False
+        self.processed = 0
+        self.last_error = None
+
+    def start(self, config_manager, logger=None):
+        with self._lock:
+            self._config = config_manager
+            self._logger = logger
+            if self._thread is not None and self._thread.is_alive():
+                self._wakeup = True
+                return
+            self._wakeup = False
+            self._thread = threading.Thread(target=self._loop, name="backup-hash", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _loop(self):
+        lower_thread_priority()
+        while True:
+            with self._lock:
+                config_manager = self._config
+                logger = self._logger
+                self._wakeup = False
+            try:
+                self.run(config_manager)
+            except Exception as e:
+                # Ошибка уже в записи perf (backups.hash); бэкапы остаются в папке ожидания до следующего запуска
+                self.last_error = f"{type(e).__name__}: {e}"
+                if logger:
+                    logger.log(f"Обработка бэкапов: {e}", "warning")
+            with self._lock:
+                if not self._wakeup:
+                    return
+
+    @perf.timed("backups.hash")
+    def run(self, config_manager):
+        """Обрабатывает все ожидающие бэкапы. Возвращает число обработанных."""
+        backup_dir = Path(config_manager.library_path) / "Backups"
+        session = config_manager.new_session()
+        done = 0
+        try:
+            for table in (InstalledFile, HofInstall):
+                last_id = 0
+                while True:
+                    rows = session.execute(
+                        select(table.id, table.backup_path)
+                        .where(table.id > last_id,
+                               table.backup_path.like(f"%{escape_like(STAGING_DIR)}%", escape="\\"))
+                        .order_by(table.id).limit(HASH_BATCH_SIZE)
+                    ).all()
+                    if not rows:
+                        break
+                    done += self._process_batch(session, table, rows, backup_dir)
+                    last_id = rows[-1].id
+            self._cleanup_orphans(session, config_manager)
+        finally:
+            session.close()
+        self.processed += done
+        perf.count("backups", done)
+        return done
+
+    def _process_batch(self, session, table, rows, backup_dir):
+        prepared = []
+        for row_id, staged_path in rows:
+            staged = Path(staged_path)
+            try:
+                digest = md5_file(staged)
+                name = staged.name.split("_", 1)[-1]
+                final = backup_dir / f"{digest}_{name}"
+                if final.exists():
+                    # То же содержимое уже в бэкапах — ссылка на него под своим именем
+                    source, final = final, backup_dir / f"{digest}_{staged.name}"
+                else:
+                    source = staged
+                try:
+                    os.link(source, final)
+                except OSError:
+                    shutil.copy2(staged, final)
+                prepared.append((row_id, staged_path, final, digest))
+            except OSError:
+                # Оригинал уже восстановлен (или файл пропал) — запись разберет синхронизация
+                prepared.append((row_id, staged_path, None, None))
+
+        done = 0
+        with backup_lock:
+            for row_id, staged_path, final, digest in prepared:
+                if final is None:
+                    continue
+                values = {"backup_path": str(final)}
+                if table is InstalledFile:
+                    values["original_hash"] = digest
+                result = session.execute(
+                    update(table).where(table.id == row_id, table.backup_path == staged_path).values(**values))
+                if result.rowcount == 1:
+                    done += 1
+                else:
+                    final.unlink()  # Запись снята, пока считался хеш
+            session.commit()
+            for row_id, staged_path, final, digest in prepared:
+                if final is not None and Path(final).exists():
+                    try:
+                        os.unlink(staged_path)
+                    except OSError:
+                        pass
+        return done
+
+    def _cleanup_orphans(self, session, config_manager):
+        """
+        Файлы без записи в БД удаляются: в папках ожидания (сбой между коммитом и удалением)
+        и окончательные бэкапы <md5>_<имя> в Library/Backups (сбой между os.link и UPDATE).
+        """
+        if SyncJournal(config_manager.library_path).pending() is not None:
+            return  # Незавершенная синхронизация: ее бэкапы еще нужны восстановлению
+        backup_dir = Path(config_manager.library_path) / "Backups"
+        dirs = [backup_dir / STAGING_DIR]
+        if config_manager.game_path:
+            dirs.append(Path(config_manager.game_path) / STAGING_DIR)
+        with backup_lock:
+            referenced = set()
+            for table in (InstalledFile, HofInstall):
+                referenced.update(session.scalars(
+                    select(table.backup_path)
+                    .where(table.backup_path.like(f"%{escape_like(STAGING_DIR)}%", escape="\\"))))
+            for directory in dirs:
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory):
+                    if entry.path not in referenced:
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+
+            # Окончательные бэкапы сверяются по имени (в нем md5): после переноса библиотеки
+            # пути в записях могут указывать на старую папку, а имена остаются прежними
+            referenced_names = set()
+            for table in (InstalledFile, HofInstall):
+                for backup_path in session.scalars(select(table.backup_path).where(table.backup_path.is_not(None))):
+                    referenced_names.add(os.path.basename(backup_path))
+            if backup_dir.is_dir():
+                for entry in os.scandir(backup_dir):
+                    if HASHED_NAME.match(entry.name) and entry.name not in referenced_names \
+                            and entry.is_file(follow_symlinks=False):
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+
+
+hasher = BackupHasher()
@@ -1,33 +1,90 @@
 import os
+from contextlib import contextmanager
 import appdirs
 from core.database import init_db, AppSetting
+from core.perf import perf
 
 
 class ConfigManager:
-    def __init__(self):
-        # Папка данных приложения в AppData (или ~/.local)
-        self.app_data_dir = appdirs.user_data_dir("OMSI2_ModManager", "OMSI_Tools")
+    def __init__(self, app_data_dir=None):
+        # Папка данных приложения в AppData (или ~/.local); для бенчмарков/тестов можно передать свою
+        self.app_data_dir = app_data_dir or appdirs.user_data_dir("OMSI2_ModManager", "OMSI_Tools")
         os.makedirs(self.app_data_dir, exist_ok=True)
 
-        # Инициализация БД
+        # Инициализация БД: общей сессии нет, только фабрика (см. session_scope / read_session)
         self.db_path = os.path.join(self.app_data_dir, "manager_v1.db")
-        self.session = init_db(self.db_path)
+        self.Session = init_db(self.db_path)
 
         # Загрузка кэшированных путей
         self.game_path = self._get_setting("game_path")
         self.library_path = self._get_setting("library_path")
 
+        # Журнал замеров производительности (+ cProfile по флагу или OMSI_MM_PROFILE=1)
+        self.perf_dir = os.path.join(self.app_data_dir, "perf")
+        perf.configure(self.perf_dir, profiling=self.is_profiling_enabled())
+
+    # --- Сессии ---
+
+    def new_session(self):
+        """Новая сессия для компонента (UnitOfWork); закрывает ее владелец."""
+        return self.Session()
+
+    @contextmanager
+    def session_scope(self):
+        """Единица работы: commit при успехе, rollback при исключении, сессия всегда закрывается."""
+        session = self.Session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @contextmanager
+    def read_session(self):
+        """Сессия только для чтения (списки, поиск): ничего не пишет, под WAL не ждет синхронизацию."""
+        session = self.Session(autoflush=False)
+        try:
+            yield session
+        finally:
+            session.rollback()
+            session.close()
+
+    def is_profiling_enabled(self):
+        return os.environ.get("OMSI_MM_PROFILE") == "1" or self._get_setting("perf_profile") == "1"
+
+    def set_profiling(self, enabled):
+        self._set_setting("perf_profile", "1" if enabled else "0")
+        perf.profiling = self.is_profiling_enabled()
+
+    def is_watch_enabled(self):
+        """Наблюдение за папками игры/библиотеки (core/watcher.py); по умолчанию включено."""
+        return self._get_setting("watch_enabled") != "0"
+
+    def set_watch_enabled(self, enabled):
+        self._set_setting("watch_enabled", "1" if enabled else "0")
+
+    def is_watch_polling_enabled(self):
+        """Наблюдение обходом папок по таймеру, где нет inotify (Windows); по умолчанию выключено."""
+        return self._get_setting("watch_polling") == "1"
+
+    def set_watch_polling(self, enabled):
+        self._set_setting("watch_polling", "1" if enabled else "0")
+
     def _get_setting(self, key):
-        setting = self.session.query(AppSetting).filter_by(key=key).first()
-        return setting.value if setting else None
+        with self.read_session() as session:
+            setting = session.get(AppSetting, key)
+            return setting.value if setting else None
 
     def _set_setting(self, key, value):
-        setting = self.session.query(AppSetting).filter_by(key=key).first()
-        if not setting:
-            setting = AppSetting(key=key)
-            self.session.add(setting)
-        setting.value = value
-        self.session.commit()
+        with self.session_scope() as session:
+            setting = session.get(AppSetting, key)
+            if not setting:
+                setting = AppSetting(key=key)
+                session.add(setting)
+            setting.value = value
 
     def set_game_path(self, path):
         if os.path.exists(path) and os.path.exists(os.path.join(path, "Omsi.exe")):
@@ -36,6 +93,29 @@ class ConfigManager:
             return True, "Путь к OMSI 2 сохранен!"
         return False, "Не найдет Omsi.exe в указанной папке."
 
+    # --- Режим хранения модов ---
+    # "extract" — мод полностью распаковывается в библиотеку при импорте (по умолчанию);
+    # "archive" — хранится копия архива, файлы распаковываются только при включении мода.
+
+    DEFAULT_CACHE_BUDGET_MB = 20 * 1024
+
+    def get_storage_mode(self):
+        return self._get_setting("storage_mode") or "extract"
+
+    def get_cache_budget_bytes(self):
+        try:
+            return int(self._get_setting("cache_budget_mb") or self.DEFAULT_CACHE_BUDGET_MB) * 1024 * 1024
+        except ValueError:
+            return self.DEFAULT_CACHE_BUDGET_MB * 1024 * 1024
+
+    def set_storage_options(self, mode, cache_budget_mb=None):
+        if mode not in ("extract", "archive"):
+            return False, f"Неизвестный режим хранения: {mode}"
+        self._set_setting("storage_mode", mode)
+        if cache_budget_mb is not None:
+            self._set_setting("cache_budget_mb", str(int(cache_budget_mb)))
+        return True, "Настройки хранения сохранены."
+
     def set_library_path(self, path):
         if not os.path.exists(path):
             try:
@@ -1,8 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, inspect, text, Text, \
-    UniqueConstraint
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Text, \
+    UniqueConstraint, Index, event, func, select
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from datetime import datetime
 import enum
+from core.migrations import run_migrations
 
 Base = declarative_base()
 
@@ -18,6 +19,22 @@ class ModType(enum.Enum):
     HOF_ONLY = "hof_only"
 
 
+def path_key(path):
+    """Ключ пути в игре для сравнения: прямые слэши, нижний регистр (File.txt и file.txt — один файл)."""
+    return path.replace("\\", "/").lower() if path is not None else None
+
+
+def _path_key_default(column):
+    """
+    Значение по умолчанию для колонки-ключа, вычисляемое из колонки пути при INSERT.
+    При смене пути у ORM-объекта ключ пересчитывает _track_path_key (onupdate не годится:
+    UPDATE без колонки пути, например только drift, обнулил бы ключ).
+    """
+    def compute(context):
+        return path_key(context.get_current_parameters().get(column))
+    return compute
+
+
 # --- МОДЕЛИ ---
 
 class GameProfile(Base):
@@ -35,9 +52,29 @@ class Mod(Base):
     is_enabled = Column(Boolean, default=False)
     priority = Column(Integer, default=0)
     install_date = Column(DateTime, default=datetime.now)
+    # Режим хранения "archive": каноническая копия — архив, файлы распаковываются только при включении
+    archive_path = Column(String, nullable=True)
+    is_materialized = Column(Boolean, default=True)
+    last_used = Column(DateTime, nullable=True)
+    storage_bytes = Column(Integer, default=0)
+    # Номер последнего изменения строки (дельты списка модов, см. core/mod_list.py)
+    revision = Column(Integer, default=0, index=True)
     files = relationship("ModFile", back_populates="mod", cascade="all, delete-orphan")
     hof_files = relationship("HofFile", back_populates="mod", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_mods_name_nocase', name.collate('NOCASE')),
+        Index('ix_mods_mod_type', 'mod_type'),
+        Index('ix_mods_install_date', 'install_date'),
+    )
+
+
+class ModTombstone(Base):
+    """След удаленного мода — чтобы дельта списка сообщила UI об удалении."""
+    __tablename__ = 'mod_tombstones'
+    mod_id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False, index=True)
+
 
 class ModFile(Base):
     __tablename__ = 'mod_files'
@@ -45,8 +82,13 @@ class ModFile(Base):
     mod_id = Column(Integer, ForeignKey('mods.id'))
     source_rel_path = Column(String, nullable=False)
     target_game_path = Column(String, nullable=True)
+    # path_key(target_game_path) — по нему потоковая синхронизация сливает моды с установленным
+    target_key = Column(String, index=True, default=_path_key_default('target_game_path'))
     is_hof = Column(Boolean, default=False)
-    file_hash = Column(String)
+    file_hash = Column(String, index=True)  # content id (core/storage.py), общий для одинаковых файлов
+    archive_member = Column(String, nullable=True)  # имя файла внутри исходного архива
+    archive_crc = Column(String, nullable=True)  # CRC32 из оглавления архива (None — неизвестен)
+    size = Column(Integer, nullable=True)
     mod = relationship("Mod", back_populates="files")
 
 
@@ -57,10 +99,26 @@ class HofFile(Base):
     filename = Column(String, nullable=False)
     full_source_path = Column(String, nullable=False)
     description = Column(String, nullable=True)
+    # content id файла (core/storage.py) — ключ каталога HOF (core/hof_catalog.py)
+    content_hash = Column(String, index=True)
     mod = relationship("Mod", back_populates="hof_files")
     installs = relationship("HofInstall", back_populates="hof_file", cascade="all, delete-orphan")
 
 
+class HofCatalogEntry(Base):
+    """Разобранное содержимое HOF: один раз на content id, сколько бы копий ни было в библиотеке."""
+    __tablename__ = 'hof_catalog'
+    content_hash = Column(String, primary_key=True)
+    name = Column(String, nullable=True)  # Название из секции [name]
+    stations = Column(Integer, default=0)
+    termini = Column(Integer, default=0)
+    size = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index('ix_hof_catalog_name_nocase', name.collate('NOCASE')),
+    )
+
+
 class HofInstall(Base):
     __tablename__ = 'hof_installs'
     id = Column(Integer, primary_key=True)
@@ -80,9 +138,17 @@ class InstalledFile(Base):
     active_mod_id = Column(Integer, ForeignKey('mods.id'))
     backup_path = Column(String, nullable=True)
     original_hash = Column(String, nullable=True)
+    path_key = Column(String, default=_path_key_default('game_path'))
+    # None — файл на месте; "missing" — ссылка/файл пропали; "replaced" — подменен чужим файлом
+    drift = Column(String, nullable=True)
+    # Как поставлен файл: "symlink", "hardlink" или "copy" (core/linking.py); None — до версии 11
+    link_kind = Column(String, nullable=True)
 
     # Теперь уникальность проверяется по ПАРЕ (путь файла + папка игры)
-    __table_args__ = (UniqueConstraint('game_path', 'root_path', name='_game_file_uc'),)
+    __table_args__ = (
+        UniqueConstraint('game_path', 'root_path', name='_game_file_uc'),
+        Index('ix_game_file_state_root_key', 'root_path', 'path_key', 'id'),
+    )
 
 
 class AppSetting(Base):
@@ -91,6 +157,41 @@ class AppSetting(Base):
     value = Column(String)
 
 
+def _track_path_key(path_attr, key_attr):
+    def on_set(target, value, oldvalue, initiator):
+        setattr(target, key_attr, path_key(value))
+    event.listen(path_attr, "set", on_set)
+
+
+_track_path_key(ModFile.target_game_path, 'target_key')
+_track_path_key(InstalledFile.game_path, 'path_key')
+
+
+# --- РЕВИЗИИ СПИСКА МОДОВ ---
+
+def current_mods_revision(session):
+    """Последняя выданная ревизия (максимум по модам и следам удаления)."""
+    with session.no_autoflush:
+        mods_rev = session.execute(select(func.max(Mod.revision))).scalar() or 0
+        tomb_rev = session.execute(select(func.max(ModTombstone.revision))).scalar() or 0
+    return max(mods_rev, tomb_rev)
+
+
+def _stamp_mod_revisions(session, flush_context, instances):
+    """Перед flush: измененным/новым модам — новая ревизия, удаленным — след."""
+    changed = [obj for obj in session.new if isinstance(obj, Mod)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Mod) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Mod)]
+    if not changed and not deleted:
+        return
+
+    revision = current_mods_revision(session) + 1
+    for mod in changed:
+        mod.revision = revision
+    for mod in deleted:
+        session.merge(ModTombstone(mod_id=mod.id, revision=revision))
+
+
 # --- ИНИЦИАЛИЗАЦИЯ И МИГРАЦИЯ ---
 
 def init_db(db_path='manager.db'):
@@ -101,42 +202,52 @@ def init_db(db_path='manager.db'):
         connect_args={'timeout': 30}
     )
 
-    # 1. Сначала создаем таблицы (те, которых еще нет)
-    Base.metadata.create_all(engine)
-
-    # 2. Миграции через активное соединение
-    with engine.connect() as conn:
-        # ВАЖНО: передаем 'conn' вместо 'engine' в inspect
-        inspector = inspect(conn)
-
-        # Проверяем и добавляем колонки в mods
-        cols_mods = [c['name'] for c in inspector.get_columns('mods')]
-        if 'priority' not in cols_mods:
-            conn.execute(text("ALTER TABLE mods ADD COLUMN priority INTEGER DEFAULT 0"))
-
-        # Проверяем и добавляем колонки в game_file_state
-        cols_inst = [c['name'] for c in inspector.get_columns('game_file_state')]
-        if 'root_path' not in cols_inst:
-            conn.execute(text("ALTER TABLE game_file_state ADD COLUMN root_path VARCHAR DEFAULT ''"))
-
-        # Лечение пустых root_path
-        res = conn.execute(text("SELECT value FROM settings WHERE key='game_path'")).fetchone()
-        if res and res[0]:
-            current_path = res[0]
-            conn.execute(
-                text("UPDATE game_file_state SET root_path = :p WHERE root_path = '' OR root_path IS NULL"),
-                {"p": current_path}
-            )
-
-        # Проверяем и добавляем колонки в hof_installs
-        cols_hof = [c['name'] for c in inspector.get_columns('hof_installs')]
-        if 'game_rel_path' not in cols_hof:
-            conn.execute(text("ALTER TABLE hof_installs ADD COLUMN game_rel_path VARCHAR DEFAULT 'legacy'"))
-        if 'backup_path' not in cols_hof:
-            conn.execute(text("ALTER TABLE hof_installs ADD COLUMN backup_path VARCHAR"))
-
-        # Сохраняем все изменения миграции
-        conn.commit()
-
+    # SQLite lower()/LIKE понимают только ASCII — для поиска по кириллице регистр снимает Python
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_conn, _record):
+        # WAL: чтение (список модов, поиск, сканы) идет параллельно с записью синхронизации
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+        dbapi_conn.create_function("casefold", 1, lambda value: value.casefold() if value else value,
+                                   deterministic=True)
+        dbapi_conn.create_function("path_key", 1, path_key, deterministic=True)
+
+    # Версионированные миграции (core/migrations.py): при актуальной схеме — один SELECT
+    run_migrations(engine, Base.metadata)
+
+    # Фабрика сессий: каждая операция (вызов API, поток) открывает свою короткую сессию
     Session = sessionmaker(bind=engine)
-    return Session()
\ No newline at end of file
+    event.listen(Session, "before_flush", _stamp_mod_revisions)
+    return Session
+
+
+# --- СЕССИИ КОМПОНЕНТОВ ---
+
+class UnitOfWork:
+    """
+    Компонент core со своей короткой сессией:
+
+        with ModInstaller(config, logger) as installer:
+            installer.sync_state()
+
+    Переданную извне сессию (вложенный компонент) компонент не закрывает.
+    """
+
+    def _open_session(self, config_manager, session=None):
+        self._owns_session = session is None
+        self.session = session if session is not None else config_manager.new_session()
+
+    def close(self):
+        if self._owns_session and self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._owns_session and self.session is not None:
+            self.session.rollback()
+        self.close()
@@ -0,0 +1,354 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from collections import namedtuple
+from pathlib import Path, PurePosixPath
+
+# Запись оглавления архива: name — имя как его видит распаковщик (для списков -i/-x),
+# path — нормализованный POSIX-путь внутри архива
+ArchiveEntry = namedtuple("ArchiveEntry", ["name", "path", "is_dir", "size", "crc"])
+
+
+def normalize_member_path(name):
+    """'a\\b/./c' -> 'a/b/c'. Абсолютные пути и '..' отбрасываются (None)."""
+    parts = []
+    for part in name.replace("\\", "/").split("/"):
+        if part in ("", "."):
+            continue
+        if part == "..":
+            return None
+        parts.append(part)
+    if not parts or ":" in parts[0]:
+        return None
+    return "/".join(parts)
+
+
+def find_seven_zip():
+    """Путь к 7z: встроенный 7Zip/7z.exe (в том числе внутри EXE), иначе системный 7z/7za."""
+    if getattr(sys, 'frozen', False):
+        base_dir = sys._MEIPASS
+    else:
+        base_dir = os.path.abspath(".")
+
+    bundled = os.path.join(base_dir, "7Zip", "7z.exe")
+    if os.name == "nt" and os.path.exists(bundled):
+        return bundled
+    return shutil.which("7z") or shutil.which("7za")
+
+
+class SevenZipProgressParser:
+    """
+    Разбор вывода 7z с ключом -bsp1.
+    7z перерисовывает строку прогресса через \\r и \\b, поэтому режем поток на записи
+    по любому из этих символов и держим в буфере незавершенный хвост —
+    проценты на границе чанков больше не теряются.
+    """
+
+    SEPARATORS = re.compile(rb"[\r\n\b]+")
+    PERCENT = re.compile(rb"^\s*(\d{1,3})%")
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._tail = b""
+        self.last_percent = -1
+
+    def feed(self, chunk):
+        records = self.SEPARATORS.split(self._tail + chunk)
+        self._tail = records.pop()
+        for record in records:
+            self._handle(record)
+
+    def close(self):
+        if self._tail:
+            self._handle(self._tail)
+            self._tail = b""
+
+    def _handle(self, record):
+        match = self.PERCENT.match(record)
+        if not match:
+            return
+        percent = min(int(match.group(1)), 100)
+        if percent != self.last_percent:
+            self.last_percent = percent
+            self.callback(percent)
+
+
+class ArchiveExtractor:
+    """
+    Распаковка архивов ZIP/7Z/RAR.
+    Основной путь — 7-Zip (stdout и stderr читаются в отдельных потоках, без риска deadlock).
+    Без 7z работает встроенный распаковщик: zipfile для ZIP, py7zr для 7Z (если установлен).
+    """
+
+    def __init__(self, logger, progress_callback=None, seven_zip_tool=None):
+        self.logger = logger
+        self.progress_callback = progress_callback or (lambda percent: None)
+        self.seven_zip_tool = seven_zip_tool or find_seven_zip()
+
+    def _has_7z(self):
+        return bool(self.seven_zip_tool) and os.path.exists(self.seven_zip_tool)
+
+    def extract(self, archive_path, target_path):
+        archive_path = Path(archive_path)
+        if self._has_7z():
+            self._extract_7z(archive_path, Path(target_path))
+        else:
+            self._extract_python(archive_path, Path(target_path))
+
+    # --- Оглавление и распаковка по плану ---
+
+    def list_entries(self, archive_path):
+        """Оглавление архива без распаковки: список ArchiveEntry (небезопасные пути пропущены)."""
+        archive_path = Path(archive_path)
+        if self._has_7z():
+            raw = self._list_7z(archive_path)
+        else:
+            raw = self._list_python(archive_path)
+
+        entries = []
+        for name, is_dir, size, crc in raw:
+            path = normalize_member_path(name)
+            if path:
+                entries.append(ArchiveEntry(name, path, is_dir, size, crc))
+        return entries
+
+    def extract_planned(self, archive_path, target_root, relocate, exclude=(), relocated_only=False):
+        """
+        Распаковка сразу в итоговую раскладку.
+        relocate = {имя_в_архиве: POSIX-путь назначения} для файлов, которые лежат не там,
+        где в архиве (например, HOF -> _hofs/). Остальные файлы распаковываются как есть,
+        кроме exclude. relocated_only=True — распаковать только файлы из relocate.
+        """
+        archive_path, target_root = Path(archive_path), Path(target_root)
+        if self._has_7z():
+            self._extract_planned_7z(archive_path, target_root, relocate, exclude, relocated_only)
+        else:
+            self._extract_planned_python(archive_path, target_root, relocate, exclude, relocated_only)
+
+    # --- 7-Zip ---
+
+    def _extract_7z(self, archive_path, target_path):
+        self.logger.log(f"Распаковка {archive_path.suffix.lower()} через 7-Zip Engine...", "info")
+
+        # x : извлечь с сохранением путей, -o : путь назначения,
+        # -y : отвечать "да" на все вопросы, -bsp1 : прогресс в stdout
+        cmd = [self.seven_zip_tool, "x", str(archive_path), f"-o{target_path}", "-y", "-bsp1"]
+        self._check_7z(self._run_7z(cmd))
+
+    def _list_7z(self, archive_path):
+        cmd = [self.seven_zip_tool, "l", "-slt", "-sccUTF-8", str(archive_path)]
+        result = subprocess.run(cmd, capture_output=True,
+                                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        if result.returncode != 0:
+            raise RuntimeError(f"7-Zip list error: {result.stderr.decode(errors='replace').strip()}")
+
+        text = result.stdout.decode("utf-8", errors="replace")
+        # Блоки файлов идут после строки '----------' (до нее — свойства самого архива)
+        _, sep, body = text.partition("\n----------")
+        if not sep:
+            return []
+
+        raw = []
+        for block in re.split(r"\r?\n\s*\r?\n", body):
+            props = {}
+            for line in block.splitlines():
+                key, eq, value = line.partition(" = ")
+                if eq:
+                    props[key.strip()] = value
+            if "Path" not in props:
+                continue
+            is_dir = props.get("Folder") == "+" or props.get("Attributes", "").startswith("D")
+            raw.append((props["Path"], is_dir, int(props.get("Size") or 0), props.get("CRC") or None))
+        return raw
+
+    def _extract_planned_7z(self, archive_path, target_root, relocate, exclude, relocated_only):
+        self.logger.log(f"Распаковка {archive_path.suffix.lower()} через 7-Zip Engine...", "info")
+        base_cmd = [self.seven_zip_tool]
+        flags = ["-y", "-bsp1", "-scsUTF-8"]
+
+        with tempfile.TemporaryDirectory(prefix="omsi_7z_") as tmp:
+            tmp = Path(tmp)
+
+            def write_list(name, members):
+                list_path = tmp / name
+                list_path.write_text("\n".join(members), encoding="utf-8")
+                return f"@{list_path}"
+
+            # 1. Все, что лежит на своем месте — одним проходом, без перемещаемых файлов
+            if not relocated_only:
+                cmd = base_cmd + ["x", str(archive_path), f"-o{target_root}"] + flags
+                skipped = list(relocate) + list(exclude)
+                if skipped:
+                    cmd.append("-x" + write_list("exclude.txt", skipped))
+                self._check_7z(self._run_7z(cmd))
+
+            # 2. Перемещаемые файлы с сохранением имени — по одному проходу 'e' на папку назначения
+            by_dir, renamed = {}, []
+            for member, dest in relocate.items():
+                dest = PurePosixPath(dest)
+                if dest.name == PurePosixPath(member.replace("\\", "/")).name:
+                    by_dir.setdefault(str(dest.parent), []).append(member)
+                else:
+                    renamed.append((member, dest))
+
+            # Одинаковые имена в одной папке 'e' перезапишет — такие обрабатываем как переименованные
+            for dest_dir, members in by_dir.items():
+                seen = {}
+                for member in members:
+                    seen.setdefault(PurePosixPath(member.replace("\\", "/")).name.lower(), []).append(member)
+                unique = [m for group in seen.values() for m in group[:1]]
+                for group in seen.values():
+                    renamed.extend((m, PurePosixPath(relocate[m])) for m in group[1:])
+
+                out_dir = target_root.joinpath(*PurePosixPath(dest_dir).parts)
+                cmd = base_cmd + ["e", str(archive_path), f"-o{out_dir}", "-i" + write_list("inc.txt", unique)] + flags
+                self._check_7z(self._run_7z(cmd))
+
+            # 3. Переименованные (дубликаты имен) — редкий случай, по одному файлу через временную папку
+            for i, (member, dest) in enumerate(renamed):
+                one_dir = tmp / f"one_{i}"
+                cmd = base_cmd + ["e", str(archive_path), f"-o{one_dir}", f"-i!{member}"] + flags
+                self._check_7z(self._run_7z(cmd))
+                extracted = next(one_dir.iterdir())
+                final = target_root.joinpath(*dest.parts)
+                final.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(extracted, final)
+
+        self.progress_callback(100)
+
+    def _check_7z(self, result):
+        returncode, stderr_text = result
+        if returncode != 0:
+            self.logger.log(f"7-Zip Error: {stderr_text.strip()}", "error")
+            raise RuntimeError("Extraction failed")
+
+    def _run_7z(self, cmd):
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+        )
+
+        parser = SevenZipProgressParser(self.progress_callback)
+        stderr_chunks = []
+
+        def pump_stdout():
+            for chunk in iter(lambda: process.stdout.read1(4096), b""):
+                parser.feed(chunk)
+            parser.close()
+
+        def pump_stderr():
+            for chunk in iter(lambda: process.stderr.read1(4096), b""):
+                stderr_chunks.append(chunk)
+
+        # Оба потока читаются параллельно: 7z не заблокируется на переполненном pipe
+        readers = [threading.Thread(target=pump_stdout, daemon=True),
+                   threading.Thread(target=pump_stderr, daemon=True)]
+        for t in readers:
+            t.start()
+        returncode = process.wait()
+        for t in readers:
+            t.join()
+        process.stdout.close()
+        process.stderr.close()
+
+        return returncode, b"".join(stderr_chunks).decode(errors="replace")
+
+    # --- Встроенный распаковщик ---
+
+    def _list_python(self, archive_path):
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as zf:
+                return [(m.filename, m.is_dir(), m.file_size, f"{m.CRC:08X}") for m in zf.infolist()]
+        if archive_path.suffix.lower() == ".7z":
+            py7zr = self._import_py7zr()
+            with py7zr.SevenZipFile(archive_path, mode="r") as archive:
+                return [(f.filename, f.is_directory, f.uncompressed or 0,
+                         f"{f.crc32:08X}" if f.crc32 is not None else None) for f in archive.list()]
+        raise RuntimeError(f"Для {archive_path.suffix.lower()} нужен 7-Zip (7z.exe не найден)")
+
+    def _import_py7zr(self):
+        try:
+            import py7zr
+        except ImportError:
+            raise RuntimeError("7-Zip не найден, а py7zr не установлен — 7Z не распаковать")
+        return py7zr
+
+    def _extract_planned_python(self, archive_path, target_root, relocate, exclude, relocated_only):
+        if not zipfile.is_zipfile(archive_path):
+            # py7zr не умеет писать файл по произвольному пути — распаковываем во временную папку и переносим
+            with tempfile.TemporaryDirectory(prefix="omsi_7z_", dir=target_root.parent) as tmp:
+                tmp = Path(tmp)
+                self._extract_python(archive_path, tmp)
+                for entry in self.list_entries(archive_path):
+                    if entry.is_dir or entry.name in exclude:
+                        continue
+                    dest = relocate.get(entry.name)
+                    if dest is None and relocated_only:
+                        continue
+                    final = target_root.joinpath(*PurePosixPath(dest or entry.path).parts)
+                    final.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp.joinpath(*entry.path.split("/")), final)
+            return
+
+        self.logger.log("7-Zip не найден, распаковка ZIP встроенным распаковщиком...", "info")
+        exclude = set(exclude)
+        with zipfile.ZipFile(archive_path) as zf:
+            members = [m for m in zf.infolist()
+                       if not m.is_dir() and m.filename not in exclude
+                       and (not relocated_only or m.filename in relocate)]
+            total = sum(m.file_size for m in members) or 1
+            done = 0
+            last_percent = -1
+            for member in members:
+                rel = relocate.get(member.filename) or normalize_member_path(member.filename)
+                if not rel:
+                    continue
+                final = target_root.joinpath(*PurePosixPath(rel).parts)
+                final.parent.mkdir(parents=True, exist_ok=True)
+                # Через временный файл: существующий файл может быть жесткой ссылкой на блоб
+                part = final.with_name(final.name + ".part")
+                with zf.open(member) as src, open(part, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(part, final)
+
+                done += member.file_size
+                percent = int(done * 100 / total)
+                if percent != last_percent:
+                    last_percent = percent
+                    self.progress_callback(percent)
+
+    def _extract_python(self, archive_path, target_path):
+        ext = archive_path.suffix.lower()
+        if ext == ".zip" or zipfile.is_zipfile(archive_path):
+            self.logger.log("7-Zip не найден, распаковка ZIP встроенным распаковщиком...", "info")
+            self._extract_zip(archive_path, target_path)
+        elif ext == ".7z":
+            py7zr = self._import_py7zr()
+            self.logger.log("7-Zip не найден, распаковка 7Z через py7zr...", "info")
+            with py7zr.SevenZipFile(archive_path, mode="r") as archive:
+                archive.extractall(path=target_path)
+            self.progress_callback(100)
+        else:
+            raise RuntimeError(f"Для {ext} нужен 7-Zip (7z.exe не найден)")
+
+    def _extract_zip(self, archive_path, target_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            members = zf.infolist()
+            total = sum(m.file_size for m in members) or 1
+            done = 0
+            last_percent = -1
+            for member in members:
+                # zipfile сам отбрасывает абсолютные пути и '..'
+                zf.extract(member, target_path)
+                done += member.file_size
+                percent = int(done * 100 / total)
+                if percent != last_percent:
+                    last_percent = percent
+                    self.progress_callback(percent)
@@ -0,0 +1,109 @@
+import os
+from sqlalchemy import func, select
+from core.database import HofFile, HofCatalogEntry, Mod
+from core.mod_list import escape_like
+from core.perf import perf
+from core.storage import content_id
+
+# Пачка хешей на один запрос IN (лимит параметров SQLite)
+HASH_CHUNK = 500
+
+
+def parse_hof(path):
+    """
+    Разбор HOF: название ([name]), число разных остановок ([addbusstop...] и списки
+    [infosystem_busstop_list]) и конечных ([addterminus...]).
+    Кодировка HOF — однобайтная (cp1250/cp1252), для разбора хватает latin-1.
+    """
+    name = None
+    stations = set()
+    termini = 0
+    with open(path, "r", encoding="latin-1", errors="replace") as f:
+        lines = iter(f)
+        for line in lines:
+            tag = line.strip().lower()
+            if not tag.startswith("["):
+                continue
+            if tag == "[name]" and name is None:
+                name = next(lines, "").strip() or None
+            elif tag.startswith("[addbusstop"):
+                stations.add(next(lines, "").strip().lower())
+            elif tag == "[infosystem_busstop_list]":
+                try:
+                    count = int(next(lines, "").strip())
+                except ValueError:
+                    continue
+                for _ in range(count):
+                    stations.add(next(lines, "").strip().lower())
+            elif tag.startswith("[addterminus"):
+                termini += 1
+    stations.discard("")
+    return {"name": name, "stations": len(stations), "termini": termini}
+
+
+class HofCatalog:
+    """
+    Каталог HOF по содержимому: каждый HOF хешируется (content id, как блобы библиотеки)
+    и разбирается один раз — результат лежит в hof_catalog под хешем. Одинаковые HOF
+    под разными именами — одна запись каталога; разные HOF с одним именем больше не
+    перекрывают друг друга.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def register(self, path, cid=None):
+        """Хеш файла в каталоге (разбор — только для нового содержимого). None — файл не читается."""
+        try:
+            if not cid or cid == "pending":
+                cid = content_id(path)
+            if self.session.get(HofCatalogEntry, cid) is None:
+                info = parse_hof(path)
+                self.session.add(HofCatalogEntry(content_hash=cid, size=os.path.getsize(path), **info))
+                perf.count("hofs_parsed")
+        except OSError:
+            return None
+        return cid
+
+    def known_hashes(self, hashes):
+        """Какие из хешей уже есть среди HOF библиотеки."""
+        hashes = list(hashes)
+        known = set()
+        for i in range(0, len(hashes), HASH_CHUNK):
+            known.update(self.session.scalars(
+                select(HofFile.content_hash).where(HofFile.content_hash.in_(hashes[i:i + HASH_CHUNK]))))
+        return known
+
+    @perf.timed("hof.catalog_refresh")
+    def refresh(self):
+        """Дописывает хеши HOF, импортированных до каталога (или чьи хеши еще не считались)."""
+        pending = self.session.query(HofFile).filter(HofFile.content_hash.is_(None)).all()
+        for hof in pending:
+            hof.content_hash = self.register(hof.full_source_path)
+        perf.count("hofs", len(pending))
+        if pending:
+            self.session.commit()
+        return len(pending)
+
+    def library(self, search=None):
+        """
+        Уникальные по содержимому HOF библиотеки: последняя добавленная копия, сколько копий,
+        разобранные данные и мод-источник. HOF без хеша (файл пропал) — по имени, как раньше.
+        """
+        group_key = func.coalesce(HofFile.content_hash, HofFile.filename)
+        reps = (
+            select(func.max(HofFile.id).label("id"), func.count(HofFile.id).label("copies"))
+            .group_by(group_key)
+            .subquery()
+        )
+        query = (
+            select(HofFile, reps.c.copies, HofCatalogEntry, Mod.name)
+            .join(reps, HofFile.id == reps.c.id)
+            .outerjoin(HofCatalogEntry, HofCatalogEntry.content_hash == HofFile.content_hash)
+            .outerjoin(Mod, HofFile.mod_id == Mod.id)
+            .order_by(func.coalesce(HofCatalogEntry.name, HofFile.filename).collate('NOCASE'))
+        )
+        if search:
+            text = func.casefold(HofFile.filename + " " + func.coalesce(HofCatalogEntry.name, ""))
+            query = query.where(text.like(f"%{escape_like(search.casefold())}%", escape="\\"))
+        return self.session.execute(query).all()
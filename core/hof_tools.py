@@ -1,69 +1,68 @@
 import os
 import shutil
-import hashlib
 from pathlib import Path
-from sqlalchemy import func
-from core.database import HofFile, HofInstall, Mod
+from core.database import HofFile, HofCatalogEntry, HofInstall, UnitOfWork
+from core.hof_catalog import HofCatalog
+from core.backups import backup_lock, hasher, restore_backup
 from core.installer import ModInstaller
+from core.perf import perf
+from core.storage import content_id
+from core.watcher import watcher
 
 
-class HofTools:
-    def __init__(self, config_manager, logger):
+class HofTools(UnitOfWork):
+    def __init__(self, config_manager, logger, session=None):
         self.config = config_manager
-        self.session = config_manager.session
+        self._open_session(config_manager, session)
         self.logger = logger
 
+        self.installer = ModInstaller(config_manager, logger, session=self.session)
+
         # Защита от отсутствия пути при первом запуске
         if self.config.game_path:
             self.game_root = Path(self.config.game_path)
-            self.vehicles_path = self.game_root / "Vehicles"
+            # Vehicles в реальном написании (под Wine папка может называться vehicles)
+            self.vehicles_path = self.installer._target("Vehicles")
         else:
             self.game_root = None
             self.vehicles_path = None
 
-        self.installer = ModInstaller(config_manager, logger)
-
         self.hof_lib_path = Path(self.config.library_path) / "HOF_Storage"
         self.hof_lib_path.mkdir(parents=True, exist_ok=True)
 
-    def get_library_hofs(self):
-        """Возвращает список уникальных HOF-файлов с информацией о моде-источнике."""
-        # 1. Находим максимальные ID для уникальных имен
-        subquery = (
-            self.session.query(
-                HofFile.filename,
-                func.max(HofFile.id).label('max_id')
-            )
-            .group_by(HofFile.filename)
-            .subquery()
-        )
-
-        # 2. Основной запрос
-        results = (
-            self.session.query(HofFile, Mod.name)
-            .join(subquery, HofFile.id == subquery.c.max_id)
-            .outerjoin(Mod, HofFile.mod_id == Mod.id)
-            .order_by(HofFile.filename)
-            .all()
-        )
+    def get_library_hofs(self, search=None):
+        """Возвращает список уникальных (по содержимому) HOF-файлов с информацией о моде-источнике."""
+        catalog = HofCatalog(self.session)
+        catalog.refresh()
 
         hof_data = []
-        for hof, mod_name in results:
+        for hof, copies, entry, mod_name in catalog.library(search):
+            desc = hof.description
+            if entry is not None and entry.name:
+                desc = f"{entry.name} · остановок: {entry.stations}, конечных: {entry.termini}"
             hof_data.append({
                 "id": hof.id,
                 "name": hof.filename,
-                "desc": hof.description,
+                "desc": desc,
+                "title": entry.name if entry is not None else None,
+                "stations": entry.stations if entry is not None else None,
+                "termini": entry.termini if entry is not None else None,
+                "copies": copies,
                 "mod_name": mod_name if mod_name else "Импорт / Общее"
             })
 
         return hof_data
 
+    @perf.timed("hof.scan_buses")
     def scan_for_buses(self):
         """Сканирует папку Vehicles и возвращает ТОЛЬКО играбельный транспорт."""
-        buses = []
         if not self.vehicles_path or not self.vehicles_path.exists():
             return []
+        # При запущенном watcher'е список и разбор каждой папки живут до изменений в Vehicles
+        return watcher.cached("buses", None, self._scan_buses)
 
+    def _scan_buses(self):
+        buses = []
         try:
             entries = sorted(os.scandir(self.vehicles_path), key=lambda e: e.name.lower())
         except OSError:
@@ -71,37 +70,44 @@ class HofTools:
 
         for entry in entries:
             if not entry.is_dir(): continue
-
-            bus_folder_path = Path(entry.path)
-            # Ищем файлы конфигурации
-            bus_files = list(bus_folder_path.glob("*.bus")) + list(bus_folder_path.glob("*.ovh"))
-
-            if not bus_files: continue
-
-            folder_display_name = None
-            is_folder_playable = False
-            vehicle_type = 'bus'  # bus or car
-
-            for b_file in bus_files:
-                analysis = self._analyze_is_playable(b_file)
-
-                if analysis['playable']:
-                    is_folder_playable = True
-                    if analysis['name']:
-                        folder_display_name = analysis['name']
-                    if b_file.suffix == '.ovh':
-                        vehicle_type = 'car'
-                    break
-
-            if is_folder_playable:
-                buses.append({
-                    "folder": entry.name,
-                    "name": folder_display_name if folder_display_name else entry.name,
-                    "type": vehicle_type
-                })
+            bus = watcher.cached("bus", entry.name, lambda: self._analyze_bus_folder(entry))
+            if bus:
+                buses.append(bus)
 
         return buses
 
+    def _analyze_bus_folder(self, entry):
+        bus_folder_path = Path(entry.path)
+        # Ищем файлы конфигурации
+        bus_files = list(bus_folder_path.glob("*.bus")) + list(bus_folder_path.glob("*.ovh"))
+
+        if not bus_files:
+            return None
+
+        folder_display_name = None
+        is_folder_playable = False
+        vehicle_type = 'bus'  # bus or car
+
+        for b_file in bus_files:
+            analysis = self._analyze_is_playable(b_file)
+
+            if analysis['playable']:
+                is_folder_playable = True
+                if analysis['name']:
+                    folder_display_name = analysis['name']
+                if b_file.suffix == '.ovh':
+                    vehicle_type = 'car'
+                break
+
+        perf.count("bus_files", len(bus_files))
+        if not is_folder_playable:
+            return None
+        return {
+            "folder": entry.name,
+            "name": folder_display_name if folder_display_name else entry.name,
+            "type": vehicle_type
+        }
+
     def _analyze_is_playable(self, file_path):
         """Жесткая проверка файла. Трафик не пройдет."""
         res = {'playable': False, 'name': None}
@@ -141,54 +147,91 @@ class HofTools:
         except:
             return res
 
+    @perf.timed("hof.scan_game")
     def scan_existing_game_hofs(self):
-        """Ищет HOF файлы уже установленные в игре, которых нет в библиотеке."""
+        """Ищет HOF файлы уже установленные в игре, содержимого которых нет в библиотеке."""
         found_hofs = {}
         if not self.vehicles_path or not self.vehicles_path.exists():
             return []
 
         self.logger.log("Сканирование папки Vehicles на наличие HOF...", "info")
+        perf.phase("walk")
+
+        try:
+            entries = sorted(os.scandir(self.vehicles_path), key=lambda e: e.name.lower())
+        except OSError:
+            return []
 
-        for root, _, files in os.walk(self.vehicles_path):
+        for entry in entries:
+            if entry.is_dir():
+                # Обход папки автобуса кэшируется, пока watcher не увидит в ней изменений
+                folder_hofs = watcher.cached("game_hofs", entry.name, lambda: self._walk_hofs(entry.path))
+            elif entry.name.lower().endswith('.hof'):
+                folder_hofs = self._hashed_hofs([(entry.name, entry.path)])
+            else:
+                continue
+            # Одинаковый HOF во многих автобусах — одна находка
+            for file, path, cid in folder_hofs:
+                if cid not in found_hofs:
+                    found_hofs[cid] = (file, path)
+
+        perf.phase("db_compare")
+        catalog = HofCatalog(self.session)
+        catalog.refresh()
+        known = catalog.known_hashes(found_hofs)
+
+        return [{"name": name, "path": path} for cid, (name, path) in found_hofs.items() if cid not in known]
+
+    @staticmethod
+    def _walk_hofs(folder):
+        hofs = []
+        for root, _, files in os.walk(folder):
+            perf.count("dirs")
             for file in files:
                 if file.lower().endswith('.hof'):
-                    if file not in found_hofs:
-                        found_hofs[file] = os.path.join(root, file)
-
-        existing_names = {h.filename for h in self.session.query(HofFile).all()}
-        unique_new = []
-
-        for name, path in found_hofs.items():
-            if name not in existing_names:
-                unique_new.append({"name": name, "path": path})
+                    hofs.append((file, os.path.join(root, file)))
+        return HofTools._hashed_hofs(hofs)
 
-        return unique_new
+    @staticmethod
+    def _hashed_hofs(hofs):
+        result = []
+        for file, path in hofs:
+            try:
+                result.append((file, path, content_id(path)))
+            except OSError:
+                continue
+        perf.count("hashed", len(result))
+        return result
 
+    @perf.timed("hof.import")
     def import_game_hofs(self, hof_list):
-        """Импортирует выбранные HOF из игры в библиотеку менеджера"""
+        """Импортирует выбранные HOF из игры в библиотеку менеджера (содержимое, которое уже есть, пропускается)"""
+        catalog = HofCatalog(self.session)
+        hashed = [(item, self._content_id(item['path'])) for item in hof_list]
+        known = catalog.known_hashes(cid for _, cid in hashed if cid)
         imported_count = 0
-        for item in hof_list:
+        for item, cid in hashed:
             src = Path(item['path'])
-            target = self.hof_lib_path / item['name']
-
-            if target.exists():
+            if cid is None:
+                self.logger.log(f"Ошибка импорта {item['name']}: файл не читается", "error")
                 continue
-
+            if cid in known:
+                continue
+            known.add(cid)
             try:
+                target = self.hof_lib_path / item['name']
+                if target.exists():
+                    # Другой HOF с тем же именем — кладем рядом, а не пропускаем
+                    target = self.hof_lib_path / f"{target.stem}_{cid[:8]}{target.suffix}"
                 shutil.copy2(src, target)
-                desc = "Imported from Game"
-                try:
-                    with open(target, 'r', encoding='latin-1') as f:
-                        line = f.readline().strip()
-                        if line and "[name]" not in line:
-                            desc = line[:50]
-                except:
-                    pass
+                catalog.register(target, cid)
+                entry = self.session.get(HofCatalogEntry, cid)
 
                 new_hof = HofFile(
-                    filename=item['name'],
+                    filename=target.name,
                     full_source_path=str(target),
-                    description=desc,
+                    description=entry.name if entry is not None and entry.name else "Imported from Game",
+                    content_hash=cid,
                     mod_id=None
                 )
                 self.session.add(new_hof)
@@ -199,8 +242,23 @@ class HofTools:
         self.session.commit()
         return imported_count
 
+    @staticmethod
+    def _content_id(path):
+        try:
+            return content_id(path)
+        except OSError:
+            return None
+
+    @perf.timed("hof.inject")
     def install_hofs_to_buses(self, hof_ids, bus_folder_names):
         """Устанавливает HOF файлы через СИМЛИНКИ."""
+        with backup_lock:
+            result = self._install_hofs_to_buses(hof_ids, bus_folder_names)
+        if self.installer.staged_backups:
+            hasher.start(self.config, self.logger)
+        return result
+
+    def _install_hofs_to_buses(self, hof_ids, bus_folder_names):
         hofs = self.session.query(HofFile).filter(HofFile.id.in_(hof_ids)).all()
         if not hofs: return False, "No HOFs selected"
 
@@ -211,7 +269,7 @@ class HofTools:
         self.logger.log(f"Инъекция {len(hofs)} HOF в {len(bus_folder_names)} автобусов...", "info")
 
         for bus_name in bus_folder_names:
-            bus_path_rel = Path("Vehicles") / bus_name
+            bus_path_rel = Path(self.vehicles_path.name) / bus_name
 
             # Полный путь к папке автобуса
             bus_full_path = self.game_root / bus_path_rel
@@ -239,6 +297,7 @@ class HofTools:
 
                 try:
                     backup, _ = self.installer._install_file_physically(target_rel_path, src_candidate)
+                    perf.count("links")
 
                     install_record = HofInstall(
                         hof_file_id=hof.id,
@@ -254,24 +313,38 @@ class HofTools:
                 if current % 5 == 0:
                     self.logger.log(None, "progress", int(current / total_ops * 100))
 
+        perf.phase("db_commit")
         self.session.commit()
 
         if errors:
             return False, f"Завершено с ошибками ({len(errors)})"
         return True, "HOF файлы успешно привязаны (симлинки)!"
 
+    @perf.timed("hof.uninstall")
     def uninstall_all_hofs(self):
         """Удаляет ВСЕ установленные HOF файлы и восстанавливает оригиналы."""
-        installs = self.session.query(HofInstall).all()
-        if not installs:
-            return True, "Нет установленных HOF файлов."
-
-        self.logger.log(f"Удаление {len(installs)} HOF файлов...", "info")
-
+        with backup_lock:
+            installs = self.session.query(HofInstall).all()
+            if not installs:
+                return True, "Нет установленных HOF файлов."
+
+            self.logger.log(f"Удаление {len(installs)} HOF файлов...", "info")
+            count = self.uninstall_records(installs)
+            self.session.commit()
+        return True, f"Откачено {count} файлов."
+
+    def uninstall_records(self, installs):
+        """Снимает указанные установки HOF (без commit). Возвращает число откаченных."""
+        with backup_lock:
+            return self._uninstall_records(installs)
+
+    def _uninstall_records(self, installs):
         count = 0
         for record in installs:
             try:
-                target_full = self.game_root / record.game_rel_path  # Используем правильное поле game_rel_path
+                # Путь бэкапа мог смениться фоновым обработчиком после загрузки записи
+                self.session.refresh(record, ["backup_path"])
+                target_full = self.installer._target(record.game_rel_path)
 
                 if target_full.is_symlink() or target_full.exists():
                     if target_full.is_dir():
@@ -282,12 +355,10 @@ class HofTools:
                 if record.backup_path:
                     backup = Path(record.backup_path)
                     if backup.exists() and not target_full.exists():
-                        shutil.move(str(backup), str(target_full))
+                        restore_backup(backup, target_full)
 
                 self.session.delete(record)
                 count += 1
             except Exception as e:
                 self.logger.log(f"Ошибка отката {record.game_rel_path}: {e}", "warning")
-
-        self.session.commit()
-        return True, f"Откачено {count} файлов."
\ No newline at end of file
+        return count
@@ -1,145 +1,71 @@
 import os
 import shutil
-import sys
-import time
-import subprocess
-import re
 from datetime import datetime
-from pathlib import Path
-from core.database import Mod, ModFile, HofFile, ModType
+from pathlib import Path, PurePosixPath
+from core.database import Mod, ModFile, HofFile, ModType, UnitOfWork
 from core.analyzer import ModAnalyzer
+from core.extractor import ArchiveExtractor
+from core.hof_catalog import HofCatalog
+from core.storage import BlobStore, content_id
+from core.linking import fast_copy
+from core.perf import perf
+from core.previews import previews
 
+# Папка внутри мода, куда складываются все HOF файлы
+HOF_STORAGE_DIR = "_hofs"
 
-class ModImporter:
-    def __init__(self, config_manager, logger):
+
+class ModImporter(UnitOfWork):
+    def __init__(self, config_manager, logger, session=None):
         self.config = config_manager
-        self.session = config_manager.session
+        self._open_session(config_manager, session)
         self.logger = logger
 
-        # Логика определения пути (дублируем, чтобы не делать лишних импортов)
-        if getattr(sys, 'frozen', False):
-            # Если запущено как EXE
-            base_dir = sys._MEIPASS
-        else:
-            # Если запущено как скрипт
-            base_dir = os.path.abspath(".")
-
-        # Указываем путь к exe внутри папки 7Zip
-        self.seven_zip_tool = os.path.join(base_dir, "7Zip", "7z.exe")
-
     def _progress_callback(self, percent, text=None):
         self.logger.log(text, level="progress", progress=percent)
 
-    def _extract_archive(self, archive_path, target_path):
+    def _extract_archive(self, archive_path, target_path, relocate, relocated_only=False):
         """
-        Универсальная сверхбыстрая распаковка через 7z.exe для ZIP, 7Z и RAR.
+        Распаковка ZIP, 7Z и RAR сразу в итоговую раскладку (relocate — файлы не на своем месте).
+        7-Zip с потоковым разбором прогресса, без него — встроенный распаковщик (ZIP/7Z).
         """
-        if not os.path.exists(self.seven_zip_tool):
-            self.logger.log("Ошибка: Не найден 7z.exe и 7z.dll в корне приложения!", "error")
-            raise FileNotFoundError("7z.exe missing")
-
-        target_path_str = str(target_path)
-        ext = archive_path.suffix.lower()
-
-        self.logger.log(f"Распаковка {ext} через 7-Zip Engine...", "info")
-
-        # Команды 7z:
-        # x : извлечь с сохранением путей
-        # -o : путь назначения
-        # -y : отвечать "да" на все вопросы
-        # -bsp1 : выводить прогресс в поток (важно для перехвата процентов)
-        cmd = [
-            self.seven_zip_tool,
-            "x", str(archive_path),
-            f"-o{target_path_str}",
-            "-y",
-            "-bsp1"
-        ]
-
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            creationflags=subprocess.CREATE_NO_WINDOW
+        extractor = ArchiveExtractor(
+            self.logger,
+            progress_callback=lambda percent: self._progress_callback(percent, f"Распаковка: {percent}%")
         )
-
-        # Регулярка ловит " 45%"
-        pattern = re.compile(r"(\d+)%")
-
-        while True:
-            # 7z выводит прогресс в stdout при использовании -bsp1
-            char = process.stdout.read(8)
-            if not char and process.poll() is not None:
-                break
-
-            if char:
-                match = pattern.search(char)
-                if match:
-                    percent = int(match.group(1))
-                    self._progress_callback(percent, f"Распаковка: {percent}%")
-
-        if process.returncode != 0:
-            err_msg = process.stderr.read()
-            self.logger.log(f"7-Zip Error: {err_msg}", "error")
-            raise Exception("Extraction failed")
-
+        extractor.extract_planned(archive_path, target_path, relocate, relocated_only=relocated_only)
         self._progress_callback(100, "Распаковка завершена")
 
+    @perf.timed("import.preview")
     def step1_prepare_preview(self, archive_path):
+        """
+        Читает только оглавление архива, анализирует структуру и планирует раскладку.
+        На диск ничего не пишется — распаковка происходит в step2 сразу в итоговые места.
+        Раскладка остается на стороне Python (core/previews.py), возвращается сводка по папкам.
+        """
         archive_path = Path(archive_path)
+        perf.annotate(archive=archive_path.name, archive_bytes=archive_path.stat().st_size if archive_path.exists() else 0)
         mod_folder_name = f"{archive_path.stem}_{int(datetime.now().timestamp())}"
         extract_path = Path(self.config.library_path) / "Mods" / mod_folder_name
 
         try:
-            extract_path.mkdir(parents=True, exist_ok=True)
-            # Вызываем нашу новую универсальную распаковку
-            self._extract_archive(archive_path, extract_path)
+            perf.phase("list")
+            entries = ArchiveExtractor(self.logger).list_entries(archive_path)
         except Exception as e:
-            if extract_path.exists(): shutil.rmtree(extract_path)
+            self.logger.log(f"Ошибка чтения архива: {e}", "error")
             return None
 
-        # --- Дальше идет анализ (analyzer.py), который мы уже довели до ума ---
+        files = [e for e in entries if not e.is_dir]
+
         self.logger.log("Анализ структуры...", "info")
-        analyzer = ModAnalyzer(extract_path)
+        perf.phase("analyze")
+        analyzer = ModAnalyzer(extract_path, files=[e.path for e in files],
+                               dirs=[e.path for e in entries if e.is_dir])
         structure = analyzer.analyze()
 
-        mapped_files = []
-        mod_root = extract_path
-        analysis_root = structure['root_path'] or mod_root
-        implicit_buses = structure.get('implicit_buses', [])
-
-        for root, _, files in os.walk(mod_root):
-            for file in files:
-                full_path = Path(root) / file
-                rel_path = full_path.relative_to(mod_root)
-
-                # Логика HOF (как договорились — отдельно)
-                if file.lower().endswith('.hof'):
-                    mapped_files.append({"source": str(rel_path), "target": "Хранилище HOF", "status": "hof"})
-                    continue
-
-                try:
-                    path_from_root = full_path.relative_to(analysis_root)
-                    top_folder = path_from_root.parts[0] if path_from_root.parts else ""
-
-                    if top_folder.lower() in ModAnalyzer.OMSI_ROOT_FOLDERS:
-                        target = str(path_from_root);
-                        status = "mapped"
-                    elif top_folder in implicit_buses:
-                        target = str(Path("Vehicles") / path_from_root);
-                        status = "mapped"
-                    elif structure.get('is_flat_bus'):
-                        target = str(Path("Vehicles") / archive_path.stem / path_from_root);
-                        status = "mapped"
-                    else:
-                        target = str(Path("Addons") / archive_path.stem / path_from_root);
-                        status = "addon"
-                except ValueError:
-                    target = str(Path("Addons") / archive_path.stem / rel_path);
-                    status = "addon"
-
-                mapped_files.append({"source": str(rel_path), "target": target, "status": status})
+        perf.phase("mapping")
+        mapped_files = self._plan_layout(files, structure, extract_path, archive_path.stem)
+        perf.count("files", len(mapped_files))
 
         # Конвертация для JS
         structure_js = structure.copy()
@@ -147,59 +73,378 @@ class ModImporter:
         if structure_js.get('root_path'): structure_js['root_path'] = str(structure_js['root_path'])
         structure_js['implicit_buses'] = list(structure_js['implicit_buses'])
 
-        return {
-            "temp_id": str(extract_path),
+        temp_id = previews.put({
+            "extract_path": str(extract_path),
+            "archive_path": str(archive_path),
             "mod_name": archive_path.stem,
             "type": structure['type'].value,
             "mapped_files": mapped_files,
             "structure_data": structure_js
-        }
+        })
+        return previews.summary(temp_id)
 
-    # step2_confirm_import остается таким же (с перемещением HOF файлов)
-    def step2_confirm_import(self, preview_data):
-        extract_path = Path(preview_data['temp_id'])
+    def _plan_layout(self, files, structure, mod_root, mod_stem):
+        """
+        Для каждого файла архива: куда он ляжет в библиотеке и куда — в игре.
+        HOF сразу планируются в _hofs/ (поле 'stored'), с уникальными именами.
+        """
+        mapped_files = []
+        analysis_root = PurePosixPath(Path(structure['root_path'] or mod_root).relative_to(mod_root).as_posix())
+        implicit_buses = structure.get('implicit_buses', [])
+        hof_names = set()
+
+        for entry in files:
+            rel_path = PurePosixPath(entry.path)
+
+            # Логика HOF (как договорились — отдельно)
+            if rel_path.name.lower().endswith('.hof'):
+                stored_name, n = rel_path.name, 1
+                while stored_name.lower() in hof_names:
+                    stored_name = f"{rel_path.stem}_{n}{rel_path.suffix}"
+                    n += 1
+                hof_names.add(stored_name.lower())
+                mapped_files.append({"source": str(Path(entry.path)), "member": entry.name,
+                                     "stored": f"{HOF_STORAGE_DIR}/{stored_name}",
+                                     "target": "Хранилище HOF", "status": "hof",
+                                     "crc": entry.crc, "size": entry.size})
+                continue
+
+            try:
+                path_from_root = rel_path.relative_to(analysis_root) if str(analysis_root) != "." else rel_path
+                top_folder = path_from_root.parts[0] if path_from_root.parts else ""
+
+                if top_folder.lower() in ModAnalyzer.OMSI_ROOT_FOLDERS:
+                    target = str(Path(path_from_root));
+                    status = "mapped"
+                elif top_folder in implicit_buses:
+                    target = str(Path("Vehicles") / path_from_root);
+                    status = "mapped"
+                elif structure.get('is_flat_bus'):
+                    target = str(Path("Vehicles") / mod_stem / path_from_root);
+                    status = "mapped"
+                else:
+                    target = str(Path("Addons") / mod_stem / path_from_root);
+                    status = "addon"
+            except ValueError:
+                target = str(Path("Addons") / mod_stem / rel_path);
+                status = "addon"
+
+            mapped_files.append({"source": str(Path(entry.path)), "member": entry.name,
+                                 "target": target, "status": status, "crc": entry.crc, "size": entry.size})
+
+        return mapped_files
+
+    @perf.timed("import.confirm")
+    def step2_confirm_import(self, temp_id):
+        preview_data = previews.get(temp_id)
+        if preview_data is None:
+            self.logger.log("Предпросмотр импорта устарел — выберите архив заново.", "error")
+            return False
+        extract_path = Path(preview_data['extract_path'])
         mod_name = preview_data['mod_name']
-        self.logger.log("Запись в БД и сортировка HOF...", "info")
+        mapped_files = preview_data['mapped_files']
+        perf.annotate(mod=mod_name)
+
+        # В режиме "archive" канонической копией остается архив: распаковываются только HOF,
+        # остальное — при включении мода (core/mod_cache.py)
+        archive_mode = self.config.get_storage_mode() == "archive"
+        perf.annotate(storage_mode="archive" if archive_mode else "extract")
+
+        # Распаковка сразу в итоговую раскладку: HOF ложатся в _hofs без перемещений и чистки папок
+        perf.phase("extract")
+        relocate = {f['member']: f['stored'] for f in mapped_files if f.get('stored')}
+        archive_copy = None
+        try:
+            extract_path.mkdir(parents=True, exist_ok=True)
+            self._extract_archive(preview_data['archive_path'], extract_path, relocate, relocated_only=archive_mode)
+            if archive_mode:
+                archive_copy = self._store_archive_copy(Path(preview_data['archive_path']), extract_path.name)
+        except Exception as e:
+            self.logger.log(f"Ошибка распаковки: {e}", "error")
+            if extract_path.exists(): shutil.rmtree(extract_path)
+            return False
 
+        # Хеши содержимого + дедупликация одинаковых файлов через общее хранилище блобов
+        perf.phase("dedup")
+        content_ids = self._dedup_files(extract_path, mapped_files, hofs_only=archive_mode)
+
+        self.logger.log("Запись в БД...", "info")
+        perf.phase("db_records")
         new_mod = Mod(name=mod_name, mod_type=ModType(preview_data['type']), storage_path=str(extract_path),
-                      is_enabled=False)
+                      is_enabled=False, archive_path=archive_copy, is_materialized=not archive_mode)
         self.session.add(new_mod)
         self.session.flush()
+        catalog = HofCatalog(self.session)
 
-        hof_storage_dir = extract_path / "_hofs"
-        hof_storage_dir.mkdir(exist_ok=True)
-
-        for file_info in preview_data['mapped_files']:
+        for file_info, cid in zip(mapped_files, content_ids):
             is_hof = file_info['status'] == 'hof'
-            final_source = file_info['source']
+            final_source = str(Path(file_info.get('stored') or file_info['source']))
             target = file_info['target'] if not is_hof else None
 
             if is_hof:
-                full_src = extract_path / final_source
-                new_path = hof_storage_dir / full_src.name
-                if new_path.exists():
-                    new_path = hof_storage_dir / f"{full_src.stem}_{int(time.time())}{full_src.suffix}"
-                try:
-                    shutil.move(str(full_src), str(new_path))
-                    final_source = str(new_path.relative_to(extract_path))
-                except:
-                    pass
-                self.session.add(HofFile(mod_id=new_mod.id, filename=new_path.name,
-                                         full_source_path=str(extract_path / final_source),
-                                         description="Auto-extracted"))
+                hof_path = extract_path / final_source
+                self.session.add(HofFile(mod_id=new_mod.id, filename=Path(final_source).name,
+                                         full_source_path=str(hof_path), description="Auto-extracted",
+                                         content_hash=catalog.register(hof_path, cid)))
+                perf.count("hofs")
 
             self.session.add(
                 ModFile(mod_id=new_mod.id, source_rel_path=final_source, target_game_path=target, is_hof=is_hof,
-                        file_hash="pending"))
+                        file_hash=cid, archive_member=file_info.get('member'),
+                        archive_crc=file_info.get('crc'), size=file_info.get('size')))
 
+        perf.count("files", len(mapped_files))
+        perf.phase("db_commit")
         self.session.commit()
-        for root, dirs, files in os.walk(extract_path, topdown=False):
-            for name in dirs:
-                try:
-                    os.rmdir(os.path.join(root, name))
-                except:
-                    pass
+        previews.discard(temp_id)
         return True
 
-    def cancel_import(self, temp_path):
-        if Path(temp_path).exists(): shutil.rmtree(temp_path)
\ No newline at end of file
+    def _store_archive_copy(self, archive_path, name):
+        """
+        Каноническая копия архива в Library/Archives. Именно копия, не жесткая ссылка: архив
+        пользователя (или загрузчик, дописывающий тот же файл) может измениться на месте,
+        и вместе с ним изменилась бы библиотека. fast_copy на Btrfs/XFS — reflink без копирования данных.
+        """
+        archives_dir = Path(self.config.library_path) / "Archives"
+        archives_dir.mkdir(parents=True, exist_ok=True)
+        target = archives_dir / f"{name}{archive_path.suffix.lower()}"
+        fast_copy(archive_path, target)
+        return str(target)
+
+    def _dedup_files(self, extract_path, mapped_files, hofs_only=False):
+        """Content id для каждого файла (в порядке mapped_files); дубликаты становятся ссылками на блобы."""
+        store = BlobStore(self.config.library_path)
+        content_ids = []
+        saved = 0
+        for i, file_info in enumerate(mapped_files):
+            if hofs_only and file_info['status'] != 'hof':
+                # Файл еще в архиве — хеш посчитается при распаковке в кэш
+                content_ids.append("pending")
+                continue
+            try:
+                cid, saved_bytes = store.ingest(extract_path / (file_info.get('stored') or file_info['source']))
+                saved += saved_bytes
+            except OSError:
+                cid = "pending"
+            content_ids.append(cid)
+            if i % 500 == 0:
+                self._progress_callback(int(i * 100 / len(mapped_files)), "Проверка дубликатов...")
+
+        perf.count("dedup_saved_bytes", saved)
+        if saved:
+            self.logger.log(f"Дедупликация: сэкономлено {saved / 1024 / 1024:.1f} МБ", "info")
+        return content_ids
+
+    # --- Обновление мода новой версией архива ---
+
+    @perf.timed("update.preview")
+    def step1_prepare_update(self, mod_id, archive_path):
+        """
+        Как step1_prepare_preview, но для новой версии уже импортированного мода:
+        раскладка планируется в его же папку, плюс сводка отличий от текущего манифеста.
+        """
+        mod = self.session.get(Mod, mod_id)
+        if not mod:
+            return None
+        archive_path = Path(archive_path)
+        storage = Path(mod.storage_path)
+        perf.annotate(mod=mod.name, archive=archive_path.name)
+
+        try:
+            perf.phase("list")
+            entries = ArchiveExtractor(self.logger).list_entries(archive_path)
+        except Exception as e:
+            self.logger.log(f"Ошибка чтения архива: {e}", "error")
+            return None
+        files = [e for e in entries if not e.is_dir]
+
+        perf.phase("analyze")
+        structure = ModAnalyzer(storage, files=[e.path for e in files],
+                                dirs=[e.path for e in entries if e.is_dir]).analyze()
+
+        # Addons/<имя> и плоские автобусы — по имени первой версии, иначе сменились бы все пути
+        perf.phase("mapping")
+        mod_stem = storage.name.rsplit("_", 1)[0]
+        mapped_files = self._plan_layout(files, structure, storage, mod_stem)
+
+        perf.phase("diff")
+        diff = self._diff_manifest(mod, mapped_files)
+        summary = {key: len(value) for key, value in diff.items()}
+        perf.annotate(**summary)
+
+        temp_id = previews.put({
+            "extract_path": str(storage),
+            "update_mod_id": mod.id,
+            "archive_path": str(archive_path),
+            "mod_name": mod.name,
+            "type": structure['type'].value,
+            "mapped_files": mapped_files,
+            "diff": summary,
+        })
+        return previews.summary(temp_id)
+
+    def _diff_manifest(self, mod, mapped_files):
+        """
+        Сравнение манифестов по пути файла в библиотеке и CRC/размеру из оглавления архива.
+        unknown — CRC неизвестен (мод импортирован до появления манифеста) при том же размере:
+        такие файлы распаковываются и сравниваются по content id.
+        """
+        current = {f.source_rel_path: f for f in mod.files}
+        diff = {"added": [], "changed": [], "unknown": [], "retargeted": [], "unchanged": [], "removed": []}
+
+        for info in mapped_files:
+            rel = str(Path(info.get('stored') or info['source']))
+            old = current.pop(rel, None)
+            if old is None:
+                diff["added"].append(info)
+                continue
+            if old.size is not None and info.get('size') is not None and old.size != info['size']:
+                diff["changed"].append((old, info))
+            elif old.archive_crc and info.get('crc'):
+                diff["changed" if old.archive_crc != info['crc'] else "unchanged"].append((old, info))
+            else:
+                diff["unknown"].append((old, info))
+
+            # Тот же файл, но другое место в игре — меняется только запись, ссылку перенесет синхронизация
+            target = info['target'] if info['status'] != 'hof' else None
+            if target != old.target_game_path:
+                diff["retargeted"].append((old, info))
+
+        diff["removed"] = list(current.values())
+        return diff
+
+    @perf.timed("update.confirm")
+    def confirm_update(self, temp_id):
+        """
+        Применяет новую версию к существующему моду: распаковываются только новые и измененные
+        файлы (через временную папку и os.replace — файл мода может быть жесткой ссылкой на блоб),
+        удаленные убираются из библиотеки. Запись Mod (id, приоритет, включенность) остается.
+        Возвращает (успех, сообщение, {сводка, mod_id, changed_targets — пути в игре с новым содержимым}).
+        """
+        preview_data = previews.get(temp_id)
+        if preview_data is None or 'update_mod_id' not in preview_data:
+            return False, "Предпросмотр обновления устарел — выберите архив заново", {}
+        mod = self.session.get(Mod, preview_data['update_mod_id'])
+        if not mod:
+            return False, "Мод не найден", {}
+        storage = Path(mod.storage_path)
+        archive_path = Path(preview_data['archive_path'])
+        perf.annotate(mod=mod.name)
+
+        diff = self._diff_manifest(mod, preview_data['mapped_files'])
+        # В режиме "archive" невыгруженный мод распаковывать не нужно — только HOF
+        materialized = not mod.archive_path or mod.is_materialized
+
+        def rel_of(info):
+            return str(Path(info.get('stored') or info['source']))
+
+        candidates = diff["added"] + [info for _, info in diff["changed"] + diff["unknown"]]
+        to_extract = [info for info in candidates if materialized or info['status'] == 'hof']
+
+        perf.phase("extract")
+        staging = storage / ".update_tmp"
+        try:
+            if to_extract:
+                staging.mkdir(parents=True, exist_ok=True)
+                relocate = {info['member']: Path(rel_of(info)).as_posix() for info in to_extract}
+                self._extract_archive(archive_path, staging, relocate, relocated_only=True)
+        except Exception as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            self.logger.log(f"Ошибка распаковки: {e}", "error")
+            return False, f"Ошибка распаковки: {e}", {}
+
+        perf.phase("apply")
+        store = BlobStore(self.config.library_path)
+        released = []
+        changed_targets = []
+        extracted = {rel_of(info) for info in to_extract}
+
+        # Файлы без CRC: одинаковое содержимое — только дописываем манифест
+        for old, info in diff["unknown"]:
+            staged = staging / rel_of(info)
+            if rel_of(info) in extracted and staged.exists() and content_id(staged) == old.file_hash:
+                staged.unlink()
+                extracted.discard(rel_of(info))
+                diff["unchanged"].append((old, info))
+            else:
+                diff["changed"].append((old, info))
+
+        for rel in extracted:
+            staged, final = staging / rel, storage / rel
+            final.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged, final)
+        shutil.rmtree(staging, ignore_errors=True)
+
+        catalog = HofCatalog(self.session)
+        for old, info in diff["changed"]:
+            released.append(old.file_hash)
+            old.file_hash = store.ingest(storage / old.source_rel_path)[0] if old.source_rel_path in extracted else "pending"
+            if old.target_game_path:
+                changed_targets.append(old.target_game_path)
+            if old.is_hof:
+                # Новое содержимое HOF — новая запись каталога
+                for hof in self.session.query(HofFile).filter_by(mod_id=mod.id, full_source_path=str(storage / old.source_rel_path)):
+                    hof.content_hash = catalog.register(storage / old.source_rel_path, old.file_hash)
+        for old, info in diff["changed"] + diff["unchanged"]:
+            old.archive_crc, old.size, old.archive_member = info.get('crc'), info.get('size'), info.get('member')
+        for old, info in diff["retargeted"]:
+            old.target_game_path = info['target'] if info['status'] != 'hof' else None
+
+        for info in diff["added"]:
+            rel = rel_of(info)
+            is_hof = info['status'] == 'hof'
+            cid = store.ingest(storage / rel)[0] if rel in extracted else "pending"
+            if is_hof:
+                self.session.add(HofFile(mod_id=mod.id, filename=Path(rel).name,
+                                         full_source_path=str(storage / rel), description="Auto-extracted",
+                                         content_hash=catalog.register(storage / rel, cid)))
+            self.session.add(ModFile(mod_id=mod.id, source_rel_path=rel, target_game_path=None if is_hof else info['target'],
+                                     is_hof=is_hof, file_hash=cid, archive_member=info.get('member'),
+                                     archive_crc=info.get('crc'), size=info.get('size')))
+
+        perf.phase("remove")
+        for old in diff["removed"]:
+            released.append(old.file_hash)
+            try:
+                (storage / old.source_rel_path).unlink()
+            except OSError:
+                pass
+            if old.is_hof:
+                for hof in self.session.query(HofFile).filter_by(mod_id=mod.id, full_source_path=str(storage / old.source_rel_path)):
+                    if hof.installs and self.config.game_path:
+                        # HOF пропал из новой версии — снимаем его из автобусов, куда он был установлен
+                        from core.hof_tools import HofTools
+                        HofTools(self.config, self.logger, session=self.session).uninstall_records(list(hof.installs))
+                    self.session.delete(hof)
+            self.session.delete(old)
+
+        # Каноническая копия архива (режим "archive") — новая версия
+        if mod.archive_path:
+            old_archive = mod.archive_path
+            mod.archive_path = self._store_archive_copy(archive_path, f"{storage.name}_{int(datetime.now().timestamp())}")
+            try:
+                os.remove(old_archive)
+            except OSError:
+                pass
+
+        mod.mod_type = ModType(preview_data['type'])
+        mod.install_date = datetime.now()  # Дата версии; заодно новая ревизия строки для UI
+        perf.phase("db_commit")
+        self.session.commit()
+        previews.discard(temp_id)
+        BlobStore(self.config.library_path).release(released)
+
+        summary = {key: len(diff[key]) for key in ("added", "changed", "removed", "retargeted", "unchanged")}
+        perf.annotate(**summary)
+        msg = (f"Мод '{mod.name}' обновлен: новых {summary['added']}, измененных {summary['changed']}, "
+               f"удаленных {summary['removed']}, без изменений {summary['unchanged']}.")
+        self.logger.log(msg, "success")
+        return True, msg, {**summary, "mod_id": mod.id, "changed_targets": changed_targets}
+
+    def cancel_import(self, temp_id):
+        preview_data = previews.discard(temp_id)
+        # Предпросмотр ничего не распаковывает, но папка могла остаться от прерванного step2
+        # (у обновления это папка самого мода — ее не трогаем)
+        if preview_data and 'update_mod_id' not in preview_data:
+            temp_path = Path(preview_data['extract_path'])
+            if temp_path.exists(): shutil.rmtree(temp_path)
@@ -1,20 +1,44 @@
+import filecmp
 import os
 import shutil
-import hashlib
 from pathlib import Path
-from sqlalchemy import func
-from core.database import Mod, ModFile, InstalledFile, HofFile
-
-
-class ModInstaller:
-    def __init__(self, config_manager, logger):
+from sqlalchemy import func, select, delete, update, or_, and_
+from core.database import Mod, ModFile, InstalledFile, HofFile, UnitOfWork, current_mods_revision, path_key
+from core.perf import perf
+from core.trash import Trash, purger
+from core.backups import BackupStager, backup_lock, hasher, restore_backup
+from core.mod_cache import ModCache
+from core.journal import SyncJournal
+from core.pathcase import CaseResolver
+from core.mod_list import escape_like
+from core.watcher import watcher
+from core.winner_map import winner_map, key_hash, pack_winner
+from core.linking import probe, place, LINK_SYMLINK, LINK_HARDLINK, LINK_COPY
+
+# Операций синхронизации на одну запись плана в журнале и один коммит БД
+SYNC_BATCH_SIZE = 500
+# Строк на страницу при потоковом чтении желаемого/установленного состояния
+SYNC_PAGE_SIZE = 2000
+# Сколько текстов ошибок синхронизации держать для отчета (остальные только считаются)
+MAX_REPORTED_ERRORS = 200
+
+
+class ModInstaller(UnitOfWork):
+    def __init__(self, config_manager, logger, session=None):
         self.config = config_manager
-        self.session = config_manager.session
+        self._open_session(config_manager, session)
         self.logger = logger
         self.game_root = Path(self.config.game_path)
+        # Реальное написание папок игры (ФС с учетом регистра: Linux/Wine), см. core/pathcase.py
+        self.paths = CaseResolver(self.game_root)
+        # Способы установки файла, доступные для этой папки игры (проверка — раз на процесс)
+        self.link_kinds = probe(self.game_root, self.config.library_path)
 
         self.backup_dir = Path(self.config.library_path) / "Backups"
         self.backup_dir.mkdir(parents=True, exist_ok=True)
+        self.stager = BackupStager(self.game_root, self.config.library_path)
+        self.staged_backups = 0
+        self._journal = None
 
     def update_load_order(self, mod_id_list):
         for index, mod_id in enumerate(mod_id_list):
@@ -37,6 +61,37 @@ class ModInstaller:
         self.session.commit()
         return self.sync_state()
 
+    def apply_mod_update(self, mod_id, changed_targets):
+        """
+        После ModImporter.confirm_update: симлинки на измененные файлы уже указывают на новое
+        содержимое, жесткие ссылки и копии (где симлинк недоступен) ставятся заново здесь —
+        подменой, а не записью поверх: запись в жесткую ссылку испортила бы файл библиотеки.
+        Добавленные и удаленные пути — обычной синхронизацией, которая трогает только их.
+        """
+        mod = self.session.get(Mod, mod_id)
+        if not mod or not mod.is_enabled:
+            return True, "Мод выключен — установка не требуется"
+
+        keys = {path_key(p) for p in changed_targets}
+        refreshed = 0
+        if keys:
+            storage = Path(mod.storage_path)
+            sources = {f.target_key: f.source_rel_path for f in mod.files if f.target_key in keys}
+            key_list = sorted(sources)
+            for i in range(0, len(key_list), SYNC_BATCH_SIZE):
+                records = self.session.query(InstalledFile).filter(
+                    InstalledFile.root_path == str(self.game_root), InstalledFile.active_mod_id == mod.id,
+                    InstalledFile.path_key.in_(key_list[i:i + SYNC_BATCH_SIZE]))
+                for record in records:
+                    target = self._target(record.game_path)
+                    if record.link_kind == LINK_SYMLINK or target.is_symlink() or not target.is_file():
+                        continue
+                    record.link_kind = self._retarget_file(record.game_path, storage / sources[record.path_key])
+                    refreshed += 1
+            self.session.commit()
+        perf.count("copies_refreshed", refreshed)
+        return self.sync_state()
+
     def delete_mod_permanently(self, mod_id):
         mod = self.session.query(Mod).get(mod_id)
         if not mod:
@@ -64,14 +119,12 @@ class ModInstaller:
             except Exception as e:
                 self.logger.log(f"Не удалось удалить HOF {hof.filename}: {e}", "warning")
 
-        # Удаление папки
-        try:
-            if storage_path.exists():
-                def on_rm_error(func, path, exc_info):
-                    os.chmod(path, 0o777)
-                    func(path)
+        content_ids = [f.file_hash for f in mod.files]
 
-                shutil.rmtree(storage_path, onerror=on_rm_error)
+        # Папка и архив мода уходят в корзину одним rename; стирание, освобождение блобов
+        # (на них ссылались только файлы этого мода) — в фоне, см. core/trash.py
+        try:
+            Trash(self.config.library_path).put([storage_path, mod.archive_path], content_ids, name=mod_name)
         except Exception as e:
             return False, f"Ошибка удаления файлов с диска: {e}"
 
@@ -81,193 +134,698 @@ class ModInstaller:
         except Exception as e:
             return False, f"Ошибка БД: {e}"
 
+        purger.start(self.config.library_path, self.logger)
         return True, f"Мод '{mod_name}' успешно удален."
 
-    def sync_state(self):
+    @perf.timed("conflicts")
+    def list_conflicts(self):
+        """Включенные моды, которые претендуют хотя бы на один общий файл."""
+        # Ответ зависит только от БД: при запущенном watcher'е кэшируется до следующей ревизии модов
+        return watcher.cached("conflicts", current_mods_revision(self.session), self._compute_conflicts, latest_only=True)
+
+    def _compute_conflicts(self):
+        enabled_mods = self.session.query(Mod).filter_by(is_enabled=True).order_by(Mod.priority).all()
+
+        file_map = {}
+        for mod in enabled_mods:
+            for f in mod.files:
+                path = f.target_game_path
+                if not path: continue
+                path = path.replace("\\", "/").lower()
+                if path.startswith("fonts/"):
+                    continue
+                if path not in file_map:
+                    file_map[path] = []
+                file_map[path].append(mod)
+
+        conflicting_mod_ids = set()
+        for path, mods_list in file_map.items():
+            if len(mods_list) > 1:
+                for m in mods_list:
+                    conflicting_mod_ids.add(m.id)
+
+        result = []
+        for mod in enabled_mods:
+            if mod.id in conflicting_mod_ids:
+                result.append({
+                    "id": mod.id,
+                    "name": mod.name,
+                    "priority": mod.priority
+                })
+        return result
+
+    @perf.timed("sync")
+    def sync_state(self, desired=None):
+        """
+        Приводит папку игры к включенным модам. desired — готовый план победителей
+        (строки как у _desired_stream, по возрастанию target_key; см. core/setup_snapshot.py):
+        тогда он ставится как есть, без разрешения конфликтов по БД.
+        """
+        # Пока идет синхронизация, фоновый обработчик бэкапов не переносит их (core/backups.py)
+        with backup_lock:
+            result = self._sync_state(desired)
+        if self.staged_backups:
+            hasher.start(self.config, self.logger)
+        return result
+
+    def _sync_state(self, desired=None):
         self.logger.log("Сбор данных...", "progress", 0)
+        perf.phase("recover")
+        self.recover_interrupted_sync()
+        # Пропавшие ссылки, замеченные watcher'ом, переустанавливаются этой же синхронизацией
+        perf.phase("drift")
+        self.check_drift()
+        perf.phase("load_state")
 
         # Получаем текущий корень игры (строкой) для фильтрации в БД
         current_root = str(self.game_root)
+        perf.annotate(link_kinds="/".join(self.link_kinds))
 
-        active_mods = self.session.query(Mod).filter_by(is_enabled=True).order_by(Mod.priority).all()
-
-        # Загружаем установленные файлы ТОЛЬКО для текущей папки игры
-        tracked_files_query = self.session.query(InstalledFile).filter_by(root_path=current_root).all()
-        current_installed_map = {rec.game_path.replace("\\", "/").lower(): rec for rec in tracked_files_query}
-
-        # desired_state = { "путь/к/файлу_lowercase": (source_path, mod_id, ORIGINAL_CASE_PATH) }
-        desired_state = {}
-
-        for mod in active_mods:
-            for file in mod.files:
-                if not file.target_game_path: continue
-
-                # Ключ для словаря - lowercase (чтобы избежать дублей File.txt и file.txt)
-                path_key = file.target_game_path.replace("\\", "/").lower()
-
-                full_source = Path(mod.storage_path) / file.source_rel_path
-
-                # ВАЖНО: Мы сохраняем file.target_game_path (оригинальный регистр) третьим элементом
-                desired_state[path_key] = (full_source, mod.id, file.target_game_path)
-
-        to_remove = []
-        to_install = []
+        # Моды не менялись с прошлой синхронизации, и она прошла без ошибок — сравнивать нечего
+        snapshot = winner_map.open(self.config.library_path)
+        if desired is None and snapshot.is_applied(current_root, current_mods_revision(self.session)) \
+                and self._installed_matches(current_root, snapshot.count):
+            perf.count("snapshot_hit")
+            return True, "Изменений не требуется"
+        # Снимок, установленный в эту папку, дополняется операциями синхронизации; иначе — строится заново
+        # (после готового плана тоже: в его строках нет id файлов модов)
+        changes = winner_map.update() if desired is None and snapshot.applied and snapshot.root == current_root else None
 
-        # А) Проверяем, что нужно УДАЛИТЬ
-        for game_path_lower, record in current_installed_map.items():
-            if game_path_lower not in desired_state:
-                to_remove.append(record)
-            elif desired_state[game_path_lower][1] != record.active_mod_id:
-                to_remove.append(record)
+        active_mods = self.session.query(Mod).filter_by(is_enabled=True).order_by(Mod.priority).all()
 
-        # Б) Проверяем, что нужно УСТАНОВИТЬ
-        # Распаковываем теперь 3 значения: source, mod_id и original_case_path
-        for game_path_lower, (source, mod_id, original_case_path) in desired_state.items():
-            if game_path_lower not in current_installed_map:
-                to_install.append((original_case_path, source, mod_id))
-            elif current_installed_map[game_path_lower] in to_remove:
-                to_install.append((original_case_path, source, mod_id))
-
-        total_ops = len(to_remove) + len(to_install)
-        if total_ops == 0:
-            return True, "Изменений не требуется"
+        # Моды, хранящиеся архивом, распаковываются в кэш только сейчас (и лишнее вытесняется)
+        perf.phase("materialize")
+        mod_cache = ModCache(self.config, self.logger, self.session)
+        mod_cache.prepare(active_mods)
+        storage_paths = {mod.id: Path(mod.storage_path) for mod in active_mods}
+        # Поколение снимка — ревизия с учетом last_used, выставленного prepare
+        generation = current_mods_revision(self.session)
+
+        # Оценка объема для прогресса (точное число операций заранее не считаем — план потоковый)
+        total_estimate = (
+            self.session.query(func.count(ModFile.id)).join(Mod).filter(Mod.is_enabled == True).scalar()
+            + self.session.query(func.count(InstalledFile.id)).filter_by(root_path=current_root).scalar()
+        ) or 1
+
+        # Потоковая синхронизация: желаемое и установленное читаются страницами, отсортированными
+        # по ключу пути, и сливаются; операции выполняются пачками с коммитом после каждой.
+        # В памяти одновременно — только текущие страницы и одна пачка, сколько бы файлов ни было.
+        perf.phase("diff")
+        operations = self._diff_stream(current_root, changes, desired)
 
         current_op = 0
+        removed = installed = retargeted = 0
         errors = []
-        new_db_records = []
-
-        # Удаление
-        for record in to_remove:
-            try:
-                self._remove_installed_file(record)
-                self.session.delete(record)
-            except Exception as e:
-                errors.append(f"Err rm {record.game_path}: {e}")
-            current_op += 1
-            if current_op % 20 == 0:
-                self._report_progress(current_op, total_ops, "Удаление старых файлов...")
-
-        self.session.flush()
+        error_count = 0
+        journal = None
 
-        # Установка
-        for original_case_path, source, mod_id in to_install:
-            try:
-                # ВАЖНО: передаем original_case_path (с большими буквами)
-                backup, orig_hash = self._install_file_physically(original_case_path, source)
-
-                new_db_records.append(InstalledFile(
-                    game_path=original_case_path,  # Сохраняем красивый путь в базу
-                    root_path=current_root,
-                    active_mod_id=mod_id,
-                    backup_path=backup,
-                    original_hash=orig_hash
-                ))
-            except PermissionError:
-                # Ловим конкретно ошибку доступа
-                error_msg = f"Access Denied to '{original_case_path}'. Try running the manager as an Administrator."
-                errors.append(error_msg)
-            except Exception as e:
-                # Ловим все остальные ошибки
-                errors.append(f"Err inst {original_case_path}: {e}")
-
-            current_op += 1
-            if current_op % 20 == 0:
-                self._report_progress(current_op, total_ops, "Установка новых файлов...")
-
-        self.logger.log("Сохранение базы данных...", "progress", 99)
-        if new_db_records:
-            self.session.bulk_save_objects(new_db_records)
+        try:
+            for batch in self._batches(operations):
+                if journal is None:
+                    # Операции идут пачками через журнал (core/journal.py): план пачки пишется до
+                    # изменений на диске, после коммита пачки в БД — контрольная точка. Упавшая
+                    # синхронизация разбирается по хвосту журнала (recover_interrupted_sync).
+                    journal = SyncJournal(self.config.library_path)
+                    journal.begin(current_root)
+                    self._journal = journal
+                    winner_map.invalidate()
+
+                to_remove = [rec for op, rec in batch if op == "remove"]
+                to_retarget = [item for op, item in batch if op == "retarget"]
+                # Пути сразу в написании, которое уже есть на диске: его же пишем в журнал и в БД
+                to_install = [(self.paths.resolve(item[0]), item[1], item[2]) for op, item in batch if op == "install"]
+                batch_errors = []
+
+                # Удаление
+                perf.phase("remove")
+                if to_remove:
+                    journal.plan("remove", [
+                        {"id": rec.id, "path": rec.game_path, "bk": rec.backup_path} for rec in to_remove
+                    ])
+                removed_ids = []
+                for record in to_remove:
+                    try:
+                        self._remove_installed_file(record)
+                        removed_ids.append(record.id)
+                    except Exception as e:
+                        batch_errors.append(f"Err rm {record.game_path}: {e}")
+                if removed_ids:
+                    self.session.execute(delete(InstalledFile).where(InstalledFile.id.in_(removed_ids)))
+
+                # Смена победителя: ссылка подменяется на месте, запись (и ее бэкап) остается той же
+                perf.phase("retarget")
+                if to_retarget:
+                    journal.plan("retarget", [
+                        {"id": rec.id, "path": rec.game_path, "src": str(storage_paths[mod_id] / source_rel),
+                         "mod": mod_id}
+                        for rec, (_path, source_rel, mod_id) in to_retarget
+                    ])
+                retargeted_rows = []
+                for record, (_path, source_rel, mod_id) in to_retarget:
+                    try:
+                        link_kind = self._retarget_file(record.game_path, storage_paths[mod_id] / source_rel)
+                        retargeted_rows.append({"id": record.id, "active_mod_id": mod_id, "drift": None,
+                                                "link_kind": link_kind})
+                    except PermissionError:
+                        batch_errors.append(
+                            f"Access Denied to '{record.game_path}'. Try running the manager as an Administrator.")
+                    except Exception as e:
+                        batch_errors.append(f"Err retarget {record.game_path}: {e}")
+                if retargeted_rows:
+                    self.session.execute(update(InstalledFile), retargeted_rows)
+
+                # Установка
+                perf.phase("install")
+                if to_install:
+                    journal.plan("install", [
+                        {"path": path, "src": str(storage_paths[mod_id] / source_rel), "mod": mod_id}
+                        for path, source_rel, mod_id in to_install
+                    ])
+                new_db_records = []
+                for original_case_path, source_rel, mod_id in to_install:
+                    source = storage_paths[mod_id] / source_rel
+                    try:
+                        # ВАЖНО: передаем original_case_path (с большими буквами)
+                        backup, link_kind = self._install_file_physically(original_case_path, source)
+
+                        new_db_records.append(InstalledFile(
+                            # Путь как он теперь на диске (папки, созданные этой же пачкой, — тоже)
+                            game_path=self.paths.resolve(original_case_path),
+                            root_path=current_root,
+                            active_mod_id=mod_id,
+                            backup_path=backup,
+                            link_kind=link_kind
+                        ))
+                    except PermissionError:
+                        # Ловим конкретно ошибку доступа
+                        error_msg = f"Access Denied to '{original_case_path}'. Try running the manager as an Administrator."
+                        batch_errors.append(error_msg)
+                    except Exception as e:
+                        # Ловим все остальные ошибки
+                        batch_errors.append(f"Err inst {original_case_path}: {e}")
+
+                perf.phase("db_commit")
+                if new_db_records:
+                    self.session.bulk_save_objects(new_db_records)
+                self.session.commit()
+                journal.checkpoint()
+
+                removed += len(removed_ids)
+                installed += len(new_db_records)
+                retargeted += len(retargeted_rows)
+                error_count += len(batch_errors)
+                # Тексты ошибок храним ограниченно — иначе память растет вместе с числом сбоев
+                errors.extend(batch_errors[:max(0, MAX_REPORTED_ERRORS - len(errors))])
+
+                current_op += len(batch)
+                self._report_progress(min(current_op, total_estimate), total_estimate, "Применение изменений...")
+                perf.phase("diff")
+
+            if journal is not None:
+                journal.end()
+        finally:
+            self._journal = None
+
+        perf.count("removed", removed)
+        perf.count("installed", installed)
+        perf.count("retargeted", retargeted)
+        perf.count("errors", error_count)
+        if not error_count:
+            perf.phase("winner_map")
+            self.session.commit()
+            self._save_winner_map(current_root, generation, changes)
+        elif changes is not None:
+            changes.discard()
+        if journal is None:
+            return True, "Изменений не требуется"
 
-        self.session.commit()
+        # Вытеснение из кэша — после снятия ссылок, чтобы выключенные моды освобождались сразу
+        perf.phase("cache_evict")
+        if mod_cache.evict(keep_ids={m.id for m in active_mods}):
+            self.session.commit()
 
         if errors:
             # Сообщение-заголовок
-            summary_msg = f"Завершено с ошибками ({len(errors)}). Детали ниже:"
+            summary_msg = f"Завершено с ошибками ({error_count}). Детали ниже:"
             self.logger.log(summary_msg, "warning")
 
             # Отправляем каждую ошибку в лог отдельно
             for error_detail in errors:
                 self.logger.log(str(error_detail), "error")  # Уровень 'error' для красного цвета
+            if error_count > len(errors):
+                self.logger.log(f"... и еще {error_count - len(errors)} ошибок", "error")
 
             return False, summary_msg
 
         return True, "Успешно"
 
+    def _diff_stream(self, current_root, changes=None, desired=None):
+        """
+        Слияние двух потоков, отсортированных по ключу пути:
+        желаемое состояние (победитель по приоритету для каждого пути) и установленное.
+        Выдает ("remove", строка InstalledFile), ("install", (путь, source_rel_path, mod_id))
+        и ("retarget", (строка InstalledFile, (путь, source_rel_path, mod_id))) — путь остается
+        нашим, меняется только источник ссылки. В changes (если передан) — те же операции
+        для снимка победителей (WinnerMapUpdate).
+        desired — готовый план вместо _desired_stream.
+        """
+        desired = iter(desired) if desired is not None else self._desired_stream()
+        tracked = self._installed_stream(current_root)
+        want = next(desired, None)
+        have = next(tracked, None)
+
+        while want is not None or have is not None:
+            if have is None or (want is not None and want.target_key < have.path_key):
+                if changes is not None:
+                    changes.set(key_hash(want.target_key), pack_winner(want.mod_id, want.file_id))
+                yield "install", (want.target_game_path, want.source_rel_path, want.mod_id)
+                want = next(desired, None)
+            elif want is None or have.path_key < want.target_key:
+                if changes is not None:
+                    changes.remove(key_hash(have.path_key))
+                yield "remove", have
+                have = next(tracked, None)
+            else:
+                # Путь уже установлен — перенаправление, только если сменился мод-победитель
+                # или установленная ссылка пропала (check_drift). Бэкап оригинала при этом не трогается
+                if have.active_mod_id != want.mod_id or have.drift == "missing":
+                    if changes is not None:
+                        changes.set(key_hash(want.target_key), pack_winner(want.mod_id, want.file_id))
+                    yield "retarget", (have, (want.target_game_path, want.source_rel_path, want.mod_id))
+                key = want.target_key
+                want = next(desired, None)
+                have = next(tracked, None)
+                # Старые записи-дубли того же пути в другом регистре не трогаем (как и раньше)
+                while have is not None and have.path_key == key:
+                    have = next(tracked, None)
+
+    def _desired_stream(self):
+        """Файлы включенных модов по target_key; для каждого ключа — только мод с наибольшим приоритетом."""
+        last_key = ""
+        while True:
+            rows = self.session.execute(
+                select(ModFile.target_key, ModFile.target_game_path, ModFile.source_rel_path, ModFile.mod_id,
+                       ModFile.id.label("file_id"))
+                .join(Mod, Mod.id == ModFile.mod_id)
+                .where(Mod.is_enabled == True, ModFile.target_key > last_key)
+                .order_by(ModFile.target_key, Mod.priority.desc(), Mod.id.desc())
+                .limit(SYNC_PAGE_SIZE)
+            ).all()
+            for row in rows:
+                # Первая строка ключа — победитель, остальные (перекрытые моды) пропускаем
+                if row.target_key != last_key:
+                    last_key = row.target_key
+                    yield row
+            # Следующая страница начинается после последнего ключа: хвост его проигравших не нужен
+            if len(rows) < SYNC_PAGE_SIZE:
+                return
+
+    def _installed_matches(self, current_root, count):
+        """Установлено ровно count файлов и ни у одного нет расхождения с диском."""
+        total, drifted = self.session.execute(
+            select(func.count(InstalledFile.id), func.count(InstalledFile.drift))
+            .where(InstalledFile.root_path == current_root)
+        ).one()
+        return total == count and drifted == 0
+
+    def _save_winner_map(self, current_root, generation, changes):
+        """
+        Снимок победителей после успешной синхронизации: разницей к прошлому или заново по БД.
+        И то и другое — потоком через WinnerMapUpdate, без копии всей карты в памяти.
+        """
+        try:
+            if changes is None:
+                changes = winner_map.update(base=False)
+                for row in self._desired_stream():
+                    changes.set(key_hash(row.target_key), pack_winner(row.mod_id, row.file_id))
+            else:
+                perf.count("winner_changes", len(changes))
+            changes.commit(current_root, generation)
+        except OSError as e:
+            # Без снимка синхронизация просто не пропускается — это не ошибка синхронизации
+            if changes is not None:
+                changes.discard()
+            perf.annotate(winner_map_error=str(e))
+            self.logger.log(f"Снимок победителей не сохранен: {e}", "warning")
+
+    def _installed_stream(self, current_root):
+        """Установленные файлы папки игры по path_key (keyset-пагинация, без ORM объектов)."""
+        last_key, last_id = "", 0
+        while True:
+            rows = self.session.execute(
+                select(InstalledFile.id, InstalledFile.path_key, InstalledFile.active_mod_id,
+                       InstalledFile.game_path, InstalledFile.backup_path, InstalledFile.drift)
+                .where(InstalledFile.root_path == current_root,
+                       or_(InstalledFile.path_key > last_key,
+                           and_(InstalledFile.path_key == last_key, InstalledFile.id > last_id)))
+                .order_by(InstalledFile.path_key, InstalledFile.id)
+                .limit(SYNC_PAGE_SIZE)
+            ).all()
+            yield from rows
+            if len(rows) < SYNC_PAGE_SIZE:
+                return
+            last_key, last_id = rows[-1].path_key, rows[-1].id
+
+    @perf.timed("drift")
+    def check_drift(self, full=False):
+        """
+        Сверяет установленные файлы с диском и отмечает InstalledFile.drift.
+        Проверяются только пути, которые watcher видел измененными (и файлы модов из измененных
+        папок Library/Mods); full=True или переполнение событий — все файлы текущей папки игры.
+        Без запущенного watcher'а и без full ничего не делает. Возвращает число отмеченных файлов.
+        """
+        full_needed, dirty_keys, dirty_mod_dirs = watcher.take_dirty()
+        full = full or full_needed
+        if not (full or dirty_keys or dirty_mod_dirs):
+            return 0
+
+        current_root = str(self.game_root)
+        base = (
+            select(InstalledFile.id, InstalledFile.game_path, InstalledFile.drift, InstalledFile.link_kind,
+                   Mod.storage_path, ModFile.source_rel_path)
+            .outerjoin(Mod, Mod.id == InstalledFile.active_mod_id)
+            .outerjoin(ModFile, and_(ModFile.mod_id == InstalledFile.active_mod_id,
+                                     ModFile.target_key == InstalledFile.path_key))
+            .where(InstalledFile.root_path == current_root)
+        )
+
+        if full:
+            filters = [None]
+        else:
+            # Ключ может быть папкой (удалили/переместили целиком) — берем и всё внутри нее
+            filters = []
+            keys = sorted(dirty_keys)
+            for i in range(0, len(keys), 200):
+                filters.append(or_(*[
+                    or_(InstalledFile.path_key == key,
+                        InstalledFile.path_key.like(escape_like(key) + "/%", escape="\\"))
+                    for key in keys[i:i + 200]
+                ]))
+            if dirty_mod_dirs:
+                mods_dir = Path(self.config.library_path) / "Mods"
+                filters.append(Mod.storage_path.in_([str(mods_dir / name) for name in dirty_mod_dirs]))
+
+        changes = {}
+        checked = 0
+        for condition in filters:
+            query = base if condition is None else base.where(condition)
+            for row in self.session.execute(query):
+                if row.id in changes:
+                    continue
+                checked += 1
+                source = Path(row.storage_path) / row.source_rel_path if row.source_rel_path else None
+                drift = self._verify_installed(row.game_path, source, row.link_kind)
+                if drift != row.drift:
+                    changes[row.id] = drift
+
+        perf.count("checked", checked)
+        if changes:
+            self.session.execute(update(InstalledFile), [{"id": k, "drift": v} for k, v in changes.items()])
+            self.session.commit()
+        return sum(1 for v in changes.values() if v)
+
+    def _verify_installed(self, game_path, source, link_kind=None):
+        """
+        None — на месте; "missing" — файла/цели ссылки нет; "replaced" — в игре чужой файл.
+        link_kind — как файл ставился (None у старых записей: проверяется любой способ).
+        """
+        target = self._target(game_path)
+        if target.is_symlink():
+            if not target.exists():
+                return "missing"
+            if source is not None and os.readlink(target) != str(source):
+                return "replaced"
+            return None
+        if not target.exists():
+            return "missing"
+        if link_kind == LINK_SYMLINK:
+            return "replaced"  # Вместо нашей ссылки — обычный файл
+        if source is not None:
+            try:
+                src_stat, dst_stat = source.stat(), target.stat()
+                # Жесткая ссылка — тот же файл, что в библиотеке
+                if os.path.samestat(src_stat, dst_stat):
+                    return None
+                # Копия сохраняет размер и mtime исходника
+                if link_kind != LINK_HARDLINK and src_stat.st_size == dst_stat.st_size \
+                        and abs(src_stat.st_mtime - dst_stat.st_mtime) < 2:
+                    return None
+            except OSError:
+                pass
+        return "replaced"
+
+    def list_drift(self):
+        """Установленные файлы текущей папки игры, которые разошлись с тем, что ставил менеджер."""
+        rows = self.session.execute(
+            select(InstalledFile.game_path, InstalledFile.drift, Mod.name)
+            .outerjoin(Mod, Mod.id == InstalledFile.active_mod_id)
+            .where(InstalledFile.root_path == str(self.game_root), InstalledFile.drift.is_not(None))
+            .order_by(InstalledFile.path_key)
+        ).all()
+        return [{"path": r.game_path, "drift": r.drift, "mod_name": r.name} for r in rows]
+
+    @staticmethod
+    def _batches(items, size=None):
+        """Пачки из любого итерируемого (в том числе генератора операций)."""
+        size = size or SYNC_BATCH_SIZE
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def recover_interrupted_sync(self):
+        with backup_lock:
+            return self._recover_interrupted_sync()
+
+    def _recover_interrupted_sync(self):
+        """
+        Разбор хвоста журнала после аварийного завершения синхронизации.
+        Незакоммиченные удаления доводятся до конца, незакоммиченные установки
+        откатываются (оригиналы возвращаются из бэкапов), перенаправления дописываются в БД,
+        если ссылка уже подменена. Папка игры не сканируется —
+        только файлы из незавершенных пачек. Возвращает число разобранных операций.
+        """
+        journal = SyncJournal(self.config.library_path)
+        pending = journal.pending()
+        if pending is None:
+            journal.end()  # Удаляем пустой/завершенный журнал, если остался
+            return 0
+
+        root, batches, backups, copies = pending
+        root_path = Path(root)
+        processed = 0
+        self.logger.log("Обнаружена прерванная синхронизация, восстановление...", "warning")
+
+        for kind, items in batches:
+            for item in items:
+                try:
+                    if kind == "remove":
+                        self._recover_remove(root_path, item)
+                    elif kind == "retarget":
+                        self._recover_retarget(root_path, item)
+                    else:
+                        self._recover_install(root_path, root, item, backups.get(item["path"]),
+                                              item["path"] in copies)
+                except Exception as e:
+                    self.logger.log(f"Восстановление {item.get('path')}: {e}", "error")
+                processed += 1
+
+        self.session.commit()
+        journal.end()
+        self.logger.log(f"Восстановление завершено: {processed} операций.", "info")
+        return processed
+
+    def _recover_remove(self, root_path, item):
+        """Удаление доводится до конца (запись в БД еще есть — файл в игре наш)."""
+        record = self.session.get(InstalledFile, item["id"])
+        if record is None:
+            return  # Пачка успела закоммититься
+
+        target = self._target(item["path"], root_path)
+        # Путь бэкапа — из записи: фоновый обработчик мог перенести его из папки ожидания
+        backup = Path(record.backup_path) if record.backup_path else None
+        if backup is None or backup.exists():
+            if target.is_symlink() or target.is_file():
+                target.unlink()
+                self.paths.removed(target)
+            if backup is not None and not target.exists():
+                restore_backup(backup, target)
+                self.paths.added(target)
+        # Бэкап уже возвращен на место — оригинал в игре не трогаем
+
+        self.session.delete(record)
+        self._cleanup_empty_dirs(target.parent, root_path)
+
+    def _recover_retarget(self, root_path, item):
+        """
+        os.replace атомарен: в игре либо старая ссылка, либо новая. Новая — запись переводится
+        на новый мод; старая — запись и так верна. Оставшаяся временная ссылка удаляется.
+        """
+        target = self._target(item["path"], root_path)
+        temp = self._retarget_temp(target)
+        if temp.is_symlink() or temp.is_file():
+            temp.unlink()
+
+        record = self.session.get(InstalledFile, item["id"])
+        if record is None or record.active_mod_id == item["mod"]:
+            return  # Пачка успела закоммититься (или запись уже удалена)
+        source = Path(item["src"])
+        link_kind = None
+        if target.is_symlink() or not target.exists():
+            if self._verify_installed(item["path"], source) is None:
+                link_kind = LINK_SYMLINK
+        else:
+            # Жесткая ссылка или копия: у старой и новой копии размер и mtime могут совпасть
+            # (файлы из архивов одного релиза) — сверяется содержимое, это лишь хвост одной пачки
+            try:
+                if os.path.samestat(source.stat(), target.stat()):
+                    link_kind = LINK_HARDLINK
+                elif filecmp.cmp(source, target, shallow=False):
+                    link_kind = LINK_COPY
+            except OSError:
+                pass
+        if link_kind is not None:
+            record.active_mod_id = item["mod"]
+            record.drift = None
+            record.link_kind = link_kind
+
+    def _recover_install(self, root_path, root, item, backup_info, copied):
+        """Незакоммиченная установка откатывается: ссылка/копия убирается, оригинал возвращается."""
+        committed = self.session.query(InstalledFile).filter_by(path_key=path_key(item["path"]), root_path=root).first()
+        if committed is not None:
+            return
+
+        target = self._target(item["path"], root_path)
+        # Обычный файл без записи copy — оригинал игры, до которого установка не дошла
+        if target.is_symlink() or (copied and target.is_file()):
+            target.unlink()
+            self.paths.removed(target)
+
+        if backup_info is not None:
+            backup = Path(backup_info[0])
+            if backup.exists() and not target.exists():
+                restore_backup(backup, target)
+                self.paths.added(target)
+
+        self._cleanup_empty_dirs(target.parent, root_path)
+
     def _report_progress(self, current, total, text):
         percent = int((current / total) * 100)
         self.logger.log(text, "progress", percent)
 
+    def _target(self, game_rel_path, root_path=None):
+        """Абсолютный путь в папке игры; существующие папки/файлы — в их написании на диске."""
+        if root_path is not None and root_path != self.game_root:
+            return root_path / game_rel_path
+        return self.game_root / self.paths.resolve(game_rel_path)
+
     def _install_file_physically(self, game_rel_path, source_full_path):
         """
-        Создает симлинк, сохраняя регистр папок.
+        Ставит файл мода, сохраняя регистр папок: симлинк, а где он недоступен — жесткая
+        ссылка или копия (core/linking.py). Возвращает (путь бэкапа оригинала, способ).
         """
-        target_path = self.game_root / game_rel_path
+        # Уже существующие папки берутся в их написании на диске (Vehicles, а не vehicles),
+        # недостающие создаются так, как их пишет мод
+        target_path = self._target(game_rel_path)
 
-        # ВАЖНО: mkdir parents=True создает папки.
-        # Если Windows, она может создать lowercase, если мы не аккуратны.
-        # Но pathlib обычно использует регистр, переданный в аргументе.
         if not target_path.parent.exists():
             target_path.parent.mkdir(parents=True, exist_ok=True)
 
         backup_path = None
-        original_hash = None
 
         if target_path.exists() or target_path.is_symlink():
             if target_path.is_symlink():
                 target_path.unlink()
             else:
-                original_hash = self._get_hash(target_path)
-                backup_name = f"{original_hash}_{target_path.name}"
-                backup_full_path = self.backup_dir / backup_name
-
-                if not backup_full_path.exists():
-                    shutil.move(str(target_path), str(backup_full_path))
-                else:
-                    target_path.unlink()
+                with perf.span("backup"):
+                    # Только rename в папку ожидания: хеш и перенос в Backups — в фоне (core/backups.py)
+                    backup_full_path = self.stager.path_for(target_path.name)
+
+                    if self._journal:
+                        # Записываем до перемещения: после сбоя оригинал найдется в бэкапах
+                        self._journal.backup(game_rel_path, backup_full_path, None)
+                    try:
+                        self.stager.stage(target_path, backup_full_path)
+                    except OSError:
+                        backup_full_path = self.stager.fallback_for(backup_full_path)
+                        if self._journal:
+                            self._journal.backup(game_rel_path, backup_full_path, None)
+                        shutil.move(str(target_path), str(backup_full_path))
 
                 backup_path = str(backup_full_path)
+                self.staged_backups += 1
+                perf.count("backups")
 
-        try:
-            if not source_full_path.exists():
-                raise FileNotFoundError(f"Source missing: {source_full_path}")
+        if not source_full_path.exists():
+            raise FileNotFoundError(f"Source missing: {source_full_path}")
+
+        # Обычный файл отмечается в журнале до создания: после сбоя его уберет восстановление
+        journal = self._journal
+        link_kind = place(source_full_path, target_path, self.link_kinds,
+                          before_regular=(lambda: journal.copy(game_rel_path)) if journal else None)
+        self.paths.added(target_path)
+
+        return backup_path, link_kind
 
-            os.symlink(str(source_full_path), str(target_path))
-        except OSError:
-            shutil.copy2(str(source_full_path), str(target_path))
+    @staticmethod
+    def _retarget_temp(target):
+        return target.with_name(f".{target.name}.omsi_tmp")
 
-        return backup_path, original_hash
+    def _retarget_file(self, game_rel_path, source_full_path):
+        """
+        Подменяет установленный файл ссылкой на другой источник: временная ссылка рядом
+        и os.replace поверх (атомарно — игра ни в какой момент не видит пустого места).
+        Бэкап оригинала не трогается: он остается за той же записью InstalledFile.
+        Где симлинк недоступен, так же подменяется жесткая ссылка или копия. Возвращает способ.
+        """
+        if not source_full_path.exists():
+            raise FileNotFoundError(f"Source missing: {source_full_path}")
+
+        target_path = self._target(game_rel_path)
+        if not target_path.parent.exists():
+            # Папку удалили снаружи (дрейф "missing") — создаем заново
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self._retarget_temp(target_path)
+        if temp_path.is_symlink() or temp_path.exists():
+            temp_path.unlink()
+
+        link_kind = place(source_full_path, temp_path, self.link_kinds)
+        os.replace(temp_path, target_path)
+        self.paths.added(target_path)
+        return link_kind
 
     def _remove_installed_file(self, record):
-        target_path = self.game_root / record.game_path
+        target_path = self._target(record.game_path)
 
         if target_path.exists() or target_path.is_symlink():
             if target_path.is_dir():
                 shutil.rmtree(target_path)
+                self.paths.removed(target_path, tree=True)
             else:
                 target_path.unlink()
+                self.paths.removed(target_path)
 
         if record.backup_path:
             backup = Path(record.backup_path)
             if backup.exists() and not target_path.exists():
-                shutil.move(str(backup), str(target_path))
+                restore_backup(backup, target_path)
+                self.paths.added(target_path)
 
         self._cleanup_empty_dirs(target_path.parent)
 
-    def _get_hash(self, path):
-        hash_md5 = hashlib.md5()
-        try:
-            with open(path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except:
-            return "error"
-
-    def _cleanup_empty_dirs(self, path):
+    def _cleanup_empty_dirs(self, path, root=None):
+        root = root or self.game_root
+        # В папке игры содержимое берется из кэша CaseResolver — без листинга на каждый файл
+        is_empty = self.paths.is_empty if root == self.game_root else (lambda p: not any(p.iterdir()))
         try:
-            while path != self.game_root and path.exists():
-                if not any(path.iterdir()):
+            while path != root and path.exists():
+                if is_empty(path):
                     path.rmdir()
+                    self.paths.removed(path)
                     path = path.parent
                 else:
                     break
@@ -0,0 +1,95 @@
+import json
+import os
+from pathlib import Path
+
+
+class SyncJournal:
+    """
+    Журнал упреждающей записи для sync_state: Library/Journal/sync.jsonl.
+
+    Записи (JSON по строке):
+      begin  — начало синхронизации для папки игры (root);
+      plan   — пачка операций ДО их выполнения на диске;
+      bk     — оригинальный файл игры сейчас уйдет в бэкап (пишется до перемещения);
+      copy   — вместо симлинка будет создан обычный файл: жесткая ссылка или копия
+               (пишется до создания);
+      ckpt   — все пачки выше закоммичены в БД;
+      end    — синхронизация завершена (файл журнала удаляется).
+
+    Если процесс упал, после последнего ckpt остается незавершенный хвост —
+    только его и нужно разобрать при следующем запуске.
+    """
+
+    def __init__(self, library_path):
+        self.path = Path(library_path) / "Journal" / "sync.jsonl"
+        self._fh = None
+
+    def _write(self, record, sync=True):
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        if sync:
+            os.fsync(self._fh.fileno())
+
+    def begin(self, root):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "w", encoding="utf-8")
+        self._write({"op": "begin", "root": str(root)})
+
+    def plan(self, kind, items):
+        self._write({"op": "plan", "kind": kind, "items": items})
+
+    def backup(self, game_path, backup_path, original_hash):
+        self._write({"op": "bk", "path": game_path, "bk": str(backup_path), "hash": original_hash})
+
+    def copy(self, game_path):
+        self._write({"op": "copy", "path": game_path})
+
+    def checkpoint(self):
+        self._write({"op": "ckpt"})
+
+    def end(self):
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        """
+        Незавершенная синхронизация: (root, [(kind, items), ...], {game_path: (bk, hash)}, {game_path копий})
+        или None, если журнала нет или прошлый запуск завершился штатно.
+        """
+        if not self.path.exists():
+            return None
+
+        root = None
+        batches = []
+        backups = {}
+        copies = set()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Оборванная последняя строка — дальше ничего не было
+                op = record.get("op")
+                if op == "begin":
+                    root = record["root"]
+                elif op == "plan":
+                    batches.append((record["kind"], record["items"]))
+                elif op == "bk":
+                    backups[record["path"]] = (record["bk"], record["hash"])
+                elif op == "copy":
+                    copies.add(record["path"])
+                elif op == "ckpt":
+                    batches = []
+                    backups = {}
+                    copies = set()
+                elif op == "end":
+                    return None
+
+        if root is None:
+            return None
+        return root, batches, backups, copies
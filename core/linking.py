@@ -0,0 +1,125 @@
+import os
+import secrets
+import shutil
+import threading
+from pathlib import Path
+from core.perf import perf
+
+LINK_SYMLINK = "symlink"
+LINK_HARDLINK = "hardlink"
+LINK_COPY = "copy"
+LINK_KINDS = (LINK_SYMLINK, LINK_HARDLINK, LINK_COPY)
+# Счетчики perf по способам
+_COUNTERS = {LINK_SYMLINK: "symlinks", LINK_HARDLINK: "hardlinks", LINK_COPY: "copies"}
+
+# Результаты проверки возможностей: {(папка игры, библиотека): доступные способы по порядку}
+_probes = {}
+_probe_lock = threading.Lock()
+
+
+def probe(game_root, library_path):
+    """
+    Какие способы установки файла работают для этой папки игры (один раз на процесс):
+    симлинк (на Windows нужны права или режим разработчика), жесткая ссылка (только на том же
+    томе, что и библиотека). Копия доступна всегда и замыкает цепочку.
+    """
+    key = (str(game_root), str(library_path))
+    with _probe_lock:
+        kinds = _probes.get(key)
+        if kinds is None:
+            kinds = _probes[key] = _run_probe(Path(game_root), Path(library_path))
+    return kinds
+
+
+def _run_probe(game_root, library_path):
+    token = secrets.token_hex(4)
+    source = library_path / f".omsi_probe_{token}"
+    target = game_root / f".omsi_probe_{token}"
+    kinds = []
+    try:
+        source.write_bytes(b"")
+    except OSError:
+        return [LINK_SYMLINK, LINK_HARDLINK, LINK_COPY]  # Проверить нечем — пробуем всё по порядку
+    try:
+        for kind, make in ((LINK_SYMLINK, os.symlink), (LINK_HARDLINK, os.link)):
+            try:
+                make(str(source), str(target))
+            except (OSError, NotImplementedError):
+                continue
+            kinds.append(kind)
+            target.unlink()
+    finally:
+        for path in (target, source):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    kinds.append(LINK_COPY)
+    return kinds
+
+
+def fast_copy(source, target):
+    """
+    Копия средствами ядра, без перекачки через Python: copy_file_range (на Btrfs/XFS — reflink,
+    без копирования данных), иначе sendfile, иначе shutil. Размер и mtime — как у исходника:
+    по ним проверка установленного узнает свою копию.
+    """
+    if not (hasattr(os, "copy_file_range") or hasattr(os, "sendfile")):
+        shutil.copy2(source, target)  # Windows: у shutil свой быстрый путь
+        return
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        copied = False
+        for method in ("copy_file_range", "sendfile"):
+            func = getattr(os, method, None)
+            if func is None:
+                continue
+            try:
+                while remaining > 0:
+                    if method == "sendfile":
+                        sent = func(dst.fileno(), src.fileno(), None, remaining)
+                    else:
+                        sent = func(src.fileno(), dst.fileno(), remaining)
+                    if sent == 0:
+                        break
+                    remaining -= sent
+                copied = remaining == 0
+            except OSError:
+                # Файловая система не поддерживает — продолжаем с того же места другим способом
+                pass
+            if copied:
+                break
+        if not copied:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    shutil.copystat(source, target)
+
+
+def place(source, target, kinds, before_regular=None):
+    """
+    Ставит target на месте source первым сработавшим способом из kinds (см. probe).
+    Жесткая ссылка — только на файл, у которого нет других имен: блоб хранилища (core/storage.py)
+    общий для всех модов с тем же содержимым, и правка файла игры на месте испортила бы их все.
+    Такой источник ставится копией. before_regular вызывается один раз перед первой попыткой создать обычный файл
+    (жесткую ссылку или копию) — для записи в журнал. Возвращает способ.
+    Ошибка последнего способа — исключение.
+    """
+    for kind in kinds:
+        if kind != LINK_SYMLINK and before_regular is not None:
+            before_regular()
+            before_regular = None
+        try:
+            if kind == LINK_SYMLINK:
+                os.symlink(str(source), str(target))
+            elif kind == LINK_HARDLINK:
+                if os.stat(source).st_nlink > 1:
+                    continue
+                os.link(str(source), str(target))
+            else:
+                fast_copy(source, target)
+        except OSError:
+            if kind == kinds[-1]:
+                raise
+            continue
+        perf.count(_COUNTERS[kind])
+        return kind
+    raise OSError(f"No link strategy for {target}")
@@ -0,0 +1,266 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+
+# --- ШАГИ МИГРАЦИЙ ---
+# Каждый шаг выполняется РОВНО ОДИН РАЗ: после него номер версии сохраняется
+# в settings.schema_version. Новые шаги добавляются только в конец списка.
+
+def _m001_legacy_columns(conn):
+    """Колонки, которые раньше добавлялись проверкой схемы при каждом старте."""
+    inspector = inspect(conn)
+
+    cols_mods = {c['name'] for c in inspector.get_columns('mods')}
+    if 'priority' not in cols_mods:
+        conn.execute(text("ALTER TABLE mods ADD COLUMN priority INTEGER DEFAULT 0"))
+
+    cols_inst = {c['name'] for c in inspector.get_columns('game_file_state')}
+    if 'root_path' not in cols_inst:
+        conn.execute(text("ALTER TABLE game_file_state ADD COLUMN root_path VARCHAR DEFAULT ''"))
+
+    cols_hof = {c['name'] for c in inspector.get_columns('hof_installs')}
+    if 'game_rel_path' not in cols_hof:
+        conn.execute(text("ALTER TABLE hof_installs ADD COLUMN game_rel_path VARCHAR DEFAULT 'legacy'"))
+    if 'backup_path' not in cols_hof:
+        conn.execute(text("ALTER TABLE hof_installs ADD COLUMN backup_path VARCHAR"))
+
+
+def _m002_fill_root_path(conn):
+    """Разовое лечение пустых root_path (записи времен до мульти-профилей)."""
+    res = conn.execute(text("SELECT value FROM settings WHERE key='game_path'")).fetchone()
+    if res and res[0]:
+        conn.execute(
+            text("UPDATE game_file_state SET root_path = :p WHERE root_path = '' OR root_path IS NULL"),
+            {"p": res[0]}
+        )
+
+
+def _m003_content_id_index(conn):
+    """Индекс по content id файлов модов (дедупликация библиотеки)."""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mod_files_file_hash ON mod_files (file_hash)"))
+
+
+def _m004_archive_backed_mods(conn):
+    """Колонки для модов, хранящихся в виде архива с ленивой распаковкой."""
+    conn.execute(text("ALTER TABLE mods ADD COLUMN archive_path VARCHAR"))
+    conn.execute(text("ALTER TABLE mods ADD COLUMN is_materialized BOOLEAN DEFAULT 1"))
+    conn.execute(text("ALTER TABLE mods ADD COLUMN last_used DATETIME"))
+    conn.execute(text("ALTER TABLE mods ADD COLUMN storage_bytes INTEGER DEFAULT 0"))
+    conn.execute(text("ALTER TABLE mod_files ADD COLUMN archive_member VARCHAR"))
+
+
+def _m005_mod_list_indexes(conn):
+    """Ревизии и индексы для постраничного списка модов с фильтрами."""
+    conn.execute(text("ALTER TABLE mods ADD COLUMN revision INTEGER DEFAULT 0"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mods_revision ON mods (revision)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mods_name_nocase ON mods (name COLLATE NOCASE)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mods_mod_type ON mods (mod_type)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mods_install_date ON mods (install_date)"))
+
+
+# rowid в library_fts = id записи * 4 + вид (0 мод, 1 файл, 2 HOF): удаление по rowid без прохода по индексу
+
+_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS fts_mods_ai AFTER INSERT ON mods BEGIN
+        INSERT INTO library_fts(rowid, text, mod_id) VALUES (new.id * 4, new.name, new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_mods_au AFTER UPDATE OF name ON mods BEGIN
+        DELETE FROM library_fts WHERE rowid = old.id * 4;
+        INSERT INTO library_fts(rowid, text, mod_id) VALUES (new.id * 4, new.name, new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_mods_ad AFTER DELETE ON mods BEGIN
+        DELETE FROM library_fts WHERE rowid = old.id * 4;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_files_ai AFTER INSERT ON mod_files
+        WHEN new.target_game_path IS NOT NULL BEGIN
+        INSERT INTO library_fts(rowid, text, mod_id) VALUES (new.id * 4 + 1, new.target_game_path, new.mod_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_files_au AFTER UPDATE OF target_game_path ON mod_files BEGIN
+        DELETE FROM library_fts WHERE rowid = old.id * 4 + 1;
+        INSERT INTO library_fts(rowid, text, mod_id)
+        SELECT new.id * 4 + 1, new.target_game_path, new.mod_id WHERE new.target_game_path IS NOT NULL;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_files_ad AFTER DELETE ON mod_files BEGIN
+        DELETE FROM library_fts WHERE rowid = old.id * 4 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_hofs_ai AFTER INSERT ON hof_files BEGIN
+        INSERT INTO library_fts(rowid, text, mod_id)
+        VALUES (new.id * 4 + 2, new.filename || ' ' || coalesce(new.description, ''), new.mod_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_hofs_au AFTER UPDATE OF filename, description ON hof_files BEGIN
+        DELETE FROM library_fts WHERE rowid = old.id * 4 + 2;
+        INSERT INTO library_fts(rowid, text, mod_id)
+        VALUES (new.id * 4 + 2, new.filename || ' ' || coalesce(new.description, ''), new.mod_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS fts_hofs_ad AFTER DELETE ON hof_files BEGIN
+        DELETE FROM library_fts WHERE rowid = old.id * 4 + 2;
+    END""",
+]
+
+
+def _m006_library_search(conn):
+    """
+    FTS5 индекс по названиям модов, путям файлов и HOF (core/search.py).
+    Поддерживается триггерами. Если в сборке SQLite нет FTS5 — шаг пропускается,
+    поиск работает через LIKE.
+    """
+    try:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS library_fts "
+            "USING fts5(text, mod_id UNINDEXED, tokenize='trigram')"
+        ))
+    except OperationalError:
+        try:
+            # SQLite < 3.34: без trigram, поиск по словам
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS library_fts USING fts5(text, mod_id UNINDEXED)"
+            ))
+        except OperationalError:
+            return
+
+    for trigger in _FTS_TRIGGERS:
+        conn.execute(text(trigger))
+
+    conn.execute(text("DELETE FROM library_fts"))
+    conn.execute(text("INSERT INTO library_fts(rowid, text, mod_id) SELECT id * 4, name, id FROM mods"))
+    conn.execute(text(
+        "INSERT INTO library_fts(rowid, text, mod_id) "
+        "SELECT id * 4 + 1, target_game_path, mod_id FROM mod_files WHERE target_game_path IS NOT NULL"
+    ))
+    conn.execute(text(
+        "INSERT INTO library_fts(rowid, text, mod_id) "
+        "SELECT id * 4 + 2, filename || ' ' || coalesce(description, ''), mod_id FROM hof_files"
+    ))
+
+
+def _m007_path_keys(conn):
+    """Нормализованные ключи путей + индексы для потоковой синхронизации (path_key — функция из init_db)."""
+    conn.execute(text("ALTER TABLE mod_files ADD COLUMN target_key VARCHAR"))
+    conn.execute(text("UPDATE mod_files SET target_key = path_key(target_game_path)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mod_files_target_key ON mod_files (target_key)"))
+
+    conn.execute(text("ALTER TABLE game_file_state ADD COLUMN path_key VARCHAR"))
+    conn.execute(text("UPDATE game_file_state SET path_key = path_key(game_path)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_game_file_state_root_key ON game_file_state (root_path, path_key, id)"
+    ))
+
+
+def _m008_installed_drift(conn):
+    """Отметка расхождения установленного файла с тем, что поставил менеджер (см. FsWatcher)."""
+    conn.execute(text("ALTER TABLE game_file_state ADD COLUMN drift VARCHAR"))
+
+
+def _m009_mod_file_manifest(conn):
+    """CRC и размер файла из оглавления архива — обновление мода сравнивает манифесты без распаковки."""
+    conn.execute(text("ALTER TABLE mod_files ADD COLUMN archive_crc VARCHAR"))
+    conn.execute(text("ALTER TABLE mod_files ADD COLUMN size INTEGER"))
+
+
+def _m010_hof_catalog(conn):
+    """
+    Ключ каталога HOF у файлов (таблицу hof_catalog создает create_all).
+    Хеши существующих HOF дописывает HofCatalog.refresh при первом открытии HOF менеджера.
+    """
+    conn.execute(text("ALTER TABLE hof_files ADD COLUMN content_hash VARCHAR"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_hof_files_content_hash ON hof_files (content_hash)"))
+
+
+def _m011_installed_link_kind(conn):
+    """Способ установки файла (симлинк, жесткая ссылка, копия); у старых записей — NULL, определяется по диску."""
+    conn.execute(text("ALTER TABLE game_file_state ADD COLUMN link_kind VARCHAR"))
+
+
+def _m012_fts_file_paths(conn):
+    """
+    Смена пути файла в игре (обновление мода) — и в поиске: триггер fts_files_au
+    и пересборка строк файлов, оставшихся со старыми путями. Без FTS5 — пропускается.
+    """
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'library_fts'")).fetchone()
+    if not exists:
+        return
+    conn.execute(text(next(t for t in _FTS_TRIGGERS if "fts_files_au" in t)))
+    conn.execute(text("DELETE FROM library_fts WHERE rowid % 4 = 1"))
+    conn.execute(text(
+        "INSERT INTO library_fts(rowid, text, mod_id) "
+        "SELECT id * 4 + 1, target_game_path, mod_id FROM mod_files WHERE target_game_path IS NOT NULL"
+    ))
+
+
+MIGRATIONS = [
+    (1, _m001_legacy_columns),
+    (2, _m002_fill_root_path),
+    (3, _m003_content_id_index),
+    (4, _m004_archive_backed_mods),
+    (5, _m005_mod_list_indexes),
+    (6, _m006_library_search),
+    (7, _m007_path_keys),
+    (8, _m008_installed_drift),
+    (9, _m009_mod_file_manifest),
+    (10, _m010_hof_catalog),
+    (11, _m011_installed_link_kind),
+    (12, _m012_fts_file_paths),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Объекты вне моделей (виртуальные таблицы, триггеры) — create_all их не создает,
+# поэтому для новой БД эти шаги выполняются сразу
+FRESH_DB_STEPS = [_m006_library_search]
+
+
+# --- РАННЕР ---
+
+def get_schema_version(conn):
+    """Читает сохраненную версию схемы (0, если БД новая или старая без версии)."""
+    try:
+        res = conn.execute(text("SELECT value FROM settings WHERE key='schema_version'")).fetchone()
+    except OperationalError:
+        return 0
+    try:
+        return int(res[0]) if res and res[0] else 0
+    except ValueError:
+        return 0
+
+
+def _set_schema_version(conn, version):
+    conn.execute(text("DELETE FROM settings WHERE key='schema_version'"))
+    conn.execute(
+        text("INSERT INTO settings (key, value) VALUES ('schema_version', :v)"),
+        {"v": str(version)}
+    )
+
+
+def run_migrations(engine, metadata):
+    """
+    Приводит БД к SCHEMA_VERSION. Если версия уже актуальна — один SELECT и выход,
+    без inspect и без проходов по таблицам, независимо от размера БД.
+    """
+    with engine.connect() as conn:
+        version = get_schema_version(conn)
+    if version == SCHEMA_VERSION:
+        return version
+
+    is_fresh = version == 0 and not inspect(engine).has_table('mods')
+
+    # Недостающие таблицы создаются сразу в актуальном виде
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        if is_fresh:
+            # Новая БД уже создана по последней схеме — нужны только объекты вне моделей
+            for step in FRESH_DB_STEPS:
+                step(conn)
+            _set_schema_version(conn, SCHEMA_VERSION)
+            return SCHEMA_VERSION
+
+    for step_version, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        # Каждый шаг — отдельная транзакция вместе с записью новой версии
+        with engine.begin() as conn:
+            step(conn)
+            _set_schema_version(conn, step_version)
+        version = step_version
+
+    return version
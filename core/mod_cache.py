@@ -0,0 +1,114 @@
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from core.database import Mod, InstalledFile
+from core.extractor import ArchiveExtractor
+from core.importer import HOF_STORAGE_DIR
+from core.perf import perf
+from core.storage import BlobStore
+
+
+class ModCache:
+    """
+    Кэш распакованных файлов для модов, хранящихся архивом (режим "archive").
+    Мод распаковывается в свою папку библиотеки при включении; выключенные моды
+    вытесняются по давности использования (LRU), когда кэш превышает бюджет.
+    HOF файлы распакованы всегда — на них ссылается HOF менеджер.
+    """
+
+    def __init__(self, config_manager, logger, session):
+        self.config = config_manager
+        self.session = session
+        self.logger = logger
+        self.blobs = BlobStore(config_manager.library_path)
+
+    def prepare(self, active_mods):
+        """Распаковывает включенные моды, которых нет в кэше (вытеснение — отдельно, после синхронизации)."""
+        now = datetime.now()
+        for mod in active_mods:
+            if not mod.archive_path:
+                continue
+            mod.last_used = now
+            if not mod.is_materialized:
+                self.materialize(mod)
+        self.session.flush()
+
+    @perf.timed("cache.materialize")
+    def materialize(self, mod):
+        self.logger.log(f"Распаковка мода из архива: {mod.name}...", "info")
+        perf.annotate(mod=mod.name)
+        storage = Path(mod.storage_path)
+        storage.mkdir(parents=True, exist_ok=True)
+
+        # HOF уже лежат в _hofs с импорта — их не трогаем
+        hof_members = [f.archive_member for f in mod.files if f.is_hof and f.archive_member]
+        extractor = ArchiveExtractor(
+            self.logger,
+            progress_callback=lambda p: self.logger.log(f"Распаковка {mod.name}: {p}%", "progress", p)
+        )
+        perf.phase("extract")
+        extractor.extract_planned(mod.archive_path, storage, {}, exclude=hof_members)
+
+        perf.phase("dedup")
+        total = 0
+        for f in mod.files:
+            if f.is_hof:
+                continue
+            path = storage / f.source_rel_path
+            try:
+                f.file_hash, _ = self.blobs.ingest(path)
+                total += path.stat().st_size
+            except OSError:
+                pass
+
+        mod.is_materialized = True
+        mod.storage_bytes = total
+        perf.count("files", len(mod.files))
+
+    def evict(self, keep_ids=()):
+        """Выселяет LRU-моды, пока кэш больше бюджета. Возвращает освобожденные байты."""
+        budget = self.config.get_cache_budget_bytes()
+        materialized = (
+            self.session.query(Mod)
+            .filter(Mod.archive_path.isnot(None), Mod.is_materialized == True)
+            .order_by(Mod.last_used.asc())
+            .all()
+        )
+        used = sum(m.storage_bytes or 0 for m in materialized)
+        if used <= budget:
+            return 0
+
+        # Моды, на которые есть ссылки из любой папки игры (другие профили), выселять нельзя
+        linked_ids = {row[0] for row in self.session.query(InstalledFile.active_mod_id).distinct()}
+
+        freed = 0
+        for mod in materialized:
+            if used <= budget:
+                break
+            if mod.id in keep_ids or mod.is_enabled or mod.id in linked_ids:
+                continue
+            size = mod.storage_bytes or 0
+            self.dematerialize(mod)
+            used -= size
+            freed += size
+
+        if freed:
+            self.logger.log(f"Кэш модов: освобождено {freed / 1024 / 1024:.1f} МБ", "info")
+        return freed
+
+    def dematerialize(self, mod):
+        """Удаляет распакованные файлы мода (кроме _hofs); канонической копией остается архив."""
+        storage = Path(mod.storage_path)
+        if storage.exists():
+            for entry in os.scandir(storage):
+                if entry.name == HOF_STORAGE_DIR:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.unlink(entry.path)
+
+        self.blobs.release(f.file_hash for f in mod.files if not f.is_hof)
+        mod.is_materialized = False
+        mod.storage_bytes = 0
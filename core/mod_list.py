@@ -0,0 +1,89 @@
+from sqlalchemy import func
+from core.database import Mod, ModType, ModTombstone, current_mods_revision
+
+PAGE_LIMIT_MAX = 500
+
+# Ключи сортировки UI -> колонки (id в конце — стабильный порядок для постраничной выдачи)
+SORT_KEYS = {
+    "name": lambda: Mod.name.collate("NOCASE"),
+    "date": lambda: Mod.install_date,
+    "type": lambda: Mod.mod_type,
+    "status": lambda: Mod.is_enabled,
+    "priority": lambda: Mod.priority,
+}
+
+
+def serialize_mod(mod):
+    return {
+        "id": mod.id,
+        "name": mod.name,
+        "type": mod.mod_type.value if mod.mod_type else "unknown",
+        "is_enabled": mod.is_enabled,
+        "date": mod.install_date.strftime("%Y-%m-%d"),
+        "priority": mod.priority,
+    }
+
+
+def escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ModListQuery:
+    """
+    Список модов для UI: страницы с фильтрами и сортировкой на стороне SQL,
+    плюс дельта изменений с момента ревизии (mods.revision + mod_tombstones).
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def page(self, offset=0, limit=100, search=None, mod_type=None, sort="name", descending=False):
+        offset = max(0, int(offset or 0))
+        limit = min(max(1, int(limit or 100)), PAGE_LIMIT_MAX)
+
+        query = self.session.query(Mod)
+        if search:
+            pattern = f"%{escape_like(search.strip().casefold())}%"
+            query = query.filter(func.casefold(Mod.name).like(pattern, escape="\\"))
+        if mod_type:
+            try:
+                query = query.filter(Mod.mod_type == ModType(mod_type))
+            except ValueError:
+                return {"total": 0, "offset": offset, "items": [], "revision": current_mods_revision(self.session)}
+
+        total = query.order_by(None).count()
+
+        column = SORT_KEYS.get(sort, SORT_KEYS["name"])()
+        if descending:
+            query = query.order_by(column.desc(), Mod.id.desc())
+        else:
+            query = query.order_by(column.asc(), Mod.id.asc())
+
+        mods = query.offset(offset).limit(limit).all()
+        return {
+            "total": total,
+            "offset": offset,
+            "items": [serialize_mod(m) for m in mods],
+            "revision": current_mods_revision(self.session),
+        }
+
+    def changes_since(self, revision):
+        """Моды, измененные после ревизии, и id удаленных. UI накладывает дельту на свою копию списка."""
+        revision = int(revision or 0)
+        current = current_mods_revision(self.session)
+        if revision >= current:
+            return {"revision": current, "changed": [], "deleted": []}
+
+        changed = self.session.query(Mod).filter(Mod.revision > revision).order_by(Mod.id).all()
+        changed_ids = {m.id for m in changed}
+        # id мог быть переиспользован новым модом — тогда он уже есть в changed
+        deleted = [
+            row[0] for row in
+            self.session.query(ModTombstone.mod_id).filter(ModTombstone.revision > revision)
+            if row[0] not in changed_ids
+        ]
+        return {
+            "revision": current,
+            "changed": [serialize_mod(m) for m in changed],
+            "deleted": deleted,
+        }
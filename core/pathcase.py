@@ -0,0 +1,101 @@
+import os
+from pathlib import Path
+
+
+def is_case_sensitive(path):
+    """
+    Различает ли ФС регистр в этой папке (Linux/Wine — да, Windows — нет).
+    Проверка по самой папке: существует ли она же с переставленным регистром имени.
+    """
+    path = Path(path)
+    swapped = path.name.swapcase()
+    if swapped == path.name:
+        return True  # В имени нет букв — проверить нечем, считаем чувствительной (резолвер безвреден)
+    try:
+        return not os.path.samefile(path, path.parent / swapped)
+    except OSError:
+        return True
+
+
+class CaseResolver:
+    """
+    Реальное написание путей в папке игры без учета регистра.
+
+    OMSI (и Windows) не различают Vehicles/ и vehicles/, а ФС под Wine на Linux различает:
+    без сопоставления мод с другим регистром создал бы вторую папку рядом с первой.
+    Каждая папка читается одним scandir при первом обращении, дальше — словарь
+    {имя в нижнем регистре: имя на диске}, который обновляется при создании/удалении
+    (added / removed). Живет одну операцию (ModInstaller), поэтому внешние изменения не мешают.
+    На ФС без учета регистра resolve ничего не меняет; кэш содержимого папок всё равно
+    используется для is_empty (чистка пустых папок без листинга на каждый удаленный файл).
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.enabled = is_case_sensitive(self.root)
+        self._listings = {}
+
+    def _listing(self, directory):
+        key = str(directory)
+        if key not in self._listings:
+            try:
+                with os.scandir(directory) as it:
+                    self._listings[key] = {entry.name.lower(): entry.name for entry in it}
+            except OSError:
+                self._listings[key] = None  # Папки нет
+        return self._listings[key]
+
+    def resolve(self, rel_path):
+        """Путь относительно корня игры в написании, которое уже есть на диске (новые части — как есть)."""
+        if not self.enabled:
+            return rel_path
+        real = []
+        current = self.root
+        exists = True
+        for name in str(rel_path).replace("\\", "/").split("/"):
+            if not name:
+                continue
+            if exists:
+                listing = self._listing(current)
+                if listing is None:
+                    exists = False  # Ниже несуществующей папки искать нечего
+                else:
+                    name = listing.get(name.lower(), name)
+            real.append(name)
+            current = current / name
+        return str(Path(*real)) if real else rel_path
+
+    def added(self, path):
+        """Созданы файл/папки по абсолютному пути path (все недостающие части — в этом написании)."""
+        path = Path(path)
+        try:
+            parts = path.relative_to(self.root).parts
+        except ValueError:
+            return
+        current = self.root
+        for name in parts:
+            key = str(current)
+            if self._listings.get(key) is None and key in self._listings:
+                self._listings[key] = {}  # Папка была несуществующей, теперь создана
+            listing = self._listings.get(key)
+            if listing is not None:
+                listing.setdefault(name.lower(), name)
+            current = current / name
+
+    def removed(self, path, tree=False):
+        """Файл или пустая папка по абсолютному пути path удалены (tree=True — папка со всем содержимым)."""
+        path = Path(path)
+        listing = self._listings.get(str(path.parent))
+        if listing is not None:
+            listing.pop(path.name.lower(), None)
+        key = str(path)
+        if key in self._listings:
+            self._listings[key] = None
+        if tree:
+            for sub_key in [k for k in self._listings if k.startswith(key + os.sep)]:
+                self._listings[sub_key] = None
+
+    def is_empty(self, directory):
+        """Пуста ли папка (по кэшу; несуществующая — не пуста, удалять нечего)."""
+        listing = self._listing(directory)
+        return listing is not None and not listing
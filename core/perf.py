@@ -0,0 +1,224 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class _Operation:
+    """Одна замеряемая операция: этапы (spans), счетчики и метаданные."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = datetime.now()
+        self.t0 = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.meta = {}
+        self.span_stack = []
+        # Текущий этап phase() для каждого уровня вложенности: (имя, время начала) или None
+        self.phases = [None]
+
+    def add_span(self, name, elapsed):
+        entry = self.spans.setdefault(name, {"ms": 0.0, "calls": 0})
+        entry["ms"] += elapsed * 1000
+        entry["calls"] += 1
+
+    def span_name(self, name):
+        return "/".join(self.span_stack + [name])
+
+    def push_level(self, name):
+        self.span_stack.append(name)
+        self.phases.append(None)
+
+    def pop_level(self):
+        self.close_phase()
+        self.phases.pop()
+        self.span_stack.pop()
+
+    def close_phase(self):
+        if self.phases[-1]:
+            name, t0 = self.phases[-1]
+            self.add_span(name, time.perf_counter() - t0)
+            self.phases[-1] = None
+
+
+class PerfRecorder:
+    """
+    Легковесные замеры для операций core.
+    Каждая операция пишет в perf_log.jsonl одну строку: время этапов, счетчики, метаданные.
+    При включенном профилировании рядом сохраняется .prof файл cProfile.
+    Вне операции все вызовы (span, count...) ничего не делают.
+    """
+
+    MAX_LOG_SIZE = 5 * 1024 * 1024
+
+    def __init__(self):
+        self.log_path = None
+        self.profile_dir = None
+        self.profiling = False
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def configure(self, log_dir, profiling=False):
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_path = os.path.join(log_dir, "perf_log.jsonl")
+        self.profile_dir = os.path.join(log_dir, "profiles")
+        self.profiling = profiling
+
+    def _current(self):
+        return getattr(self._local, "op", None)
+
+    # --- Операции ---
+
+    @contextmanager
+    def operation(self, name, **meta):
+        outer = self._current()
+        if outer is not None:
+            # Вложенная операция (например, анализ внутри импорта) пишет свои этапы
+            # во внешнюю с префиксом имени: "analyze/root_search"
+            outer.push_level(name)
+            try:
+                yield outer
+            finally:
+                outer.pop_level()
+            return
+
+        op = _Operation(name)
+        op.meta.update(meta)
+        self._local.op = op
+
+        profiler = None
+        if self.profiling:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Уже активен другой профилировщик (например, в соседнем потоке)
+                profiler = None
+
+        error = None
+        try:
+            yield op
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            op.close_phase()
+            total = time.perf_counter() - op.t0
+            self._local.op = None
+
+            profile_path = None
+            if profiler is not None:
+                profiler.disable()
+                profile_path = self._dump_profile(profiler, op)
+
+            self._write_record(op, total, error, profile_path)
+
+    def timed(self, name):
+        """Декоратор: весь вызов функции — одна операция."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.operation(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    # --- Этапы и счетчики ---
+
+    @contextmanager
+    def span(self, name):
+        op = self._current()
+        if op is None:
+            yield
+            return
+        full_name = op.span_name(name)
+        op.push_level(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            op.pop_level()
+            op.add_span(full_name, time.perf_counter() - t0)
+
+    def phase(self, name):
+        """Закрывает предыдущий этап операции и начинает новый (без лишних отступов в коде)."""
+        op = self._current()
+        if op is None:
+            return
+        op.close_phase()
+        op.phases[-1] = (op.span_name(name), time.perf_counter())
+
+    def count(self, name, n=1):
+        op = self._current()
+        if op is not None:
+            op.counters[name] = op.counters.get(name, 0) + n
+
+    def annotate(self, **meta):
+        op = self._current()
+        if op is not None:
+            op.meta.update(meta)
+
+    # --- Запись и чтение отчета ---
+
+    def _dump_profile(self, profiler, op):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{op.name}_{op.started.strftime('%Y%m%d_%H%M%S')}.prof")
+            profiler.dump_stats(path)
+            return path
+        except Exception:
+            return None
+
+    def _write_record(self, op, total, error, profile_path):
+        if not self.log_path:
+            return
+        record = {
+            "op": op.name,
+            "started": op.started.isoformat(timespec="seconds"),
+            "total_ms": round(total * 1000, 2),
+            "spans": {k: {"ms": round(v["ms"], 2), "calls": v["calls"]} for k, v in op.spans.items()},
+            "counters": op.counters,
+            "meta": op.meta,
+        }
+        if error:
+            record["error"] = error
+        if profile_path:
+            record["profile"] = profile_path
+
+        try:
+            with self._write_lock:
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > self.MAX_LOG_SIZE:
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            # В stdout нельзя: там результат CLI (ровно один JSON)
+            print(f"Failed to write perf log: {e}", file=sys.stderr)
+
+    def read_recent(self, limit=50):
+        """Последние записи лога (новые в конце)."""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return []
+        with self._write_lock:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()[-limit:]
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass
+        return records
+
+
+# Общий экземпляр для всего приложения (настраивается в ConfigManager)
+perf = PerfRecorder()
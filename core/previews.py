@@ -0,0 +1,108 @@
+import secrets
+import threading
+from collections import OrderedDict
+
+# Сколько незавершенных предпросмотров держать (брошенные вытесняются самые старые)
+MAX_PREVIEWS = 8
+# Файлов одной папки за один запрос раскрытия
+EXPAND_PAGE_SIZE = 200
+
+
+class ImportPreviews:
+    """
+    Предпросмотры импорта/обновления, ожидающие подтверждения.
+
+    Полная раскладка (по записи на файл архива) остается здесь, под temp_id: в UI уходит
+    только сводка по папкам (summary), содержимое папки — по запросу (expand), а подтверждение
+    ссылается на temp_id. Для карты на 150 тыс. файлов через мост webview идут килобайты,
+    а не десятки мегабайт JSON туда и обратно.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def put(self, data):
+        """Сохраняет предпросмотр (с mapped_files) и возвращает его temp_id."""
+        temp_id = secrets.token_hex(8)
+        with self._lock:
+            self._items[temp_id] = data
+            while len(self._items) > MAX_PREVIEWS:
+                self._items.popitem(last=False)
+        return temp_id
+
+    def get(self, temp_id):
+        with self._lock:
+            return self._items.get(temp_id)
+
+    def discard(self, temp_id):
+        with self._lock:
+            return self._items.pop(temp_id, None)
+
+    @staticmethod
+    def _tree_path(info):
+        # HOF показываются там, где они лягут в библиотеке (_hofs/...), остальное — по пути в игре
+        return (info.get('stored') or info['target']).replace("\\", "/")
+
+    def summary(self, temp_id):
+        """Все поля предпросмотра, кроме списка файлов, плюс итоги и папки верхнего уровня."""
+        data = self.get(temp_id)
+        if data is None:
+            return None
+        mapped_files = data['mapped_files']
+        status_counts = {}
+        for info in mapped_files:
+            status_counts[info['status']] = status_counts.get(info['status'], 0) + 1
+
+        result = {k: v for k, v in data.items() if k not in ("mapped_files", "extract_path")}
+        result.update({
+            "temp_id": temp_id,
+            "total_files": len(mapped_files),
+            "total_bytes": sum(info.get('size') or 0 for info in mapped_files),
+            "status_counts": status_counts,
+            "folders": self.expand(temp_id, "", limit=0)["folders"],
+        })
+        return result
+
+    def expand(self, temp_id, path="", offset=0, limit=EXPAND_PAGE_SIZE):
+        """
+        Содержимое папки раскладки: подпапки со сводкой (файлов, байт, статусы)
+        и файлы этой папки страницей [offset, offset + limit).
+        """
+        data = self.get(temp_id)
+        if data is None:
+            return None
+        prefix = path.strip("/") + "/" if path.strip("/") else ""
+
+        folders = {}
+        files = []
+        for info in data['mapped_files']:
+            tree_path = self._tree_path(info)
+            if not tree_path.startswith(prefix):
+                continue
+            rest = tree_path[len(prefix):]
+            name, sep, _ = rest.partition("/")
+            if sep:
+                folder = folders.get(name)
+                if folder is None:
+                    folder = folders[name] = {"name": name, "path": prefix + name, "files": 0, "bytes": 0,
+                                              "statuses": {}}
+                folder["files"] += 1
+                folder["bytes"] += info.get('size') or 0
+                folder["statuses"][info['status']] = folder["statuses"].get(info['status'], 0) + 1
+            else:
+                files.append(info)
+
+        files.sort(key=lambda info: self._tree_path(info).lower())
+        return {
+            "path": prefix.rstrip("/"),
+            "folders": sorted(folders.values(), key=lambda f: f["name"].lower()),
+            "total_files": len(files),
+            "offset": offset,
+            "files": [{"name": self._tree_path(info).rsplit("/", 1)[-1], "source": info['source'],
+                       "target": info['target'], "status": info['status'], "size": info.get('size')}
+                      for info in files[offset:offset + limit]],
+        }
+
+
+previews = ImportPreviews()
@@ -0,0 +1,79 @@
+import json
+from core.database import Mod, GameProfile, UnitOfWork
+from core.perf import perf
+
+
+class ProfileManager(UnitOfWork):
+    """Профили состояния модов (включен/приоритет) для разных папок игры."""
+
+    def __init__(self, config_manager, session=None):
+        self.config = config_manager
+        self._open_session(config_manager, session)
+
+    def save_current(self):
+        """Сохраняет текущее состояние модов в профиль текущей папки"""
+        current_path = self.config.game_path
+        if not current_path: return
+
+        mods = self.session.query(Mod).all()
+
+        # Собираем словарь {id: {enabled, prio}}
+        state_data = {}
+        for m in mods:
+            if m.is_enabled or m.priority > 0:
+                state_data[m.id] = {
+                    "e": m.is_enabled,
+                    "p": m.priority
+                }
+
+        json_str = json.dumps(state_data)
+
+        # Записываем в БД
+        profile = self.session.query(GameProfile).get(current_path)
+        if not profile:
+            profile = GameProfile(game_path=current_path)
+            self.session.add(profile)
+
+        profile.mods_state_json = json_str
+        self.session.commit()
+
+    def load(self, new_path):
+        """Загружает состояние модов для новой папки"""
+        profile = self.session.query(GameProfile).get(new_path)
+
+        mods = self.session.query(Mod).all()
+
+        if not profile:
+            # Если профиля нет (новая папка), выключаем все моды
+            for m in mods:
+                m.is_enabled = False
+                m.priority = 0
+        else:
+            # Если профиль есть, восстанавливаем
+            state_data = json.loads(profile.mods_state_json)
+            for m in mods:
+                # Ключи в JSON это строки, приводим к int
+                m_id_str = str(m.id)
+                if m_id_str in state_data:
+                    data = state_data[m_id_str]
+                    m.is_enabled = data["e"]
+                    m.priority = data["p"]
+                else:
+                    m.is_enabled = False
+                    m.priority = 0
+
+        self.session.commit()
+
+    @perf.timed("profile.switch")
+    def switch(self, new_path):
+        """Сохраняет профиль старой папки, меняет путь игры и загружает профиль новой."""
+        perf.phase("save")
+        self.save_current()
+
+        ok, msg = self.config.set_game_path(new_path)
+        if not ok:
+            return False, msg
+
+        perf.phase("load")
+        self.load(new_path)
+        return True, msg
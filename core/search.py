@@ -0,0 +1,122 @@
+import re
+from sqlalchemy import text, func
+from sqlalchemy.exc import OperationalError
+from core.database import Mod, ModFile, HofFile, current_mods_revision, path_key
+from core.mod_list import escape_like
+from core.perf import perf
+from core.winner_map import winner_map
+
+# Вид записи закодирован в rowid library_fts (см. core/migrations.py, шаг 6)
+KIND_NAMES = {0: "mod", 1: "file", 2: "hof"}
+
+# Разделители путей и пробелы: "Vehicles/MAN_SD202/model.cfg" -> три условия AND
+_TERM_SPLIT = re.compile(r"[\s/\\]+")
+
+
+class LibrarySearch:
+    """
+    Поиск по библиотеке: названия модов, пути файлов в игре, имена и описания HOF.
+    Основной путь — FTS5 (trigram, поиск подстрок); без FTS5 — LIKE по таблицам.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._tokenizer = None
+
+    def _fts_tokenizer(self):
+        """'trigram', 'unicode61' или None (FTS5 индекса нет)."""
+        if self._tokenizer is None:
+            row = self.session.execute(
+                text("SELECT sql FROM sqlite_master WHERE type='table' AND name='library_fts'")
+            ).fetchone()
+            if not row:
+                self._tokenizer = ""
+            else:
+                self._tokenizer = "trigram" if "trigram" in row[0] else "unicode61"
+        return self._tokenizer or None
+
+    @perf.timed("search")
+    def search(self, query, limit=50):
+        terms = [t for t in _TERM_SPLIT.split(query or "") if t]
+        if not terms:
+            return {"engine": None, "results": []}
+        limit = min(max(1, int(limit or 50)), 500)
+
+        tokenizer = self._fts_tokenizer()
+        # trigram не ищет по 1-2 символам: короткие термины — доп. фильтр к совпадениям индекса
+        long_terms = [t for t in terms if len(t) >= 3] if tokenizer == "trigram" else terms
+        short_terms = [t for t in terms if t not in long_terms]
+        engine = "like"
+        if tokenizer and long_terms:
+            try:
+                rows = self._search_fts(long_terms, short_terms, limit, prefix=tokenizer != "trigram")
+                engine = "fts5"
+            except OperationalError:
+                rows = self._search_like(terms, limit)
+        elif tokenizer:
+            # Только короткие термины: по путям искать бессмысленно (и это полный проход) — моды и HOF
+            rows = self._search_like(terms, limit, with_files=False)
+        else:
+            rows = self._search_like(terms, limit)
+
+        perf.count("results", len(rows))
+        return {"engine": engine, "results": self._with_mod_names(rows)}
+
+    def _search_fts(self, terms, short_terms, limit, prefix=False):
+        # Каждый термин — отдельная фраза в кавычках (спецсимволы FTS5 не интерпретируются)
+        suffix = "*" if prefix else ""
+        match = " AND ".join('"' + t.replace('"', '""') + '"' + suffix for t in terms)
+        params = {"q": match, "n": limit}
+        extra = ""
+        for i, term in enumerate(short_terms):
+            extra += f" AND casefold(text) LIKE :s{i} ESCAPE '\\'"
+            params[f"s{i}"] = f"%{escape_like(term.casefold())}%"
+        # Без ORDER BY rank: FTS5 останавливается на первых limit совпадениях
+        rows = self.session.execute(
+            text(f"SELECT rowid, text, mod_id FROM library_fts WHERE library_fts MATCH :q{extra} LIMIT :n"),
+            params
+        ).fetchall()
+        return [(KIND_NAMES.get(rowid % 4, "mod"), rowid // 4, value, mod_id) for rowid, value, mod_id in rows]
+
+    def _search_like(self, terms, limit, with_files=True):
+        def matches(column):
+            return [func.casefold(column).like(f"%{escape_like(t.casefold())}%", escape="\\") for t in terms]
+
+        rows = []
+        for mod in self.session.query(Mod.id, Mod.name).filter(*matches(Mod.name)).limit(limit):
+            rows.append(("mod", mod.id, mod.name, mod.id))
+        if with_files and len(rows) < limit:
+            query = self.session.query(ModFile.id, ModFile.target_game_path, ModFile.mod_id) \
+                .filter(*matches(ModFile.target_game_path)).limit(limit - len(rows))
+            rows += [("file", f.id, f.target_game_path, f.mod_id) for f in query]
+        if len(rows) < limit:
+            hof_text = HofFile.filename + " " + func.coalesce(HofFile.description, "")
+            query = self.session.query(HofFile.id, hof_text, HofFile.mod_id) \
+                .filter(*matches(hof_text)).limit(limit - len(rows))
+            rows += [("hof", h[0], h[1], h[2]) for h in query]
+        return rows
+
+    def _with_mod_names(self, rows):
+        mod_ids = {row[3] for row in rows if row[3] is not None}
+        names = dict(self.session.query(Mod.id, Mod.name).filter(Mod.id.in_(mod_ids))) if mod_ids else {}
+
+        # Побеждает ли мод файла в игре — по снимку победителей (core/winner_map.py), если он актуален
+        fresh = any(row[0] == "file" for row in rows) and winner_map.is_current(current_mods_revision(self.session))
+
+        # Сначала моды, потом файлы и HOF — порядок внутри вида как вернул индекс
+        order = {"mod": 0, "file": 1, "hof": 2}
+        results = []
+        for kind, ref_id, value, mod_id in sorted(rows, key=lambda r: order[r[0]]):
+            result = {
+                "kind": kind,
+                "id": ref_id,
+                "text": value.strip() if value else "",
+                "mod_id": mod_id,
+                "mod_name": names.get(mod_id),
+            }
+            if kind == "file":
+                winner = winner_map.lookup(path_key(value)) if fresh and value else None
+                # По моду, а не по ModFile: файл, заново добавленный обновлением мода, — тот же победитель
+                result["active"] = winner is not None and winner[0] == mod_id if fresh else None
+            results.append(result)
+        return results
@@ -0,0 +1,287 @@
+import gzip
+import hashlib
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+from pathlib import PurePosixPath
+from sqlalchemy import select, func
+from core.database import Mod, ModFile, HofFile, HofInstall, UnitOfWork, path_key
+from core.perf import perf
+
+SNAPSHOT_FORMAT = 1
+# Модов на один запрос IN при сверке отпечатков (лимит параметров SQLite)
+MOD_CHUNK = 500
+
+# Строка плана в том же виде, что строки ModInstaller._desired_stream
+PlanRow = namedtuple("PlanRow", "target_key target_game_path source_rel_path mod_id file_id")
+
+
+def _digest(lines):
+    hasher = hashlib.sha1()
+    for line in sorted(lines):
+        hasher.update(line.encode("utf-8"))
+        hasher.update(b"\n")
+    return hasher.hexdigest()
+
+
+def _posix(path):
+    """Пути в снимке — с прямыми слэшами: импорт хранит их в написании ОС, где делали снимок."""
+    return path.replace("\\", "/") if path is not None else None
+
+
+def _native(path):
+    return path.replace("/", os.sep)
+
+
+def _is_safe_name(name):
+    """Одно имя папки (автобус в Vehicles): без разделителей, диска и ссылок наверх."""
+    return isinstance(name, str) and name not in ("", ".", "..") \
+        and not any(c in name for c in ("/", "\\", ":", "\0"))
+
+
+def _is_safe_rel(path):
+    """Относительный путь без выхода наверх и без диска — план из файла не пишет за пределы игры/мода."""
+    parts = PurePosixPath(path.replace("\\", "/")).parts
+    return bool(parts) and not parts[0].startswith("/") and ":" not in parts[0] and ".." not in parts
+
+
+class SetupSnapshot(UnitOfWork):
+    """
+    Переносимый снимок настройки: порядок загрузки, отпечатки модов, готовый план ссылок
+    (победитель для каждого пути) и установленные HOF — один файл .omsisetup (JSON в gzip).
+
+      mods  — включенные моды по приоритету: имя, число файлов, отпечаток раскладки
+              (пути в моде и в игре) и содержимого (content id, если все известны);
+      plan  — [путь в игре, индекс мода, путь в моде или null, если совпадает с путем в игре];
+      hofs  — [content id, имя файла, папка автобуса].
+
+    Моды на другой машине ищутся по отпечатку (а не по id): их импортируют из тех же архивов.
+    План применяется синхронизацией напрямую, без разрешения конфликтов по БД.
+    """
+
+    def __init__(self, config_manager, logger, session=None):
+        self.config = config_manager
+        self.logger = logger
+        self._open_session(config_manager, session)
+
+    def _mod_prints(self, mod_ids):
+        """{mod_id: (отпечаток раскладки, отпечаток содержимого или None)}."""
+        layouts, contents = {}, {}
+        mod_ids = list(mod_ids)
+        for i in range(0, len(mod_ids), MOD_CHUNK):
+            rows = self.session.execute(
+                select(ModFile.mod_id, ModFile.source_rel_path, ModFile.target_key, ModFile.file_hash)
+                .where(ModFile.mod_id.in_(mod_ids[i:i + MOD_CHUNK]))
+            )
+            for mod_id, source_rel, target_key, file_hash in rows:
+                source_rel = _posix(source_rel)
+                layouts.setdefault(mod_id, []).append(f"{source_rel}\0{_posix(target_key) or ''}")
+                content = contents.setdefault(mod_id, [])
+                if content is None:
+                    continue
+                if not file_hash or file_hash == "pending":
+                    # Архивный мод до распаковки — хешей еще нет, сверяется только раскладка
+                    contents[mod_id] = None
+                else:
+                    content.append(f"{source_rel}\0{file_hash}")
+        return {mod_id: (_digest(lines), _digest(contents[mod_id]) if contents[mod_id] is not None else None)
+                for mod_id, lines in layouts.items()}
+
+    @perf.timed("setup.export")
+    def export(self, path):
+        """Записывает снимок текущей настройки в path. Возвращает (успех, сообщение, сводка)."""
+        from core.installer import ModInstaller
+
+        mods = self.session.query(Mod).filter_by(is_enabled=True).order_by(Mod.priority).all()
+        index = {mod.id: i for i, mod in enumerate(mods)}
+        prints = self._mod_prints(index)
+        counts = dict(self.session.execute(
+            select(ModFile.mod_id, func.count(ModFile.id)).where(ModFile.mod_id.in_(list(index)))
+            .group_by(ModFile.mod_id)).all()) if index else {}
+
+        perf.phase("plan")
+        installer = ModInstaller(self.config, self.logger, session=self.session)
+        plan = []
+        for row in installer._desired_stream():
+            target, source = _posix(row.target_game_path), _posix(row.source_rel_path)
+            plan.append([target, index[row.mod_id], source if source != target else None])
+
+        hofs = self.session.execute(
+            select(HofFile.content_hash, HofFile.filename, HofInstall.bus_folder_name)
+            .join(HofInstall, HofInstall.hof_file_id == HofFile.id)
+            .order_by(HofInstall.bus_folder_name, HofFile.filename)
+        ).all()
+
+        data = {
+            "format": SNAPSHOT_FORMAT,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "game_path": self.config.game_path,
+            "mods": [{"name": mod.name, "files": counts.get(mod.id, 0),
+                      "layout": prints.get(mod.id, (None, None))[0],
+                      "content": prints.get(mod.id, (None, None))[1]} for mod in mods],
+            "plan": plan,
+            "hofs": [list(row) for row in hofs],
+        }
+        perf.phase("write")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+        perf.count("mods", len(mods))
+        perf.count("files", len(plan))
+        summary = {"mods": len(mods), "files": len(plan), "hofs": len(hofs)}
+        return True, f"Снимок сохранен: модов {len(mods)}, файлов {len(plan)}, HOF {len(hofs)}.", summary
+
+    @staticmethod
+    def read(path):
+        """Содержимое файла снимка или ValueError, если это не снимок или он не подходит."""
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, EOFError, ValueError) as e:
+            raise ValueError(f"Не удалось прочитать снимок: {e}")
+        if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError("Неизвестный формат снимка")
+        if not all(isinstance(data.get(key), list) for key in ("mods", "plan", "hofs")):
+            raise ValueError("Снимок поврежден: нет списков mods/plan/hofs")
+        for item in data["mods"]:
+            if not (isinstance(item, dict) and isinstance(item.get("name"), str)
+                    and type(item.get("files")) is int and isinstance(item.get("layout"), (str, type(None)))
+                    and isinstance(item.get("content"), (str, type(None)))):
+                raise ValueError("Снимок поврежден: недопустимое описание мода")
+        for row in data["plan"]:
+            if not (isinstance(row, list) and len(row) == 3):
+                raise ValueError(f"Недопустимая строка плана: {row!r}")
+            target, mod_index, source = row
+            if not isinstance(target, str) or not _is_safe_rel(target) \
+                    or (source is not None and not (isinstance(source, str) and _is_safe_rel(source))) \
+                    or type(mod_index) is not int or not 0 <= mod_index < len(data["mods"]):
+                raise ValueError(f"Недопустимая строка плана: {row!r}")
+        for row in data["hofs"]:
+            # Папка автобуса — одно имя внутри Vehicles, иначе HOF легли бы за ее пределы
+            if not (isinstance(row, list) and len(row) == 3 and isinstance(row[1], str) and _is_safe_name(row[1])
+                    and (row[0] is None or isinstance(row[0], str)) and _is_safe_name(row[2])):
+                raise ValueError(f"Недопустимая строка HOF: {row!r}")
+        return data
+
+    def _match_mods(self, wanted):
+        """Локальный мод для каждого мода снимка (по числу файлов и отпечаткам; при равенстве — по имени)."""
+        counts = self.session.execute(
+            select(ModFile.mod_id, func.count(ModFile.id)).group_by(ModFile.mod_id)).all()
+        sizes = {item["files"] for item in wanted}
+        prints = self._mod_prints(mod_id for mod_id, count in counts if count in sizes)
+        names = dict(self.session.execute(select(Mod.id, Mod.name)).all())
+
+        matched, missing, used = [], [], set()
+        for item in wanted:
+            candidates = [
+                mod_id for mod_id, (layout, content) in prints.items()
+                if mod_id not in used and layout == item["layout"]
+                and (content is None or item["content"] is None or content == item["content"])
+            ]
+            candidates.sort(key=lambda mod_id: names.get(mod_id) != item["name"])
+            if not candidates:
+                missing.append(item["name"])
+                continue
+            used.add(candidates[0])
+            matched.append(candidates[0])
+        return matched, missing
+
+    @perf.timed("setup.apply")
+    def apply(self, path):
+        """
+        Применяет снимок к текущей папке игры: включает найденные моды в порядке снимка
+        (остальные выключает), ставит файлы по готовому плану и HOF. Если каких-то модов
+        в библиотеке нет, ничего не меняется. Возвращает (успех, сообщение, сводка).
+        """
+        from core.installer import ModInstaller
+
+        try:
+            data = self.read(path)
+        except ValueError as e:
+            return False, str(e), {}
+
+        perf.phase("match")
+        mod_ids, missing = self._match_mods(data["mods"])
+        if missing:
+            return False, "В библиотеке нет модов из снимка (импортируйте те же архивы)", {"missing_mods": missing}
+
+        perf.phase("load_order")
+        priorities = {mod_id: i for i, mod_id in enumerate(mod_ids)}
+        for mod in self.session.query(Mod):
+            mod.is_enabled = mod.id in priorities
+            if mod.id in priorities:
+                mod.priority = priorities[mod.id]
+        self.session.commit()
+
+        # План — уже по ключу пути и по одной строке на ключ, как _desired_stream
+        perf.phase("plan")
+        plan = {}
+        for target, mod_index, source in data["plan"]:
+            target = _native(_posix(target))
+            source = _native(_posix(source)) if source else target
+            plan.setdefault(path_key(target), (target, source, mod_ids[mod_index]))
+        desired = [PlanRow(key, target, source, mod_id, 0) for key, (target, source, mod_id) in sorted(plan.items())]
+        perf.count("files", len(desired))
+
+        installer = ModInstaller(self.config, self.logger, session=self.session)
+        ok, msg = installer.sync_state(desired=desired)
+
+        perf.phase("hofs")
+        hof_ok, hof_msg, placed, missing_hofs, skipped_hofs = self._apply_hofs(data["hofs"])
+
+        summary = {"mods": len(mod_ids), "files": len(desired), "hofs": placed,
+                   "missing_hofs": missing_hofs, "skipped_hofs": skipped_hofs, "sync": msg}
+        if hof_msg:
+            summary["hof_message"] = hof_msg
+        return ok and hof_ok, f"Снимок применен: модов {len(mod_ids)}, файлов {len(desired)}.", summary
+
+    def _apply_hofs(self, entries):
+        """
+        Ставит HOF снимка в автобусы текущей папки игры. У HofInstall нет папки игры, поэтому
+        «уже установлен» — только если файл есть на диске в этой папке. Возвращает
+        (успех, сообщение, сколько HOF на месте, ненайденные в библиотеке, не поставленные).
+        """
+        from core.hof_tools import HofTools
+
+        if not entries:
+            return True, None, 0, [], []
+        by_hash, by_name, filenames = {}, {}, {}
+        for hof_id, content_hash, filename in self.session.execute(
+                select(HofFile.id, HofFile.content_hash, HofFile.filename).order_by(HofFile.id)):
+            if content_hash:
+                by_hash.setdefault(content_hash, hof_id)
+            by_name.setdefault(filename.casefold(), hof_id)
+            filenames[hof_id] = filename
+
+        with HofTools(self.config, self.logger, session=self.session) as tools:
+            if tools.vehicles_path is None:
+                return False, "Не задана папка игры", 0, [], sorted({filename for _, filename, _ in entries})
+
+            def on_disk(hof_id, bus):
+                return os.path.lexists(tools.vehicles_path / bus / filenames[hof_id])
+
+            wanted, per_bus, missing = set(), {}, []
+            for content_hash, filename, bus in entries:
+                hof_id = by_hash.get(content_hash) or by_name.get(filename.casefold())
+                if hof_id is None:
+                    missing.append(filename)
+                    continue
+                wanted.add((hof_id, bus))
+                if not on_disk(hof_id, bus):
+                    per_bus.setdefault(bus, set()).add(hof_id)
+
+            # Автобусы с одинаковым набором HOF — одним вызовом
+            groups = {}
+            for bus, hof_ids in per_bus.items():
+                groups.setdefault(tuple(sorted(hof_ids)), []).append(bus)
+            ok, messages = True, []
+            for hof_ids, buses in groups.items():
+                success, msg = tools.install_hofs_to_buses(list(hof_ids), sorted(buses))
+                ok = ok and success
+                messages.append(msg)
+
+            # Считаются только HOF, которые действительно лежат в автобусах (папки автобуса может не быть)
+            skipped = sorted({f"{bus}/{filenames[hof_id]}" for hof_id, bus in wanted if not on_disk(hof_id, bus)})
+        placed = len(wanted) - len(skipped)
+        return ok and not skipped and not missing, "; ".join(messages) or None, placed, sorted(set(missing)), skipped
@@ -0,0 +1,115 @@
+import errno
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+# Linux: ioctl FICLONE (reflink на btrfs/xfs) — используется, если жесткая ссылка невозможна
+FICLONE = 0x40049409
+
+
+def content_id(path, chunk_size=1024 * 1024):
+    """Идентификатор содержимого файла (blake2b-128, hex)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Общее хранилище содержимого библиотеки: Library/Blobs/<2 символа>/<content_id>.
+    Файл мода с уже известным содержимым заменяется жесткой ссылкой на блоб
+    (или reflink, где жесткие ссылки недоступны) — одинаковые текстуры и звуки
+    разных модов занимают место на диске и в page cache один раз.
+    """
+
+    def __init__(self, library_path):
+        self.root = Path(library_path) / "Blobs"
+        self.enabled = True  # Отключается после первой ошибки ФС (FAT, сетевой диск...)
+
+    def blob_path(self, cid):
+        return self.root / cid[:2] / cid
+
+    def ingest(self, file_path):
+        """
+        Считает content id файла и дедуплицирует его через блоб.
+        Возвращает (content_id, сэкономлено_байт).
+        """
+        file_path = Path(file_path)
+        cid = content_id(file_path)
+        if not self.enabled:
+            return cid, 0
+
+        blob = self.blob_path(cid)
+        try:
+            blob_stat = blob.stat()
+        except FileNotFoundError:
+            blob_stat = None
+
+        try:
+            if blob_stat is None:
+                # Первая копия содержимого сама становится блобом (та же inode, без копирования)
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.link(file_path, blob)
+                return cid, 0
+
+            file_stat = file_path.stat()
+            if (file_stat.st_dev, file_stat.st_ino) == (blob_stat.st_dev, blob_stat.st_ino):
+                return cid, 0
+
+            tmp = file_path.with_name(file_path.name + ".dedup_tmp")
+            self._link_or_clone(blob, tmp)
+            os.replace(tmp, file_path)
+            return cid, file_stat.st_size
+        except OSError as e:
+            if e.errno == errno.EMLINK:
+                # Лимит ссылок на блоб (NTFS: 1023) — просто оставляем файл как есть
+                return cid, 0
+            self.enabled = False
+            return cid, 0
+
+    def _link_or_clone(self, src, dst):
+        try:
+            os.link(src, dst)
+            return
+        except OSError as e:
+            if e.errno == errno.EMLINK or not sys.platform.startswith("linux"):
+                raise
+        # Жесткая ссылка не вышла — пробуем reflink (копия без дублирования блоков на диске)
+        import fcntl
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            try:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            except OSError:
+                d.close()
+                os.unlink(dst)
+                raise
+
+    def release(self, content_ids):
+        """Удаляет блобы, на которые больше никто не ссылается (остался только сам блоб)."""
+        freed = 0
+        for cid in set(content_ids):
+            if not cid or len(cid) != 32:
+                continue
+            blob = self.blob_path(cid)
+            try:
+                st = blob.stat()
+                if st.st_nlink <= 1:
+                    blob.unlink()
+                    freed += st.st_size
+            except OSError:
+                pass
+        return freed
+
+    def collect_garbage(self):
+        """Полный проход по хранилищу: удалить все блобы без ссылок."""
+        freed = 0
+        if not self.root.exists():
+            return freed
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            freed += self.release(entry.name for entry in os.scandir(sub.path))
+        return freed
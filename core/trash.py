@@ -0,0 +1,208 @@
+import json
+import os
+import stat
+import sys
+import threading
+import time
+from pathlib import Path
+from core.perf import perf
+from core.storage import BlobStore
+
+# put() и pending() не пересекаются: фоновое стирание не видит наполовину перенесенную запись
+_lock = threading.Lock()
+
+
+def lower_thread_priority():
+    """Фоновый поток — с наименьшим приоритетом (Linux: nice 19 для потока; на Windows — как есть)."""
+    if sys.platform.startswith("linux"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+
+class Trash:
+    """
+    Корзина библиотеки: Library/Trash.
+
+    Удаляемые папки и архивы модов не стираются на месте, а переименовываются сюда
+    (rename в пределах одного диска — мгновенно, сколько бы файлов ни было):
+
+      Trash/<token>/       — перенесенные папка мода, архив...
+      Trash/<token>.json   — {"name": ..., "blobs": [content id]} — блобы, которые можно
+                             освободить после стирания (пока файлы мода в корзине,
+                             на блобы еще есть жесткие ссылки)
+
+    Само стирание — purge(), в фоне (TrashPurger). Оно идемпотентно: прерванное на середине
+    просто продолжается при следующем запуске.
+    """
+
+    def __init__(self, library_path):
+        self.library_path = library_path
+        self.root = Path(library_path) / "Trash"
+
+    def put(self, paths, content_ids=(), name=None):
+        """Переносит пути в корзину (несуществующие пропускаются). Ошибка rename — исключение OSError."""
+        with _lock:
+            return self._put(paths, content_ids, name)
+
+    def _put(self, paths, content_ids, name):
+        self.root.mkdir(parents=True, exist_ok=True)
+        token = f"{time.time_ns():x}"
+        entry = self.root / token
+
+        # Сначала описание: если процесс упадет после переноса, блобы все равно освободятся
+        meta_path = self.root / f"{token}.json"
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"name": name, "blobs": sorted({c for c in content_ids if c})}, f, ensure_ascii=False)
+
+        entry.mkdir()
+        moved = 0
+        try:
+            for path in paths:
+                if path is None:
+                    continue
+                path = Path(path)
+                if not (path.exists() or path.is_symlink()):
+                    continue
+                os.replace(path, entry / f"{moved}_{path.name}")
+                moved += 1
+        except OSError:
+            if moved == 0:
+                entry.rmdir()
+                meta_path.unlink()
+            raise
+        return token
+
+    def pending(self):
+        """Токены записей, ожидающих стирания."""
+        if not self.root.exists():
+            return []
+        with _lock:
+            names = [item.name for item in os.scandir(self.root)]
+        return sorted({name[:-5] if name.endswith(".json") else name for name in names})
+
+    def purge(self, token):
+        """Стирает одну запись корзины и освобождает ее блобы. Возвращает освобожденные байты."""
+        entry = self.root / token
+        meta_path = self.root / f"{token}.json"
+
+        freed = 0
+        if entry.exists():
+            freed += self._remove_tree(entry)
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        if meta.get("blobs"):
+            freed += BlobStore(self.library_path).release(meta["blobs"])
+        try:
+            meta_path.unlink()
+        except FileNotFoundError:
+            pass
+        return freed
+
+    @staticmethod
+    def _remove_tree(root):
+        """
+        Удаление снизу вверх с подсчетом места: файл со ссылками из блобов (st_nlink > 1)
+        место не освобождает. Файлы «только для чтения» (архивы с Windows) — через chmod.
+        """
+        freed = 0
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.lstat(path)
+                    try:
+                        os.unlink(path)
+                    except PermissionError:
+                        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+                        os.unlink(path)
+                    if st.st_nlink <= 1 and not stat.S_ISLNK(st.st_mode):
+                        freed += st.st_size
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(dirpath)
+            except PermissionError:
+                os.chmod(dirpath, stat.S_IWRITE | stat.S_IREAD | stat.S_IEXEC)
+                os.rmdir(dirpath)
+            except FileNotFoundError:
+                pass
+        return freed
+
+
+class TrashPurger:
+    """
+    Фоновое стирание корзины: один поток на процесс, пониженный приоритет (Linux — nice 19
+    для потока). Запускается после удаления мода и при старте — чтобы дочистить прерванное.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._library_path = None
+        self._logger = None
+        self._wakeup = False
+        self.reclaimed_bytes = 0
+        self.last_error = None
+
+    def start(self, library_path, logger=None):
+        with self._lock:
+            self._library_path = library_path
+            self._logger = logger
+            if self._thread is not None and self._thread.is_alive():
+                self._wakeup = True  # Новая запись — поток пройдет по корзине еще раз
+                return
+            self._wakeup = False
+            self._thread = threading.Thread(target=self._loop, name="trash-purge", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def status(self, library_path):
+        running = self._thread is not None and self._thread.is_alive()
+        return {
+            "running": running,
+            "pending": len(Trash(library_path).pending()),
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "error": self.last_error,
+        }
+
+    def _loop(self):
+        lower_thread_priority()
+        while True:
+            with self._lock:
+                trash = Trash(self._library_path)
+                logger = self._logger
+                self._wakeup = False
+            freed = self._purge_all(trash)
+            if freed and logger:
+                logger.log(f"Корзина: освобождено {freed / 1024 / 1024:.1f} МБ", "info")
+            with self._lock:
+                if not self._wakeup:
+                    return
+
+    @perf.timed("trash.purge")
+    def _purge_all(self, trash):
+        freed = 0
+        tokens = trash.pending()
+        for token in tokens:
+            try:
+                freed += trash.purge(token)
+            except OSError as e:
+                # Файл занят (Windows) — запись останется до следующего запуска
+                self.last_error = f"{token}: {e}"
+        self.reclaimed_bytes += freed
+        perf.count("entries", len(tokens))
+        perf.count("bytes", freed)
+        return freed
+
+
+purger = TrashPurger()
@@ -0,0 +1,357 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+from core.database import path_key
+
+# Папки игры, за которыми следим (сканы HOF/автобусов и установленные ссылки)
+GAME_WATCH_DIRS = ("vehicles", "maps")
+
+# Linux inotify
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Сколько папок максимум ставим под inotify (системный лимит обычно 8192 на пользователя)
+MAX_INOTIFY_WATCHES = 6000
+POLL_INTERVAL = 10.0
+# Больше накопленных путей — вместо них одна полная проверка установленных файлов
+MAX_DIRTY_PATHS = 5000
+
+
+class _InotifyBackend:
+    """Рекурсивные inotify watch'и; новые папки берутся под наблюдение по IN_CREATE/IN_MOVED_TO."""
+
+    def __init__(self, on_change, on_overflow, on_lost):
+        self.on_change = on_change
+        self.on_overflow = on_overflow
+        self.on_lost = on_lost
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wds = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_tree(self, root):
+        """False — не хватило watch'ей (MAX_INOTIFY_WATCHES или системный лимит)."""
+        for dirpath, _, _ in os.walk(root):
+            if len(self._wds) >= MAX_INOTIFY_WATCHES:
+                return False
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == errno.ENOSPC:
+                    return False
+                continue  # Папка исчезла между walk и add — не страшно
+            self._wds[wd] = dirpath
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="fs-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is None:
+            os.close(self._fd)
+        elif self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    def _loop(self):
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self._fd], [], [], 1.0)
+                if ready:
+                    self._read_events()
+        finally:
+            os.close(self._fd)
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.on_overflow()
+                continue
+            if mask & IN_IGNORED:
+                self._wds.pop(wd, None)
+                continue
+            parent = self._wds.get(wd)
+            if parent is None:
+                continue
+            path = os.path.join(parent, os.fsdecode(name)) if name else parent
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                if not self.add_tree(path):
+                    # Новую папку уже не отследить — дальше кэшу верить нельзя
+                    self.on_lost()
+                    self._stop.set()
+                    return
+            self.on_change(path)
+
+
+class _PollingBackend:
+    """
+    Запасной вариант (Windows, нет inotify, не хватило watch'ей): раз в POLL_INTERVAL
+    обходит папки и сравнивает mtime папки и самых свежих файлов в ней.
+    На Windows scandir отдает stat бесплатно, так что обход — это только чтение каталогов,
+    но на большой библиотеке это все равно постоянная нагрузка на диск: включается только
+    по настройке (FsWatcher.start(allow_polling=True)).
+    """
+
+    def __init__(self, on_change, on_overflow, on_lost):
+        self.on_change = on_change
+        self._roots = []
+        self._snapshot = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_tree(self, root):
+        self._roots.append(root)
+        self._snapshot.update(self._scan(root))
+        return True
+
+    @staticmethod
+    def _scan(root):
+        state = {}
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                newest = os.stat(path).st_mtime_ns
+                count = 0
+                with os.scandir(path) as it:
+                    for entry in it:
+                        count += 1
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            newest = max(newest, entry.stat(follow_symlinks=False).st_mtime_ns)
+                state[path] = (newest, count)
+            except OSError:
+                continue
+        return state
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="fs-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    def _loop(self):
+        while not self._stop.wait(POLL_INTERVAL):
+            current = {}
+            for root in self._roots:
+                current.update(self._scan(root))
+            for path in set(current) | set(self._snapshot):
+                if current.get(path) != self._snapshot.get(path):
+                    self.on_change(path)
+            self._snapshot = current
+
+
+class FsWatcher:
+    """
+    Наблюдение за папкой игры (Vehicles, maps) и библиотекой модов (Library/Mods).
+
+    - Кэш сканов (cached): результат живет, пока watcher не сообщит об изменениях в его области.
+      Пока watcher не запущен, кэша нет — всё считается заново, как раньше.
+    - Дрейф установленных файлов: изменившиеся пути игры и папки модов копятся до следующей
+      проверки (ModInstaller.check_drift). Свои же изменения (синхронизация) тоже попадают сюда —
+      проверка для них просто ничего не находит.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.backend_name = None
+        self._backend = None
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._generation = 0
+        self._game_root = None
+        self._game_dirs = {}
+        self._mods_dir = None
+        self._dirty_keys = set()
+        self._dirty_mod_dirs = set()
+        self._full_check = False
+
+    # --- Запуск ---
+
+    def start(self, game_path, library_path, polling=False, allow_polling=False):
+        """
+        Запускает наблюдение (перезапускает, если уже было). Без inotify — обход по таймеру,
+        только если allow_polling (polling — обход в любом случае). False — папок нет или
+        обход не разрешен, кэш выключен.
+        """
+        self.stop()
+        if not game_path or not library_path:
+            return False
+
+        # Папки игры ищем без учета регистра (Vehicles / vehicles)
+        game_dirs = {}
+        try:
+            for entry in os.scandir(game_path):
+                if entry.is_dir() and entry.name.lower() in GAME_WATCH_DIRS:
+                    game_dirs[entry.name.lower()] = entry.path
+        except OSError:
+            return False
+        mods_dir = os.path.join(library_path, "Mods")
+        roots = list(game_dirs.values()) + ([mods_dir] if os.path.isdir(mods_dir) else [])
+
+        self._game_root = str(game_path)
+        self._game_dirs = game_dirs
+        self._mods_dir = mods_dir
+
+        backend = None
+        if not polling and sys.platform.startswith("linux"):
+            try:
+                backend = _InotifyBackend(self._on_change, self._on_overflow, self._on_lost)
+                if not all(backend.add_tree(root) for root in roots):
+                    backend.stop()
+                    backend = None
+                else:
+                    self.backend_name = "inotify"
+            except OSError:
+                backend = None
+        if backend is None:
+            if not (polling or allow_polling):
+                return False
+            backend = _PollingBackend(self._on_change, self._on_overflow, self._on_lost)
+            for root in roots:
+                backend.add_tree(root)
+            self.backend_name = "polling"
+
+        with self._lock:
+            self._cache.clear()
+            # Что менялось, пока наблюдения не было, неизвестно — первая проверка полная
+            self._full_check = True
+        self._backend = backend
+        backend.start()
+        self.active = True
+        return True
+
+    def stop(self):
+        self.active = False
+        if self._backend:
+            self._backend.stop()
+            self._backend = None
+        self.backend_name = None
+        with self._lock:
+            self._cache.clear()
+            self._dirty_keys.clear()
+            self._dirty_mod_dirs.clear()
+            self._full_check = False
+
+    # --- Кэш ---
+
+    def cached(self, scope, key, compute, latest_only=False):
+        """
+        Значение из кэша или compute(); без активного watcher'а — всегда compute().
+        latest_only — ключ это версия данных (ревизия): в области хранится только последнее значение.
+        """
+        if not self.active:
+            return compute()
+        with self._lock:
+            if (scope, key) in self._cache:
+                return self._cache[(scope, key)]
+            generation = self._generation
+        value = compute()
+        with self._lock:
+            # Если во время расчета что-то сбросилось, результат мог устареть — не запоминаем
+            if self.active and generation == self._generation:
+                if latest_only:
+                    for cache_key in [k for k in self._cache if k[0] == scope]:
+                        del self._cache[cache_key]
+                self._cache[(scope, key)] = value
+        return value
+
+    def invalidate(self, scope, key=None):
+        with self._lock:
+            self._generation += 1
+            for cache_key in [k for k in self._cache if k[0] == scope and (key is None or k[1] == key)]:
+                del self._cache[cache_key]
+
+    # --- События ---
+
+    def _on_change(self, path):
+        for name, root in self._game_dirs.items():
+            if path == root or path.startswith(root + os.sep):
+                if name == "vehicles":
+                    top = os.path.relpath(path, root).split(os.sep)[0]
+                    self.invalidate("buses")
+                    self.invalidate("bus", top)
+                    self.invalidate("game_hofs", top)
+                self._mark_dirty(self._dirty_keys, path_key(os.path.relpath(path, self._game_root)))
+                return
+
+        if path.startswith(self._mods_dir + os.sep):
+            self._mark_dirty(self._dirty_mod_dirs, os.path.relpath(path, self._mods_dir).split(os.sep)[0])
+
+    def _mark_dirty(self, target, value):
+        with self._lock:
+            if self._full_check:
+                return
+            target.add(value)
+            if len(self._dirty_keys) + len(self._dirty_mod_dirs) > MAX_DIRTY_PATHS:
+                # Массовые изменения: дешевле один полный проход, чем держать все пути
+                self._full_check = True
+                self._dirty_keys.clear()
+                self._dirty_mod_dirs.clear()
+
+    def _on_overflow(self):
+        # Очередь событий переполнилась — часть изменений потеряна
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self._full_check = True
+            self._dirty_keys.clear()
+            self._dirty_mod_dirs.clear()
+
+    def _on_lost(self):
+        # Наблюдение больше не полное: кэш выключается до следующего start()
+        self.active = False
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def take_dirty(self):
+        """
+        Изменения со времени прошлого вызова: (нужна полная проверка, ключи путей игры, папки Library/Mods).
+        Без активного watcher'а — ничего (проверка только по явному запросу).
+        """
+        with self._lock:
+            result = (self._full_check, self._dirty_keys, self._dirty_mod_dirs)
+            self._full_check = False
+            self._dirty_keys, self._dirty_mod_dirs = set(), set()
+        return result
+
+
+watcher = FsWatcher()
@@ -0,0 +1,300 @@
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import threading
+from array import array
+from pathlib import Path
+
+MAGIC = b"OMWM"
+FORMAT_VERSION = 1
+# magic, версия, флаги, поколение (ревизия модов), число записей, длина root в байтах
+HEADER = struct.Struct("<4sHHQQI4x")
+# Флаг: установленное в root совпадает с картой (синхронизация прошла без ошибок)
+FLAG_APPLIED = 1
+# Изменений в памяти до сброса отсортированной порции на диск (WinnerMapUpdate)
+RUN_SIZE = 50000
+# Пар (uint64 × 2) на одно чтение/запись при слиянии
+IO_PAIRS = 8192
+# Значение-метка «путь больше ничей» в потоке изменений
+REMOVED = 0xFFFFFFFFFFFFFFFF
+
+
+def key_hash(key):
+    """64-битный хеш ключа пути (path_key/target_key) — ключ записи в снимке."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def pack_winner(mod_id, file_id):
+    return mod_id | (file_id << 32)
+
+
+class WinnerMap:
+    """
+    Снимок разрешенной карты победителей: Library/winner_map.bin.
+
+    Для каждого пути, на который претендуют включенные моды, — мод-победитель и его ModFile.
+    Формат — заголовок (HEADER, затем root в UTF-8 с выравниванием до 8 байт) и отсортированный
+    массив пар uint64 (little-endian): хеш ключа пути (key_hash) и mod_id | file_id << 32.
+    Файл отображается в память (mmap) при запуске; поиск — бинарный по массиву, без ORM и строк.
+
+    Поколение — current_mods_revision на момент синхронизации, записавшей снимок: если ревизия
+    модов с тех пор изменилась, снимок устарел и для поиска не используется. После синхронизации
+    снимок обновляется разницей (операциями этой синхронизации), а не перестраивается из БД.
+    Совпадение 64-битных хешей двух путей на практике исключено; если оно случится, число
+    записей не сойдется с числом установленных файлов, и синхронизация просто не будет пропущена.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._file = None
+        self._mm = None
+        self._records = None
+        self.generation = None
+        self.root = None
+        self.applied = False
+        self.count = 0
+
+    def open(self, library_path):
+        """Отображает снимок библиотеки в память (повторный вызов для той же библиотеки — ничего не делает)."""
+        path = Path(library_path) / "winner_map.bin"
+        with self._lock:
+            if self._path != path:
+                self._close()
+                self._path = path
+                self._map()
+        return self
+
+    def _map(self):
+        try:
+            self._file = open(self._path, "rb")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, flags, generation, count, root_len = HEADER.unpack_from(self._mm, 0)
+            offset = HEADER.size + (root_len + 7) // 8 * 8
+            if magic != MAGIC or version != FORMAT_VERSION or len(self._mm) != offset + count * 16:
+                raise ValueError("winner map: bad header")
+            self.root = self._mm[HEADER.size:HEADER.size + root_len].decode("utf-8")
+            self._records = memoryview(self._mm)[offset:].cast("Q")
+            self.generation, self.count, self.applied = generation, count, bool(flags & FLAG_APPLIED)
+        except (OSError, ValueError, struct.error, UnicodeDecodeError):
+            # Нет снимка или он поврежден — как будто его нет, следующая синхронизация запишет новый
+            self._close()
+
+    def _close(self):
+        if self._records is not None:
+            self._records.release()
+        if self._mm is not None:
+            self._mm.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = self._mm = self._records = None
+        self.generation = self.root = None
+        self.applied = False
+        self.count = 0
+
+    def close(self):
+        with self._lock:
+            self._close()
+            self._path = None
+
+    def is_current(self, generation):
+        return self._records is not None and self.generation == generation
+
+    def is_applied(self, root, generation):
+        """Снимок актуален и установленное в root ему соответствует."""
+        with self._lock:
+            return self.applied and self.root == root and self.is_current(generation)
+
+    def lookup(self, key):
+        """(mod_id, file_id) победителя по ключу пути или None."""
+        wanted = key_hash(key)
+        with self._lock:
+            records = self._records
+            if records is None:
+                return None
+            lo, hi = 0, self.count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                value = records[mid * 2]
+                if value < wanted:
+                    lo = mid + 1
+                elif value > wanted:
+                    hi = mid
+                else:
+                    packed = records[mid * 2 + 1]
+                    return packed & 0xFFFFFFFF, packed >> 32
+        return None
+
+    def invalidate(self):
+        """Снимает флаг applied прямо в файле (синхронизация начинает менять диск)."""
+        with self._lock:
+            if self._records is None or not self.applied:
+                return
+            try:
+                with open(self._path, "r+b") as f:
+                    f.seek(6)
+                    f.write(struct.pack("<H", 0))
+            except OSError:
+                pass
+            self.applied = False
+
+    def update(self, base=True):
+        """
+        Изменения для нового снимка (WinnerMapUpdate): base=True — поверх текущего,
+        иначе — с нуля. Порции, оставшиеся от прерванной записи, удаляются.
+        """
+        for stale in self._path.parent.glob(self._path.name + ".run*"):
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+        return WinnerMapUpdate(self, base)
+
+    @staticmethod
+    def _find(records, key, lo, hi):
+        """Первая позиция в [lo, hi) с хешом не меньше key (бинарный поиск по отображенному массиву)."""
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if records[mid * 2] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _write_merged(self, root, generation, changes, base):
+        """
+        Новый снимок одним проходом: отрезки старого массива между изменениями копируются
+        в файл как есть (срезом отображения), изменения вставляются на свои места.
+        changes — пары (key_hash, packed или REMOVED) по возрастанию хеша.
+        """
+        root_bytes = root.encode("utf-8")
+        padding = b"\0" * ((len(root_bytes) + 7) // 8 * 8 - len(root_bytes))
+
+        with self._lock:
+            path = self._path
+            temp_path = path.with_name(path.name + ".tmp")
+            records = self._records if base else None
+            total = self.count if records is not None else 0
+            count = pos = 0
+            with open(temp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0, len(root_bytes)) + root_bytes + padding)
+                out = array("Q")
+                for key, value in changes:
+                    found = self._find(records, key, pos, total) if total else 0
+                    if found > pos:
+                        f.write(out.tobytes())
+                        del out[:]
+                        with records[pos * 2:found * 2] as part:
+                            f.write(part)
+                        count += found - pos
+                        pos = found
+                    if pos < total and records[pos * 2] == key:
+                        pos += 1  # Старая запись этого пути заменяется или удаляется
+                    if value != REMOVED:
+                        out.append(key)
+                        out.append(value)
+                        count += 1
+                        if len(out) >= IO_PAIRS * 2:
+                            f.write(out.tobytes())
+                            del out[:]
+                f.write(out.tobytes())
+                if pos < total:
+                    with records[pos * 2:total * 2] as part:
+                        f.write(part)
+                    count += total - pos
+                # Число записей известно только в конце — заголовок пишется последним
+                f.seek(0)
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_APPLIED, generation, count, len(root_bytes)))
+            # Windows не заменяет файл, отображенный в память: сначала закрываем старый
+            self._close()
+            os.replace(temp_path, path)
+            self._map()
+
+
+class WinnerMapUpdate:
+    """
+    Изменения снимка победителей за одну синхронизацию. В памяти — не больше RUN_SIZE
+    изменений: заполненная порция сортируется и уходит во временный файл рядом со снимком.
+    commit сливает порции (heapq.merge) со старым снимком в новый файл, так что память
+    не зависит ни от размера библиотеки, ни от числа операций синхронизации.
+    """
+
+    def __init__(self, winner_map, base):
+        self._map = winner_map
+        self.base = base
+        self._pending = {}
+        self._runs = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def set(self, key, value):
+        self._pending[key] = value
+        self.count += 1
+        if len(self._pending) >= RUN_SIZE:
+            self._spill()
+
+    def remove(self, key):
+        self.set(key, REMOVED)
+
+    def _spill(self):
+        path = self._map._path.with_name(f"{self._map._path.name}.run{len(self._runs)}")
+        flat = array("Q")
+        for key, value in sorted(self._pending.items()):
+            flat.append(key)
+            flat.append(value)
+        with open(path, "wb") as f:
+            flat.tofile(f)
+        self._runs.append(path)
+        self._pending = {}
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, "rb") as f:
+            while True:
+                chunk = array("Q")
+                try:
+                    chunk.fromfile(f, IO_PAIRS * 2)
+                except EOFError:
+                    pass  # Последний неполный кусок уже в chunk
+                if not chunk:
+                    return
+                yield from zip(chunk[0::2], chunk[1::2])
+
+    @staticmethod
+    def _tag(source, order):
+        for key, value in source:
+            yield key, order, value
+
+    def _changes(self):
+        """Все изменения по возрастанию хеша; для одного пути побеждает более позднее."""
+        sources = [self._read_run(path) for path in self._runs] + [iter(sorted(self._pending.items()))]
+        tagged = [self._tag(source, order) for order, source in enumerate(sources)]
+        last = None
+        for item in heapq.merge(*tagged):
+            if last is not None and item[0] != last[0]:
+                yield last[0], last[2]
+            last = item
+        if last is not None:
+            yield last[0], last[2]
+
+    def commit(self, root, generation):
+        try:
+            self._map._write_merged(root, generation, self._changes(), self.base)
+        finally:
+            self.discard()
+
+    def discard(self):
+        for path in self._runs:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        self._runs = []
+        self._pending = {}
+
+
+winner_map = WinnerMap()
@@ -1,12 +1,16 @@
 import json
 import os
 import sys
+import threading
+import time
+
+# Точка отсчета для замера холодного старта (до импорта webview)
+_START_TIME = time.perf_counter()
+
 import webview
-from core.config import ConfigManager
-from core.database import Mod, GameProfile
-from core.hof_tools import HofTools
-from core.importer import ModImporter
-from core.installer import ModInstaller
+
+# ВАЖНО: модули core (SQLAlchemy, анализатор, установщик) импортируются лениво,
+# в фоновом потоке после показа окна — см. Api.background_init
 
 
 # Функция для поиска ресурсов внутри EXE
@@ -36,28 +40,185 @@ class UILogger:
             print(f"Failed to log to UI: {e}")
 
 
+class StartupTimer:
+    """Замеры этапов запуска (мс от старта процесса)."""
+
+    def __init__(self, start_time):
+        self._start = start_time
+        self._lock = threading.Lock()
+        self.marks = {}
+        self.errors = []
+
+    def mark(self, name):
+        with self._lock:
+            if name not in self.marks:
+                self.marks[name] = round((time.perf_counter() - self._start) * 1000, 1)
+
+
 class Api:
     """API, которое доступно из JavaScript."""
 
-    def __init__(self):
-        self.config_manager = ConfigManager()
+    def __init__(self, startup_timer=None):
+        self._config_manager = None
+        self._ready = threading.Event()
+        self._init_error = None
         self._window = None
         self._logger = None
+        self._startup = startup_timer or StartupTimer(time.perf_counter())
 
     def set_window(self, window):
         self._window = window
         self._logger = UILogger(window)
+        window.events.shown += lambda: self._startup.mark("window_shown")
+        window.events.loaded += lambda: self._startup.mark("ui_loaded")
+
+    def background_init(self):
+        """Выполняется в фоне после показа окна: БД, миграции и тяжелые импорты."""
+        try:
+            from core.config import ConfigManager
+            self._config_manager = ConfigManager()
+            self._startup.mark("db_ready")
+            # Необязательные шаги: их ошибка не должна делать недоступным всё API
+            self._optional_init("Восстановление прерванной синхронизации", self._recover_sync)
+            self._optional_init("Снимок победителей", self._open_winner_map)
+        except Exception as e:
+            self._init_error = e
+        finally:
+            self._ready.set()
+
+        try:
+            if self._init_error is None:
+                self._optional_init("Загрузка модулей", self._warm_imports)
+                if self._optional_init("Наблюдение за папками", self._restart_watcher):
+                    self._startup.mark("watcher_started")
+                self._optional_init("Фоновые задачи", self._resume_background)
+        finally:
+            self._record_startup()
+
+    def _warm_imports(self):
+        """Прогрев модулей, чтобы первый клик пользователя не ждал импорта."""
+        import core.importer, core.installer, core.hof_tools
+        self._startup.mark("core_imported")
+
+    def _optional_init(self, title, step):
+        """Шаг запуска, без которого приложение работает: ошибка — в лог и в запись app.startup."""
+        try:
+            step()
+            return True
+        except Exception as e:
+            self._startup.errors.append(f"{title}: {type(e).__name__}: {e}")
+            if self._logger:
+                self._logger.log(f"{title}: {e}", "warning")
+            return False
+
+    def _record_startup(self):
+        """Замеры запуска — отдельной записью в журнал perf (вместе с ошибками необязательных шагов)."""
+        from core.perf import perf
+        with perf.operation("app.startup", marks=dict(self._startup.marks)) as op:
+            if self._startup.errors:
+                op.meta["errors"] = list(self._startup.errors)
+            if self._init_error is not None:
+                op.meta["init_error"] = f"{type(self._init_error).__name__}: {self._init_error}"
+
+    def _recover_sync(self):
+        """Разбор журнала синхронизации, прерванной падением/закрытием (до первых вызовов из UI)."""
+        from core.journal import SyncJournal
+        config_manager = self._config_manager
+        if not (config_manager.game_path and config_manager.library_path):
+            return
+        if SyncJournal(config_manager.library_path).pending() is None:
+            return
+        from core.installer import ModInstaller
+        with ModInstaller(config_manager, self._logger) as installer:
+            installer.recover_interrupted_sync()
+        self._startup.mark("sync_recovered")
+
+    def _open_winner_map(self):
+        """Снимок победителей (core/winner_map.py) отображается в память сразу — поиску и синхронизации."""
+        from core.winner_map import winner_map
+        if self._config_manager.library_path:
+            winner_map.open(self._config_manager.library_path)
+
+    def _restart_watcher(self):
+        """(Пере)запуск наблюдения за Vehicles/maps и библиотекой — после смены путей или настройки."""
+        from core.watcher import watcher
+        config_manager = self._config_manager
+        if config_manager.is_watch_enabled():
+            watcher.start(config_manager.game_path, config_manager.library_path,
+                          allow_polling=config_manager.is_watch_polling_enabled())
+        else:
+            watcher.stop()
+
+    def _resume_background(self):
+        """
+        Фоновая работа, которую прошлый запуск мог не доделать (с низким приоритетом):
+        стирание корзины библиотеки и хеширование бэкапов оригиналов.
+        """
+        from core.backups import hasher
+        from core.trash import Trash, purger
+        library_path = self._config_manager.library_path
+        if not library_path:
+            return
+        if Trash(library_path).pending():
+            purger.start(library_path, self._logger)
+        hasher.start(self._config_manager, self._logger)
+
+    def _cfg(self):
+        """ConfigManager после завершения фоновой инициализации."""
+        self._ready.wait()
+        if self._init_error is not None:
+            raise self._init_error
+        return self._config_manager
 
     def get_config(self):
+        config_manager = self._cfg()
+        self._startup.mark("first_api_call")
+        return {
+            "game_path": config_manager.game_path,
+            "library_path": config_manager.library_path,
+            "language": config_manager._get_setting("language") or "en",  # По умолчанию английский
+            "storage_mode": config_manager.get_storage_mode(),
+            "cache_budget_mb": config_manager.get_cache_budget_bytes() // (1024 * 1024),
+            "watch_enabled": config_manager.is_watch_enabled(),
+            "watch_polling": config_manager.is_watch_polling_enabled()
+        }
+
+    def get_startup_timings(self):
+        return dict(self._startup.marks)
+
+    def get_perf_report(self, limit=50):
+        """Последние замеры операций core (для отчета пользователя о тормозах)."""
+        from core.perf import perf
+        config_manager = self._cfg()
         return {
-            "game_path": self.config_manager.game_path,
-            "library_path": self.config_manager.library_path,
-            "language": self.config_manager._get_setting("language") or "en"  # По умолчанию английский
+            "log_path": perf.log_path,
+            "profiling": config_manager.is_profiling_enabled(),
+            "startup": dict(self._startup.marks),
+            "operations": perf.read_recent(limit),
         }
 
+    def set_profiling(self, enabled):
+        self._cfg().set_profiling(bool(enabled))
+        return {"status": "success", "profiling": bool(enabled)}
+
+    def set_storage_options(self, mode, cache_budget_mb=None):
+        """Режим хранения новых модов: 'extract' (распаковка) или 'archive' (архив + кэш)."""
+        ok, msg = self._cfg().set_storage_options(mode, cache_budget_mb)
+        return {"status": "success" if ok else "error", "message": msg}
+
+    def set_watch_enabled(self, enabled, polling=None):
+        """Наблюдение за папками; polling — разрешить обход по таймеру там, где нет inotify."""
+        config_manager = self._cfg()
+        config_manager.set_watch_enabled(bool(enabled))
+        if polling is not None:
+            config_manager.set_watch_polling(bool(polling))
+        self._restart_watcher()
+        return {"status": "success", "watch_enabled": bool(enabled),
+                "watch_polling": config_manager.is_watch_polling_enabled()}
+
     # --- Новые методы ---
     def set_language(self, lang):
-        self.config_manager._set_setting("language", lang)
+        self._cfg()._set_setting("language", lang)
         return {"status": "success", "lang": lang}
 
     def browse_folder(self):
@@ -66,55 +227,105 @@ class Api:
         return folder[0] if folder else None
 
     def set_game_path(self, path):
-        return self.config_manager.set_game_path(path)
+        result = self._cfg().set_game_path(path)
+        self._restart_watcher()
+        return result
 
     def set_library_path(self, path):
-        return self.config_manager.set_library_path(path)
+        result = self._cfg().set_library_path(path)
+        self._restart_watcher()
+        return result
 
     def get_mods_list(self):
-        session = self.config_manager.session
-        mods = session.query(Mod).order_by(Mod.name).all()
-
-        result = []
-        for m in mods:
-            result.append({
-                "id": m.id,
-                "name": m.name,
-                "type": m.mod_type.value if m.mod_type else "unknown",
-                "is_enabled": m.is_enabled,
-                "date": m.install_date.strftime("%Y-%m-%d"),
-            })
-        return result
+        """Полный список (старый вызов); UI пользуется query_mods / get_mods_changes."""
+        from core.database import Mod
+        from core.mod_list import serialize_mod
+        with self._cfg().read_session() as session:
+            return [serialize_mod(m) for m in session.query(Mod).order_by(Mod.name).all()]
+
+    def query_mods(self, params=None):
+        """Страница списка модов: offset, limit, search, type, sort, descending."""
+        from core.mod_list import ModListQuery
+        params = params or {}
+        with self._cfg().read_session() as session:
+            return ModListQuery(session).page(
+                offset=params.get("offset", 0),
+                limit=params.get("limit", 100),
+                search=params.get("search"),
+                mod_type=params.get("type"),
+                sort=params.get("sort", "name"),
+                descending=bool(params.get("descending")),
+            )
+
+    def get_mods_changes(self, since_revision):
+        from core.mod_list import ModListQuery
+        with self._cfg().read_session() as session:
+            return ModListQuery(session).changes_since(since_revision)
+
+    def search_library(self, query, limit=50):
+        """Какой мод дает файл / HOF: поиск по названиям, путям в игре и описаниям HOF."""
+        from core.search import LibrarySearch
+        with self._cfg().read_session() as session:
+            return LibrarySearch(session).search(query, limit)
 
     def import_mod_step1(self):
         file_types = ('Архивы (*.zip;*.7z;*.rar)', 'Все файлы (*.*)')
         result = self._window.create_file_dialog(webview.OPEN_DIALOG, allow_multiple=False, file_types=file_types)
 
         if result and result[0]:
+            from core.importer import ModImporter
             filepath = result[0]
-            importer = ModImporter(self.config_manager, self._logger)
-            preview_data = importer.step1_prepare_preview(filepath)
-            return preview_data
+            with ModImporter(self._cfg(), self._logger) as importer:
+                return importer.step1_prepare_preview(filepath)
         return None
 
-    def import_mod_step2(self, preview_data):
-        importer = ModImporter(self.config_manager, self._logger)
-        success = importer.step2_confirm_import(preview_data)
-        return success
+    def import_mod_step2(self, temp_id):
+        from core.importer import ModImporter
+        with ModImporter(self._cfg(), self._logger) as importer:
+            return importer.step2_confirm_import(temp_id)
 
-    def cancel_import(self, temp_path):
-        importer = ModImporter(self.config_manager, self._logger)
-        importer.cancel_import(temp_path)
+    def preview_folder(self, temp_id, path="", offset=0):
+        """Раскрытие папки в окне предпросмотра: подпапки со сводкой и страница файлов."""
+        from core.previews import previews
+        return previews.expand(temp_id, path, offset)
 
-    def toggle_mod(self, mod_id):
-        session = self.config_manager.session
-        mod = session.get(Mod, mod_id)
-        if not mod:
-            return {"status": "error", "message": "Mod not found"}
-        current_state = mod.is_enabled
+    def update_mod_step1(self, mod_id):
+        """Выбор архива новой версии мода: раскладка и сводка отличий (что добавится/изменится/удалится)."""
+        file_types = ('Архивы (*.zip;*.7z;*.rar)', 'Все файлы (*.*)')
+        result = self._window.create_file_dialog(webview.OPEN_DIALOG, allow_multiple=False, file_types=file_types)
+
+        if result and result[0]:
+            from core.importer import ModImporter
+            with ModImporter(self._cfg(), self._logger) as importer:
+                return importer.step1_prepare_update(mod_id, result[0])
+        return None
+
+    def update_mod_step2(self, temp_id):
+        from core.importer import ModImporter
+        from core.installer import ModInstaller
+        with ModImporter(self._cfg(), self._logger) as importer:
+            success, msg, summary = importer.confirm_update(temp_id)
+        if success:
+            # Ссылки трогаются только для добавленных/удаленных путей (и копий измененных файлов)
+            with ModInstaller(self._cfg(), self._logger) as installer:
+                success, sync_msg = installer.apply_mod_update(summary["mod_id"], summary.pop("changed_targets"))
+            if not success:
+                msg = sync_msg
+        return {"status": "success" if success else "error", "message": msg, **summary}
+
+    def cancel_import(self, temp_id):
+        from core.importer import ModImporter
+        with ModImporter(self._cfg(), self._logger) as importer:
+            importer.cancel_import(temp_id)
 
-        installer = ModInstaller(self.config_manager, self._logger)
-        success, msg = installer.toggle_mod(mod_id, not current_state)
+    def toggle_mod(self, mod_id):
+        from core.database import Mod
+        from core.installer import ModInstaller
+        with ModInstaller(self._cfg(), self._logger) as installer:
+            mod = installer.session.get(Mod, mod_id)
+            if not mod:
+                return {"status": "error", "message": "Mod not found"}
+            success, msg = installer.toggle_mod(mod_id, not mod.is_enabled)
 
         if success:
             return {"status": "success", "message": msg}
@@ -122,130 +333,59 @@ class Api:
 
     # --- НОВАЯ ФУНКЦИЯ УДАЛЕНИЯ ---
     def delete_mod(self, mod_id):
-        installer = ModInstaller(self.config_manager, self._logger)
-        success, msg = installer.delete_mod_permanently(mod_id)
+        from core.installer import ModInstaller
+        with ModInstaller(self._cfg(), self._logger) as installer:
+            success, msg = installer.delete_mod_permanently(mod_id)
         return {"status": "success" if success else "error", "message": msg}
 
     # -------------------------------
 
-    def get_conflicts(self):
-        session = self.config_manager.session
-        enabled_mods = session.query(Mod).filter_by(is_enabled=True).order_by(Mod.priority).all()
-
-        file_map = {}
-        for mod in enabled_mods:
-            for f in mod.files:
-                path = f.target_game_path
-                if not path: continue
-                path = path.replace("\\", "/").lower()
-                if path.startswith("fonts/"):
-                    continue
-                if path not in file_map:
-                    file_map[path] = []
-                file_map[path].append(mod)
-
-        conflicting_mod_ids = set()
-        for path, mods_list in file_map.items():
-            if len(mods_list) > 1:
-                for m in mods_list:
-                    conflicting_mod_ids.add(m.id)
-
-        result = []
-        for mod in enabled_mods:
-            if mod.id in conflicting_mod_ids:
-                result.append({
-                    "id": mod.id,
-                    "name": mod.name,
-                    "priority": mod.priority
-                })
-        return result
+    def get_trash_status(self):
+        """Фоновое стирание удаленных модов: идет ли, сколько записей осталось, сколько освобождено."""
+        from core.trash import purger
+        config_manager = self._cfg()
+        if not config_manager.library_path:
+            return {"running": False, "pending": 0, "reclaimed_bytes": 0, "error": None}
+        return purger.status(config_manager.library_path)
 
-    def save_load_order(self, ordered_mod_ids):
-        installer = ModInstaller(self.config_manager, self._logger)
-        session = self.config_manager.session
+    def get_conflicts(self):
+        from core.installer import ModInstaller
+        with ModInstaller(self._cfg(), self._logger) as installer:
+            return installer.list_conflicts()
 
-        # Обновляем приоритеты
-        for index, mod_id in enumerate(ordered_mod_ids):
-            mod = session.query(Mod).get(mod_id)
-            if mod:
-                mod.priority = index
+    def get_drift(self):
+        """Установленные файлы, которые пропали или подменены вне менеджера (по данным watcher'а)."""
+        from core.installer import ModInstaller
+        with ModInstaller(self._cfg(), self._logger) as installer:
+            installer.check_drift()
+            return installer.list_drift()
 
-        session.commit()
-        success, msg = installer.sync_state()
+    def save_load_order(self, ordered_mod_ids):
+        from core.installer import ModInstaller
+        # Приоритеты и синхронизация — одна сессия установщика
+        with ModInstaller(self._cfg(), self._logger) as installer:
+            success, msg = installer.update_load_order(ordered_mod_ids)
         return {"status": "success" if success else "error", "message": msg}
 
     def get_hof_data(self):
-        tools = HofTools(self.config_manager, self._logger)
-        return {
-            "library_hofs": tools.get_library_hofs(),
-            "buses": tools.scan_for_buses()
-        }
+        from core.hof_tools import HofTools
+        with HofTools(self._cfg(), self._logger) as tools:
+            return {
+                "library_hofs": tools.get_library_hofs(),
+                "buses": tools.scan_for_buses()
+            }
 
     def scan_game_hofs(self):
-        tools = HofTools(self.config_manager, self._logger)
-        return tools.scan_existing_game_hofs()
+        from core.hof_tools import HofTools
+        with HofTools(self._cfg(), self._logger) as tools:
+            return tools.scan_existing_game_hofs()
 
     def import_game_hofs(self, hof_list):
-        tools = HofTools(self.config_manager, self._logger)
-        count = tools.import_game_hofs(hof_list)
+        from core.hof_tools import HofTools
+        with HofTools(self._cfg(), self._logger) as tools:
+            count = tools.import_game_hofs(hof_list)
         return {"status": "success", "message": f"Импортировано {count} файлов."}
 
-    def _save_current_profile(self):
-        """Сохраняет текущее состояние модов в профиль текущей папки"""
-        current_path = self.config_manager.game_path
-        if not current_path: return
-
-        session = self.config_manager.session
-        mods = session.query(Mod).all()
-
-        # Собираем словарь {id: {enabled, prio}}
-        state_data = {}
-        for m in mods:
-            if m.is_enabled or m.priority > 0:
-                state_data[m.id] = {
-                    "e": m.is_enabled,
-                    "p": m.priority
-                }
-
-        json_str = json.dumps(state_data)
-
-        # Записываем в БД
-        profile = session.query(GameProfile).get(current_path)
-        if not profile:
-            profile = GameProfile(game_path=current_path)
-            session.add(profile)
-
-        profile.mods_state_json = json_str
-        session.commit()
-
-    def _load_profile(self, new_path):
-        """Загружает состояние модов для новой папки"""
-        session = self.config_manager.session
-        profile = session.query(GameProfile).get(new_path)
-
-        mods = session.query(Mod).all()
-
-        if not profile:
-            # Если профиля нет (новая папка), выключаем все моды
-            for m in mods:
-                m.is_enabled = False
-                m.priority = 0
-        else:
-            # Если профиль есть, восстанавливаем
-            state_data = json.loads(profile.mods_state_json)
-            for m in mods:
-                # Ключи в JSON это строки, приводим к int
-                m_id_str = str(m.id)
-                if m_id_str in state_data:
-                    data = state_data[m_id_str]
-                    m.is_enabled = data["e"]
-                    m.priority = data["p"]
-                else:
-                    m.is_enabled = False
-                    m.priority = 0
-
-        session.commit()
-
     def switch_game_folder(self):
         """Вызывается из UI по кнопке смены папки"""
         if not self._window: return
@@ -259,17 +399,16 @@ class Api:
         if not os.path.exists(os.path.join(new_path, "Omsi.exe")):
             return {"status": "error", "message": "В этой папке нет Omsi.exe!"}
 
-        if new_path == self.config_manager.game_path:
+        if new_path == self._cfg().game_path:
             return {"status": "cancel"}
 
-        # 2. Сохраняем состояние старой папки
-        self._save_current_profile()
-
-        # 3. Меняем путь в конфиге
-        self.config_manager.set_game_path(new_path)
-
-        # 4. Загружаем состояние новой папки
-        self._load_profile(new_path)
+        # 2. Сохраняем состояние старой папки, меняем путь и загружаем состояние новой
+        from core.profiles import ProfileManager
+        with ProfileManager(self._cfg()) as profiles:
+            success, msg = profiles.switch(new_path)
+        if not success:
+            return {"status": "error", "message": msg}
+        self._restart_watcher()
 
         return {
             "status": "success",
@@ -277,20 +416,44 @@ class Api:
             "message": "Папка игры изменена. Список модов обновлен."
         }
 
+    def export_setup(self):
+        """Снимок настройки (порядок модов, план ссылок, HOF) в файл — для других машин/папок игры."""
+        result = self._window.create_file_dialog(webview.SAVE_DIALOG, save_filename="setup.omsisetup")
+        if not result:
+            return {"status": "cancel"}
+        path = result if isinstance(result, str) else result[0]
+        from core.setup_snapshot import SetupSnapshot
+        with SetupSnapshot(self._cfg(), self._logger) as snapshot:
+            success, msg, summary = snapshot.export(path)
+        return {"status": "success" if success else "error", "message": msg, **summary}
+
+    def apply_setup(self):
+        """Применяет снимок настройки к текущей папке игры."""
+        file_types = ('Снимок настройки (*.omsisetup)', 'Все файлы (*.*)')
+        result = self._window.create_file_dialog(webview.OPEN_DIALOG, allow_multiple=False, file_types=file_types)
+        if not result or not result[0]:
+            return {"status": "cancel"}
+        from core.setup_snapshot import SetupSnapshot
+        with SetupSnapshot(self._cfg(), self._logger) as snapshot:
+            success, msg, summary = snapshot.apply(result[0])
+        return {"status": "success" if success else "error", "message": msg, **summary}
+
     def install_hofs(self, hof_ids, bus_names):
-        tools = HofTools(self.config_manager, self._logger)
-        success, msg = tools.install_hofs_to_buses(hof_ids, bus_names)
+        from core.hof_tools import HofTools
+        with HofTools(self._cfg(), self._logger) as tools:
+            success, msg = tools.install_hofs_to_buses(hof_ids, bus_names)
         return {"status": "success" if success else "warning", "message": msg}
 
     # НОВЫЙ МЕТОД
     def uninstall_all_hofs(self):
-        tools = HofTools(self.config_manager, self._logger)
-        success, msg = tools.uninstall_all_hofs()
+        from core.hof_tools import HofTools
+        with HofTools(self._cfg(), self._logger) as tools:
+            success, msg = tools.uninstall_all_hofs()
         return {"status": "success", "message": msg}
 
 
 if __name__ == '__main__':
-    api = Api()
+    api = Api(StartupTimer(_START_TIME))
 
     ui_path = resource_path(os.path.join('ui', 'index.html'))
 
@@ -304,4 +467,6 @@ if __name__ == '__main__':
         background_color='#111827'
     )
     api.set_window(window)
-    webview.start(debug=False)
+    # background_init запускается pywebview в отдельном потоке уже после старта GUI,
+    # поэтому окно появляется до загрузки БД и модулей core
+    webview.start(api.background_init, debug=False)
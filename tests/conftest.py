@@ -0,0 +1,106 @@
+"""
+Общие фикстуры: папка игры, библиотека и БД во временной папке теста.
+
+Моды создаются прямо в БД и в Library/Mods (без импорта архивов): тесты проверяют
+синхронизацию, а не распаковку.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import installer as installer_module  # noqa: E402
+from core.backups import hasher  # noqa: E402
+from core.config import ConfigManager  # noqa: E402
+from core.database import Mod, ModFile, ModType  # noqa: E402
+from core.installer import ModInstaller  # noqa: E402
+
+
+class ListLogger:
+    """Логгер с интерфейсом UILogger: все сообщения копятся в списке."""
+
+    def __init__(self):
+        self.messages = []
+
+    def log(self, message, level="info", progress=None):
+        if level != "progress":
+            self.messages.append((level, str(message)))
+
+    def problems(self):
+        return [message for level, message in self.messages if level == "error"]
+
+
+class Library:
+    """Конфигурация теста и помощники для модов и состояния папки игры."""
+
+    def __init__(self, root):
+        self.game = root / "game"
+        self.game.mkdir()
+        (self.game / "Omsi.exe").write_bytes(b"MZ")
+        self.library = root / "library"
+        self.library.mkdir()
+        self.config = ConfigManager(app_data_dir=str(root / "appdata"))
+        ok, msg = self.config.set_game_path(str(self.game))
+        assert ok, msg
+        self.config.set_library_path(str(self.library))
+        self.logger = ListLogger()
+
+    def originals(self, files):
+        """Файлы игры до установки модов: {путь: содержимое}."""
+        for rel, data in files.items():
+            path = self.game / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+    def add_mod(self, name, files, priority=0, enabled=True):
+        """Мод в библиотеке: {путь в игре: содержимое}. Возвращает id."""
+        storage = self.library / "Mods" / name
+        with self.config.session_scope() as session:
+            mod = Mod(name=name, mod_type=ModType.BUS, storage_path=str(storage),
+                      is_enabled=enabled, priority=priority)
+            session.add(mod)
+            session.flush()
+            for rel, data in files.items():
+                path = storage / rel
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(data)
+                session.add(ModFile(mod_id=mod.id, source_rel_path=rel, target_game_path=rel))
+            return mod.id
+
+    def set_mods(self, **states):
+        """Приоритет и включение модов по имени: name=(priority, enabled)."""
+        with self.config.session_scope() as session:
+            for mod in session.query(Mod):
+                if mod.name in states:
+                    mod.priority, mod.is_enabled = states[mod.name]
+
+    def sync(self):
+        with ModInstaller(self.config, self.logger) as installer:
+            result = installer.sync_state()
+        hasher.wait()
+        return result
+
+    def game_state(self):
+        """{путь относительно игры: содержимое} — всё, что видит игра (ссылки разыменованы)."""
+        state = {}
+        for path in sorted(self.game.rglob("*")):
+            if path.name == "Omsi.exe" or path.is_dir():
+                continue
+            rel = path.relative_to(self.game).as_posix()
+            state[rel] = path.read_bytes() if path.exists() else None  # None — висячая ссылка
+        return state
+
+
+@pytest.fixture
+def lib(tmp_path):
+    library = Library(tmp_path)
+    yield library
+    hasher.wait()
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """Пачки синхронизации по 4 операции: сбой можно устроить во второй пачке."""
+    monkeypatch.setattr(installer_module, "SYNC_BATCH_SIZE", 4)
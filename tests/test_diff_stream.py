@@ -0,0 +1,134 @@
+"""
+Потоковое слияние желаемого и установленного (ModInstaller._diff_stream / _desired_stream /
+_installed_stream / _batches). Страницы уменьшены до нескольких строк, чтобы дубли ключей
+и варианты регистра попадали на границы страниц.
+"""
+import random
+
+import pytest
+
+from core import installer as installer_module
+from core.database import InstalledFile, Mod, ModFile, ModType, path_key
+from core.installer import ModInstaller
+from core.setup_snapshot import PlanRow
+
+PAGE_SIZES = [1, 2, 3, 7]
+
+
+def diff(lib, desired=None):
+    """Операции в сравнимом виде: ("install", ключ, мод), ("remove", id), ("retarget", id, мод)."""
+    with ModInstaller(lib.config, lib.logger) as installer:
+        ops = []
+        for kind, item in installer._diff_stream(str(lib.game), desired=desired):
+            if kind == "install":
+                ops.append(("install", path_key(item[0]), item[2]))
+            elif kind == "remove":
+                ops.append(("remove", item.id))
+            else:
+                ops.append(("retarget", item[0].id, item[1][2]))
+        return ops
+
+
+def reference(desired, installed):
+    """
+    То же самое без потоков: для каждого ключа победитель против первой (по id) записи;
+    записи-дубли того же ключа при совпадении не трогаются, без победителя — снимаются все.
+    """
+    by_key = {}
+    for row in installed:
+        by_key.setdefault(row["key"], []).append(row)
+    ops = []
+    for key in sorted(set(desired) | set(by_key)):
+        want, have = desired.get(key), sorted(by_key.get(key, []), key=lambda r: r["id"])
+        if want is None:
+            ops.extend(("remove", row["id"]) for row in have)
+        elif not have:
+            ops.append(("install", key, want))
+        elif have[0]["mod"] != want or have[0]["drift"] == "missing":
+            ops.append(("retarget", have[0]["id"], want))
+    return ops
+
+
+def add_installed(lib, rows):
+    with lib.config.session_scope() as session:
+        objects = [InstalledFile(game_path=path, root_path=str(lib.game), active_mod_id=mod_id, drift=drift)
+                   for path, mod_id, drift in rows]
+        session.add_all(objects)
+        session.flush()
+        return [obj.id for obj in objects]
+
+
+def add_mod_rows(lib, name, priority, paths):
+    """Мод только в БД (файлы на диске для diff не нужны)."""
+    with lib.config.session_scope() as session:
+        mod = Mod(name=name, mod_type=ModType.BUS, storage_path=str(lib.library / name),
+                  is_enabled=True, priority=priority)
+        session.add(mod)
+        session.flush()
+        session.add_all(ModFile(mod_id=mod.id, source_rel_path=path, target_game_path=path) for path in paths)
+        return mod.id
+
+
+@pytest.mark.parametrize("page_size", PAGE_SIZES)
+def test_desired_stream_picks_one_winner_per_case_variant(lib, monkeypatch, page_size):
+    monkeypatch.setattr(installer_module, "SYNC_PAGE_SIZE", page_size)
+    low = add_mod_rows(lib, "low", 0, [f"Vehicles/Bus/File_{i}.cfg" for i in range(6)])
+    high = add_mod_rows(lib, "high", 5, [f"vehicles/bus/FILE_{i}.CFG" for i in range(0, 6, 2)])
+    mid = add_mod_rows(lib, "mid", 2, ["VEHICLES/Bus/file_1.cfg", "Vehicles/Bus/file_2.cfg"])
+
+    with ModInstaller(lib.config, lib.logger) as installer:
+        rows = list(installer._desired_stream())
+
+    keys = [row.target_key for row in rows]
+    assert keys == sorted(set(keys)) == [f"vehicles/bus/file_{i}.cfg" for i in range(6)]
+    winners = {row.target_key: row.mod_id for row in rows}
+    assert winners == {f"vehicles/bus/file_{i}.cfg": high if i % 2 == 0 else (mid if i == 1 else low)
+                       for i in range(6)}
+
+
+@pytest.mark.parametrize("page_size", PAGE_SIZES)
+def test_installed_duplicates_across_page_boundary(lib, monkeypatch, page_size):
+    monkeypatch.setattr(installer_module, "SYNC_PAGE_SIZE", page_size)
+    mod = add_mod_rows(lib, "A", 0, ["Vehicles/Bus/a.cfg", "Vehicles/Bus/b.cfg", "Vehicles/Bus/d.cfg"])
+    # Две записи одного пути в разном регистре (старые данные с ФС с учетом регистра)
+    ids = add_installed(lib, [
+        ("Vehicles/Bus/a.cfg", mod, None),
+        ("vehicles/bus/A.cfg", mod, None),
+        ("Vehicles/Bus/b.cfg", mod, None),
+        ("Vehicles/Bus/c.cfg", mod, None),
+        ("VEHICLES/bus/C.CFG", mod, None),
+        ("Vehicles/Bus/d.cfg", mod, "missing"),
+    ])
+
+    # a: совпадает — дубль не трогается; c: победителя нет — сняты обе записи; d: пропала — перенаправление
+    assert diff(lib) == [("remove", ids[3]), ("remove", ids[4]), ("retarget", ids[5], mod)]
+
+
+@pytest.mark.parametrize("page_size", PAGE_SIZES + [installer_module.SYNC_PAGE_SIZE])
+def test_diff_stream_matches_reference(lib, monkeypatch, page_size):
+    monkeypatch.setattr(installer_module, "SYNC_PAGE_SIZE", page_size)
+    rng = random.Random(page_size)
+    mods = [add_mod_rows(lib, f"m{i}", 0, []) for i in range(3)]
+    paths = [f"Vehicles/Bus_{i % 4}/part_{i}.cfg" for i in range(40)]
+
+    installed_rows = []
+    for path in rng.sample(paths, 25):
+        variants = [path, path.upper()] if rng.random() < 0.2 else [path]
+        for variant in variants:
+            installed_rows.append((variant, rng.choice(mods), "missing" if rng.random() < 0.1 else None))
+    rng.shuffle(installed_rows)
+    ids = add_installed(lib, installed_rows)
+    installed = [{"id": row_id, "key": path_key(path), "mod": mod_id, "drift": drift}
+                 for row_id, (path, mod_id, drift) in zip(ids, installed_rows)]
+
+    desired = {path_key(path): rng.choice(mods) for path in rng.sample(paths, 25)}
+    plan = [PlanRow(key, key, key, mod_id, 0) for key, mod_id in sorted(desired.items())]
+
+    assert diff(lib, desired=plan) == reference(desired, installed)
+
+
+def test_batches_keep_order_and_size():
+    items = iter(range(11))
+    batches = list(ModInstaller._batches(items, size=4))
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10]]
+    assert list(ModInstaller._batches(iter([]), size=4)) == []
@@ -0,0 +1,144 @@
+"""
+Миграции (core/migrations.py): старая БД первых версий (без schema_version) и новая БД
+должны прийти к одной и той же схеме, данные старой — сохраниться и дополниться.
+"""
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from core.database import InstalledFile, Mod, ModFile, init_db
+from core.migrations import SCHEMA_VERSION
+from core.search import LibrarySearch
+
+# Схема первых версий менеджера: до приоритетов, мульти-профилей и HOF с бэкапами
+BASELINE_SCHEMA = """
+CREATE TABLE game_profiles (game_path VARCHAR NOT NULL PRIMARY KEY, mods_state_json TEXT);
+CREATE TABLE mods (
+    id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL, mod_type VARCHAR(8),
+    storage_path VARCHAR NOT NULL UNIQUE, is_enabled BOOLEAN, install_date DATETIME
+);
+CREATE TABLE mod_files (
+    id INTEGER NOT NULL PRIMARY KEY, mod_id INTEGER REFERENCES mods (id),
+    source_rel_path VARCHAR NOT NULL, target_game_path VARCHAR, is_hof BOOLEAN, file_hash VARCHAR
+);
+CREATE TABLE hof_files (
+    id INTEGER NOT NULL PRIMARY KEY, mod_id INTEGER REFERENCES mods (id),
+    filename VARCHAR NOT NULL, full_source_path VARCHAR NOT NULL, description VARCHAR
+);
+CREATE TABLE hof_installs (
+    id INTEGER NOT NULL PRIMARY KEY, hof_file_id INTEGER REFERENCES hof_files (id),
+    bus_folder_name VARCHAR NOT NULL, install_date DATETIME
+);
+CREATE TABLE game_file_state (
+    id INTEGER NOT NULL PRIMARY KEY, game_path VARCHAR NOT NULL, active_mod_id INTEGER REFERENCES mods (id),
+    backup_path VARCHAR, original_hash VARCHAR
+);
+CREATE TABLE settings ("key" VARCHAR NOT NULL PRIMARY KEY, value VARCHAR);
+
+INSERT INTO settings VALUES ('game_path', '/games/omsi');
+INSERT INTO mods VALUES (1, 'Citaro Repaint', 'REPAINT', '/lib/Mods/citaro', 1, '2024-01-01 00:00:00');
+INSERT INTO mod_files VALUES (1, 1, 'Vehicles/Citaro/Texture/Front.dds', 'Vehicles/Citaro/Texture/Front.dds', 0, 'h1');
+INSERT INTO mod_files VALUES (2, 1, 'route.hof', NULL, 1, 'h2');
+INSERT INTO hof_files VALUES (1, 1, 'Berlin.hof', '/lib/Mods/citaro/route.hof', 'Berlin routes');
+INSERT INTO hof_installs VALUES (1, 1, 'Citaro', '2024-01-01 00:00:00');
+INSERT INTO game_file_state VALUES (1, 'Vehicles\\Citaro\\Texture\\Front.dds', 1, NULL, NULL);
+"""
+
+
+def schema(db_path):
+    """{таблица: колонки}, имена индексов и триггеров (без автоиндексов SQLite)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'library_fts%'"
+            " AND name NOT LIKE 'sqlite_%'")]
+        columns = {table: {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')} for table in tables}
+        indexes = {name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex%'")}
+        triggers = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        return columns, indexes, triggers
+    finally:
+        conn.close()
+
+
+def has_fts(session):
+    return session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'library_fts'")).first() is not None
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    path = tmp_path / "baseline.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+    return path
+
+
+def schema_version(session):
+    return int(session.execute(text("SELECT value FROM settings WHERE key = 'schema_version'")).scalar())
+
+
+def test_baseline_db_migrates_to_fresh_schema(tmp_path, baseline_db):
+    fresh_db = tmp_path / "fresh.db"
+    init_db(str(fresh_db))
+    init_db(str(baseline_db))
+
+    fresh_columns, fresh_indexes, fresh_triggers = schema(fresh_db)
+    columns, indexes, triggers = schema(baseline_db)
+    assert columns == fresh_columns
+    assert fresh_indexes <= indexes
+    assert triggers == fresh_triggers
+
+
+def test_baseline_data_is_kept_and_filled(baseline_db):
+    Session = init_db(str(baseline_db))
+    with Session() as session:
+        assert schema_version(session) == SCHEMA_VERSION
+
+        mod = session.get(Mod, 1)
+        assert (mod.name, mod.priority, mod.is_materialized) == ("Citaro Repaint", 0, True)
+
+        # Ключи путей заполнены из старых путей (разделители и регистр нормализованы)
+        assert session.get(ModFile, 1).target_key == "vehicles/citaro/texture/front.dds"
+        record = session.get(InstalledFile, 1)
+        assert record.path_key == "vehicles/citaro/texture/front.dds"
+        assert record.root_path == "/games/omsi"
+        assert record.drift is None and record.link_kind is None
+
+        hof_install = session.execute(text("SELECT game_rel_path, backup_path FROM hof_installs")).one()
+        assert tuple(hof_install) == ("legacy", None)
+
+        if has_fts(session):
+            results = LibrarySearch(session).search("front.dds")["results"]
+            assert [(r["kind"], r["mod_id"]) for r in results] == [("file", 1)]
+            assert any(r["kind"] == "hof" for r in LibrarySearch(session).search("berlin")["results"])
+
+
+def test_migrations_run_once(baseline_db):
+    init_db(str(baseline_db))
+    before = schema(baseline_db)
+    Session = init_db(str(baseline_db))
+    assert schema(baseline_db) == before
+    with Session() as session:
+        assert schema_version(session) == SCHEMA_VERSION
+        assert session.query(ModFile).count() == 2
+
+
+def test_fresh_db_is_at_latest_version_and_searchable(tmp_path):
+    Session = init_db(str(tmp_path / "fresh.db"))
+    with Session() as session:
+        assert schema_version(session) == SCHEMA_VERSION
+        mod = Mod(name="Fresh", storage_path="/lib/Mods/fresh")
+        session.add(mod)
+        session.flush()
+        session.add(ModFile(mod_id=mod.id, source_rel_path="a.cfg", target_game_path="Vehicles/Fresh/Model.cfg"))
+        session.commit()
+        if has_fts(session):
+            assert [r["kind"] for r in LibrarySearch(session).search("model.cfg")["results"]] == ["file"]
+
+            # Смена пути файла (обновление мода) — поиск находит новый путь, а не старый
+            session.query(ModFile).one().target_game_path = "Vehicles/Fresh/Renamed.cfg"
+            session.commit()
+            assert LibrarySearch(session).search("model.cfg")["results"] == []
+            assert [r["kind"] for r in LibrarySearch(session).search("renamed")["results"]] == ["file"]
@@ -0,0 +1,85 @@
+"""CaseResolver (core/pathcase.py): написание путей по диску, кэш листингов, added / removed."""
+import os
+import shutil
+
+import pytest
+
+from core.pathcase import CaseResolver, is_case_sensitive
+
+
+@pytest.fixture
+def game(tmp_path):
+    root = tmp_path / "game"
+    (root / "Vehicles" / "MAN_SD202" / "Model").mkdir(parents=True)
+    (root / "Vehicles" / "MAN_SD202" / "Model" / "model.cfg").write_text("x")
+    (root / "Maps").mkdir()
+    if not is_case_sensitive(root):
+        pytest.skip("ФС без учета регистра: сопоставлять нечего")
+    return root
+
+
+def test_resolve_uses_case_on_disk(game):
+    paths = CaseResolver(game)
+    assert paths.enabled
+    bus = os.path.join("Vehicles", "MAN_SD202")
+    assert paths.resolve("vehicles/man_sd202/MODEL/Model.CFG") == os.path.join(bus, "Model", "model.cfg")
+    assert paths.resolve("VEHICLES\\man_sd202\\texture\\New.dds") == os.path.join(bus, "texture", "New.dds")
+    # Ниже несуществующей папки имена остаются как в запросе
+    assert paths.resolve("maps/NewMap/Tiles/a.map") == os.path.join("Maps", "NewMap", "Tiles", "a.map")
+
+
+def test_added_updates_cached_listings(game):
+    paths = CaseResolver(game)
+    assert paths.resolve("sceneryobjects/tree.sco") == os.path.join("sceneryobjects", "tree.sco")
+
+    # Папку создала синхронизация в своем написании: листинг корня уже в кэше и без added устарел бы
+    (game / "Sceneryobjects").mkdir()
+    (game / "Sceneryobjects" / "tree.sco").write_text("x")
+    assert paths.resolve("sceneryobjects/tree.sco") == os.path.join("sceneryobjects", "tree.sco")
+    paths.added(game / "Sceneryobjects" / "tree.sco")
+    assert paths.resolve("SCENERYOBJECTS/TREE.SCO") == os.path.join("Sceneryobjects", "tree.sco")
+    assert not paths.is_empty(game / "Sceneryobjects")
+
+    # Путь вне корня игры игнорируется
+    paths.added(game.parent / "elsewhere" / "x")
+
+
+def test_added_keeps_existing_spelling(game):
+    paths = CaseResolver(game)
+    paths.resolve("vehicles/x")
+    paths.added(game / "VEHICLES" / "x")
+    assert paths.resolve("vehicles/x") == os.path.join("Vehicles", "x")
+
+
+def test_removed_and_is_empty(game):
+    paths = CaseResolver(game)
+    model = game / "Vehicles" / "MAN_SD202" / "Model"
+    assert not paths.is_empty(model)
+
+    (model / "model.cfg").unlink()
+    paths.removed(model / "model.cfg")
+    assert paths.is_empty(model)
+
+    model.rmdir()
+    paths.removed(model)
+    assert paths.resolve("vehicles/man_sd202/MODEL/a.cfg") == os.path.join("Vehicles", "MAN_SD202", "MODEL", "a.cfg")
+    # Несуществующая папка не «пуста»: удалять нечего
+    assert not paths.is_empty(model)
+
+
+def test_removed_tree_forgets_nested_listings(game):
+    paths = CaseResolver(game)
+    paths.resolve("vehicles/man_sd202/model/model.cfg")
+    bus = game / "Vehicles" / "MAN_SD202"
+    shutil.rmtree(bus)
+    paths.removed(bus, tree=True)
+    expected = os.path.join("Vehicles", "man_sd202", "model", "model.cfg")
+    assert paths.resolve("vehicles/man_sd202/model/model.cfg") == expected
+    assert not paths.is_empty(bus / "Model")
+
+
+def test_disabled_resolver_returns_path_unchanged(game):
+    paths = CaseResolver(game)
+    paths.enabled = False  # Как на Windows: ФС сама не различает регистр
+    assert paths.resolve("vehicles/man_sd202/model.cfg") == "vehicles/man_sd202/model.cfg"
+    assert paths.is_empty(game / "Maps")
@@ -0,0 +1,190 @@
+"""
+Восстановление после сбоя посреди синхронизации (core/journal.py, ModInstaller.recover_interrupted_sync).
+
+Сбой моделируется исключением BaseException из place() / _remove_installed_file: обработчики
+ошибок синхронизации его не ловят, пачка не коммитится, журнал остается с незавершенным
+хвостом — как после падения процесса. Пачки по 4 операции, сбой — во второй пачке.
+"""
+from pathlib import Path
+
+import pytest
+
+from core import installer as installer_module
+from core.database import InstalledFile, Mod
+from core.installer import ModInstaller
+from core.journal import SyncJournal
+from core.linking import LINK_COPY, LINK_SYMLINK, place
+
+FILES = [f"Vehicles/Bus/file_{i}.cfg" for i in range(10)]
+# Оригиналы игры есть только у первой половины путей
+ORIGINALS = {rel: f"orig {i}".encode() for i, rel in enumerate(FILES[:5])}
+
+
+class Crash(BaseException):
+    """Падение процесса посреди пачки."""
+
+
+def mod_files(name):
+    return {rel: f"{name} {i}".encode() for i, rel in enumerate(FILES)}
+
+
+def crash_place_at(monkeypatch, call_number):
+    """place() падает на call_number-м вызове; обычный файл к этому моменту записан не до конца."""
+    calls = {"n": 0}
+
+    def crashing_place(source, target, kinds, before_regular=None):
+        calls["n"] += 1
+        if calls["n"] == call_number:
+            if kinds[0] != LINK_SYMLINK:
+                if before_regular is not None:
+                    before_regular()
+                Path(target).write_bytes(b"partial")
+            raise Crash()
+        return place(source, target, kinds, before_regular)
+
+    monkeypatch.setattr(installer_module, "place", crashing_place)
+
+
+def use_link_kind(monkeypatch, kind):
+    kinds = [LINK_SYMLINK, LINK_COPY] if kind == LINK_SYMLINK else [LINK_COPY]
+    monkeypatch.setattr(installer_module, "probe", lambda game_root, library_path: kinds)
+
+
+def crashed_sync(lib):
+    with pytest.raises(Crash):
+        with ModInstaller(lib.config, lib.logger) as installer:
+            installer.sync_state()
+    assert SyncJournal(lib.config.library_path).pending() is not None
+
+
+def recover(lib):
+    with ModInstaller(lib.config, lib.logger) as installer:
+        processed = installer.recover_interrupted_sync()
+    assert SyncJournal(lib.config.library_path).pending() is None
+    assert lib.logger.problems() == []
+    return processed
+
+
+def installed(lib):
+    """{путь: имя активного мода} по записям InstalledFile."""
+    with lib.config.read_session() as session:
+        names = dict(session.query(Mod.id, Mod.name))
+        return {row.game_path.replace("\\", "/"): names[row.active_mod_id] for row in session.query(InstalledFile)}
+
+
+def assert_records_match_disk(lib):
+    """Каждая запись InstalledFile — ровно то, что лежит в игре; лишних файлов в игре нет."""
+    state = lib.game_state()
+    records = installed(lib)
+    for rel, mod_name in records.items():
+        assert state[rel] == mod_files(mod_name)[rel], rel
+    for rel, data in state.items():
+        if rel not in records:
+            assert data == ORIGINALS[rel], rel
+
+
+@pytest.mark.parametrize("kind", [LINK_SYMLINK, LINK_COPY])
+def test_install_crash_rolls_back_uncommitted_batch(lib, small_batches, monkeypatch, kind):
+    use_link_kind(monkeypatch, kind)
+    lib.originals(ORIGINALS)
+    lib.add_mod("A", mod_files("A"))
+
+    # Первая пачка (file_0..3) закоммичена, во второй file_4 уже поставлен, file_5 — недописан
+    crash_place_at(monkeypatch, 6)
+    crashed_sync(lib)
+    monkeypatch.setattr(installer_module, "place", place)
+
+    assert recover(lib) == 4
+    assert installed(lib) == {rel: "A" for rel in FILES[:4]}
+    expected = {rel: mod_files("A")[rel] for rel in FILES[:4]}
+    expected[FILES[4]] = ORIGINALS[FILES[4]]
+    assert lib.game_state() == expected
+
+    assert lib.sync() == (True, "Успешно")
+    assert lib.game_state() == mod_files("A")
+    lib.set_mods(A=(0, False))
+    lib.sync()
+    assert lib.game_state() == ORIGINALS
+
+
+def test_remove_crash_completes_removal(lib, small_batches, monkeypatch):
+    lib.originals(ORIGINALS)
+    lib.add_mod("A", mod_files("A"))
+    lib.sync()
+    lib.set_mods(A=(0, False))
+
+    # Во второй пачке file_4 и file_5 уже сняты, file_6 удален с диска, но запись не тронута
+    real_remove = ModInstaller._remove_installed_file
+    calls = {"n": 0}
+
+    def crashing_remove(self, record):
+        calls["n"] += 1
+        if calls["n"] == 7:
+            self._target(record.game_path).unlink()
+            raise Crash()
+        return real_remove(self, record)
+
+    monkeypatch.setattr(ModInstaller, "_remove_installed_file", crashing_remove)
+    crashed_sync(lib)
+    monkeypatch.setattr(ModInstaller, "_remove_installed_file", real_remove)
+
+    # Разбирается только незавершенная пачка; третья не начиналась — ее снимет следующая синхронизация
+    assert recover(lib) == 4
+    assert installed(lib) == {rel: "A" for rel in FILES[8:]}
+    assert_records_match_disk(lib)
+    assert lib.sync() == (True, "Успешно")
+    assert installed(lib) == {}
+    assert lib.game_state() == ORIGINALS
+
+
+@pytest.mark.parametrize("kind", [LINK_SYMLINK, LINK_COPY])
+def test_retarget_crash_keeps_records_consistent(lib, small_batches, monkeypatch, kind):
+    use_link_kind(monkeypatch, kind)
+    lib.originals(ORIGINALS)
+    lib.add_mod("A", mod_files("A"), priority=1)
+    lib.add_mod("B", mod_files("B"), priority=0)
+    lib.sync()
+    assert set(installed(lib).values()) == {"A"}
+
+    # Победитель меняется на B: во второй пачке file_4 подменен, у file_5 осталась временная ссылка
+    lib.set_mods(A=(0, True), B=(1, True))
+    crash_place_at(monkeypatch, 6)
+    crashed_sync(lib)
+    monkeypatch.setattr(installer_module, "place", place)
+
+    recover(lib)
+    assert not any(".omsi_tmp" in rel for rel in lib.game_state())
+    assert installed(lib) == {rel: "B" if i < 5 else "A" for i, rel in enumerate(FILES)}
+    assert_records_match_disk(lib)
+
+    assert lib.sync() == (True, "Успешно")
+    assert lib.game_state() == mod_files("B")
+    lib.set_mods(A=(0, False), B=(1, False))
+    lib.sync()
+    assert lib.game_state() == ORIGINALS
+
+
+def test_journal_pending_keeps_only_tail_after_checkpoint(tmp_path):
+    journal = SyncJournal(tmp_path)
+    journal.begin("/game")
+    journal.plan("install", [{"path": "a"}])
+    journal.backup("a", "/bk/a", None)
+    journal.checkpoint()
+    journal.plan("remove", [{"id": 1, "path": "b"}])
+    journal.copy("b")
+    journal._fh.write('{"op": "plan", "kind": "ins')  # Оборванная запись при падении
+    journal._fh.close()
+
+    root, batches, backups, copies = SyncJournal(tmp_path).pending()
+    assert root == "/game"
+    assert batches == [("remove", [{"id": 1, "path": "b"}])]
+    assert backups == {}
+    assert copies == {"b"}
+
+
+def test_journal_end_clears_pending(tmp_path):
+    journal = SyncJournal(tmp_path)
+    journal.begin("/game")
+    journal.plan("install", [{"path": "a"}])
+    journal.end()
+    assert SyncJournal(tmp_path).pending() is None
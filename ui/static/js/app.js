@@ -139,13 +139,80 @@ document.getElementById('btn-save-settings').onclick = async () => {
 // 2. Главный экран (Main)
 document.getElementById('btn-refresh').onclick = loadMods;
 
+// Список модов грузится страницами; фильтры и сортировка — на стороне Python (SQL)
+const MOD_PAGE_SIZE = 100;
+const modList = {
+    params: {search: '', type: '', sort: 'name', descending: false},
+    ids: new Set(),
+    total: 0,
+    revision: 0,
+    loading: false,
+};
+
 async function loadMods() {
-    View.setLoading(true); // Можно убрать, если запрос быстрый
-    const mods = await pywebview.api.get_mods_list();
-    View.renderModList(mods);
-    View.setLoading(false);
+    modList.ids.clear();
+    modList.total = 0;
+    await loadModsPage(false);
+}
+
+async function loadModsPage(append) {
+    if (modList.loading) return;
+    modList.loading = true;
+    try {
+        const page = await pywebview.api.query_mods({
+            ...modList.params,
+            offset: append ? modList.ids.size : 0,
+            limit: MOD_PAGE_SIZE,
+        });
+        page.items.forEach(mod => modList.ids.add(mod.id));
+        modList.total = page.total;
+        modList.revision = page.revision;
+        View.renderModList(page.items, page.total, append);
+    } finally {
+        modList.loading = false;
+    }
+}
+
+// После изменений запрашиваем только дельту с прошлой ревизии
+async function refreshModChanges() {
+    const delta = await pywebview.api.get_mods_changes(modList.revision);
+    delta.deleted.forEach(modId => {
+        if (modList.ids.delete(modId)) modList.total--;
+        View.removeModRow(modId);
+    });
+
+    // Новый мод (импорт) должен встать на свое место в сортировке — проще перечитать первую страницу
+    if (delta.changed.some(mod => !modList.ids.has(mod.id))) {
+        await loadMods();
+        return;
+    }
+    delta.changed.forEach(View.updateModRow);
+    modList.revision = delta.revision;
+    if (modList.total === 0) View.renderModList([], 0);
 }
 
+// Подгрузка следующей страницы при прокрутке к концу списка
+document.getElementById('mod-table-body').addEventListener('scroll', (e) => {
+    const el = e.target;
+    if (el.scrollTop + el.clientHeight >= el.scrollHeight - 200 && modList.ids.size < modList.total) {
+        loadModsPage(true);
+    }
+});
+
+let modSearchTimer = null;
+document.getElementById('mod-search').oninput = (e) => {
+    clearTimeout(modSearchTimer);
+    modSearchTimer = setTimeout(() => {
+        modList.params.search = e.target.value;
+        loadMods();
+    }, 200);
+};
+
+document.getElementById('mod-type-filter').onchange = (e) => {
+    modList.params.type = e.target.value;
+    loadMods();
+};
+
 // 3. Импорт мода (Import Flow)
 document.getElementById('btn-add-mod').onclick = async () => {
     View.setLoading(true, "Выбор архива..."); // Изменяем текст
@@ -166,12 +233,12 @@ document.getElementById('btn-confirm-import').onclick = async () => {
     if (currentPreviewData) {
         View.setLoading(true);
         // ШАГ 2: Финальная установка
-        const success = await pywebview.api.import_mod_step2(currentPreviewData);
+        const success = await pywebview.api.import_mod_step2(currentPreviewData.temp_id);
         View.setLoading(false);
 
         if (success) {
             currentPreviewData = null;
-            loadMods(); // Обновляем таблицу
+            refreshModChanges(); // Обновляем таблицу
         }
     }
 };
@@ -193,7 +260,7 @@ window.toggleMod = async (modId) => {
     View.setLoading(false);
 
     if (result.status === 'success') {
-        loadMods(); // Перезагружаем таблицу
+        refreshModChanges(); // Перерисовываем только измененные строки
     } else {
         alert("Ошибка: " + result.message);
     }
@@ -456,6 +523,31 @@ window.deleteMod = async (modId) => {
     }
 };
 
+window.updateMod = async (modId) => {
+    View.setLoading(true, "Выбор архива новой версии...");
+    const preview = await pywebview.api.update_mod_step1(modId);
+    View.setLoading(false);
+    if (!preview) return;
+
+    const d = preview.diff;
+    const changed = d.changed + d.unknown;
+    if (!confirm(`Обновление мода "${preview.mod_name}":\n\nНовых файлов: ${d.added}\nИзмененных: ${changed}\nУдаленных: ${d.removed}\nБез изменений: ${d.unchanged}\n\nПрименить?`)) {
+        await pywebview.api.cancel_import(preview.temp_id);
+        return;
+    }
+
+    View.setLoading(true, "Обновление мода...");
+    const result = await pywebview.api.update_mod_step2(preview.temp_id);
+    View.setLoading(false);
+
+    if (result.status === 'success') {
+        View.addLog(result.message, 'success');
+        refreshModChanges();
+    } else {
+        View.addLog("Ошибка обновления: " + result.message, 'error');
+    }
+};
+
 document.getElementById('btn-uninstall-hofs').onclick = async () => {
     if (!confirm("Вы уверены?\nЭто удалит все HOF файлы, добавленные через менеджер, и восстановит оригинальные файлы (если они были).")) {
         return;
@@ -27,6 +27,8 @@ const Locales = {
         "th_date": "Date",
         "th_status": "Status",
         "th_actions": "Actions",
+        "filter_all_types": "All types",
+        "ph_search_mods": "Search mods...",
 
         // Empty State
         "empty_title": "Library is Empty",
@@ -95,6 +97,8 @@ const Locales = {
         "th_date": "Дата",
         "th_status": "Статус",
         "th_actions": "Действия",
+        "filter_all_types": "Все типы",
+        "ph_search_mods": "Поиск модов...",
 
         // Empty State
         "empty_title": "Библиотека пуста",
@@ -19,6 +19,7 @@ const View = {
         document.querySelectorAll('input[placeholder]').forEach(el => {
             // Простая проверка, можно улучшить data-i18n-placeholder
             if (el.id.includes('path-input')) el.placeholder = Locales[lang]['ph_select'];
+            if (el.id === 'mod-search') el.placeholder = Locales[lang]['ph_search_mods'];
         });
 
         // 3. Активность кнопок языка
@@ -88,64 +89,82 @@ const View = {
     },
 
     // --- Таблица модов (Grid Layout) ---
-    renderModList: (mods) => {
+    // append=true — следующая страница дописывается к уже показанным строкам
+    renderModList: (mods, total, append = false) => {
         const container = document.getElementById('mod-table-body');
         const emptyState = document.getElementById('empty-state');
-        container.innerHTML = '';
+        if (!append) container.innerHTML = '';
 
-        if (!mods || mods.length === 0) {
+        if (!total) {
             emptyState.classList.remove('hidden');
             return;
         }
         emptyState.classList.add('hidden');
 
-        mods.forEach(mod => {
-            const row = document.createElement('div');
-            row.className = 'grid grid-cols-12 gap-4 items-center p-3 bg-[#1a1a1a] border border-[#333] rounded hover:border-[#555] hover:bg-[#202020] transition group animate-fade-in mb-2';
-
-            // Перевод Типов
-            let typeKey = 'type_unknown';
-            if (mod.type === 'bus') typeKey = 'type_bus';
-            if (mod.type === 'map') typeKey = 'type_map';
-            if (mod.type === 'scenery') typeKey = 'type_scenery';
-
-            const typeLabel = View.t(typeKey);
-
-            // Badge Colors
-            let typeBadge = `<span class="px-2 py-0.5 rounded text-[10px] font-bold uppercase tracking-wider bg-[#333] text-[#888] border border-[#444]">${typeLabel}</span>`;
-            if (mod.type === 'bus') typeBadge = `<span class="px-2 py-0.5 rounded text-[10px] font-bold uppercase tracking-wider bg-[#333] text-[#ff8128] border border-[#ff8128]/30">${typeLabel}</span>`;
-            if (mod.type === 'map') typeBadge = `<span class="px-2 py-0.5 rounded text-[10px] font-bold uppercase tracking-wider bg-[#333] text-purple-400 border border-purple-500/30">${typeLabel}</span>`;
+        const fragment = document.createDocumentFragment();
+        mods.forEach(mod => fragment.appendChild(View.createModRow(mod)));
+        container.appendChild(fragment);
+    },
 
-            // Status Indicator (Translated)
-            let statusHtml = mod.is_enabled
-                ? `<div class="flex items-center justify-center gap-2 text-[#22c55e] text-xs font-bold tracking-wider"><div class="w-2 h-2 rounded-full bg-[#22c55e] shadow-[0_0_10px_#22c55e]"></div> ${View.t('status_active')}</div>`
-                : `<div class="flex items-center justify-center gap-2 text-[#555] text-xs font-bold tracking-wider"><div class="w-2 h-2 rounded-full bg-[#333]"></div> ${View.t('status_off')}</div>`;
+    // Точечное обновление строки (дельта после переключения/импорта)
+    updateModRow: (mod) => {
+        const row = document.querySelector(`#mod-table-body [data-mod-id="${mod.id}"]`);
+        if (row) row.replaceWith(View.createModRow(mod));
+    },
 
-            // ... остальное создание HTML остается прежним ...
-            // (Кнопки toggleMod, deleteMod)
+    removeModRow: (modId) => {
+        const row = document.querySelector(`#mod-table-body [data-mod-id="${modId}"]`);
+        if (row) row.remove();
+    },
 
-            row.innerHTML = `
-                <div class="col-span-5 font-medium text-white flex items-center gap-3 pl-2 overflow-hidden">
-                    <i class="fas ${mod.type === 'bus' ? 'fa-bus' : mod.type === 'map' ? 'fa-map' : 'fa-box'} text-[#444] group-hover:text-[#ff8128] transition"></i>
-                    <span class="truncate">${mod.name}</span>
-                </div>
-                <div class="col-span-2 text-center">${typeBadge}</div>
-                <div class="col-span-2 text-center text-[#666] text-xs font-mono">${mod.date}</div>
-                <div class="col-span-2 text-center">${statusHtml}</div>
-                <div class="col-span-1 text-right flex justify-end gap-2 pr-2">
-                    <button onclick="toggleMod(${mod.id})" class="w-8 h-8 rounded flex items-center justify-center transition ${mod.is_enabled ? 'text-[#22c55e] bg-[#22c55e]/10' : 'text-[#888] hover:text-white bg-[#222]'}" title="Toggle">
-                        <i class="fas fa-power-off"></i>
-                    </button>
-                    <button onclick="deleteMod(${mod.id})" class="w-8 h-8 rounded flex items-center justify-center text-[#555] hover:text-red-500 hover:bg-red-500/10 transition" title="Delete">
-                        <i class="fas fa-trash"></i>
-                    </button>
-                </div>
-            `;
-            container.appendChild(row);
-        });
+    createModRow: (mod) => {
+        const row = document.createElement('div');
+        row.dataset.modId = mod.id;
+        row.className = 'grid grid-cols-12 gap-4 items-center p-3 bg-[#1a1a1a] border border-[#333] rounded hover:border-[#555] hover:bg-[#202020] transition group animate-fade-in mb-2';
+
+        // Перевод Типов
+        let typeKey = 'type_unknown';
+        if (mod.type === 'bus') typeKey = 'type_bus';
+        if (mod.type === 'map') typeKey = 'type_map';
+        if (mod.type === 'scenery') typeKey = 'type_scenery';
+
+        const typeLabel = View.t(typeKey);
+
+        // Badge Colors
+        let typeBadge = `<span class="px-2 py-0.5 rounded text-[10px] font-bold uppercase tracking-wider bg-[#333] text-[#888] border border-[#444]">${typeLabel}</span>`;
+        if (mod.type === 'bus') typeBadge = `<span class="px-2 py-0.5 rounded text-[10px] font-bold uppercase tracking-wider bg-[#333] text-[#ff8128] border border-[#ff8128]/30">${typeLabel}</span>`;
+        if (mod.type === 'map') typeBadge = `<span class="px-2 py-0.5 rounded text-[10px] font-bold uppercase tracking-wider bg-[#333] text-purple-400 border border-purple-500/30">${typeLabel}</span>`;
+
+        // Status Indicator (Translated)
+        let statusHtml = mod.is_enabled
+            ? `<div class="flex items-center justify-center gap-2 text-[#22c55e] text-xs font-bold tracking-wider"><div class="w-2 h-2 rounded-full bg-[#22c55e] shadow-[0_0_10px_#22c55e]"></div> ${View.t('status_active')}</div>`
+            : `<div class="flex items-center justify-center gap-2 text-[#555] text-xs font-bold tracking-wider"><div class="w-2 h-2 rounded-full bg-[#333]"></div> ${View.t('status_off')}</div>`;
+
+        row.innerHTML = `
+            <div class="col-span-5 font-medium text-white flex items-center gap-3 pl-2 overflow-hidden">
+                <i class="fas ${mod.type === 'bus' ? 'fa-bus' : mod.type === 'map' ? 'fa-map' : 'fa-box'} text-[#444] group-hover:text-[#ff8128] transition"></i>
+                <span class="truncate">${mod.name}</span>
+            </div>
+            <div class="col-span-2 text-center">${typeBadge}</div>
+            <div class="col-span-2 text-center text-[#666] text-xs font-mono">${mod.date}</div>
+            <div class="col-span-2 text-center">${statusHtml}</div>
+            <div class="col-span-1 text-right flex justify-end gap-2 pr-2">
+                <button onclick="toggleMod(${mod.id})" class="w-8 h-8 rounded flex items-center justify-center transition ${mod.is_enabled ? 'text-[#22c55e] bg-[#22c55e]/10' : 'text-[#888] hover:text-white bg-[#222]'}" title="Toggle">
+                    <i class="fas fa-power-off"></i>
+                </button>
+                <button onclick="updateMod(${mod.id})" class="w-8 h-8 rounded flex items-center justify-center text-[#555] hover:text-[#ff8128] hover:bg-[#ff8128]/10 transition" title="Update">
+                    <i class="fas fa-sync-alt"></i>
+                </button>
+                <button onclick="deleteMod(${mod.id})" class="w-8 h-8 rounded flex items-center justify-center text-[#555] hover:text-red-500 hover:bg-red-500/10 transition" title="Delete">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </div>
+        `;
+        return row;
     },
 
     // --- Окно проверки (Review Modal) ---
+    // Раскладка файлов остается в Python: приходит сводка по папкам, папки раскрываются по клику
     showReviewModal: (data) => {
         document.getElementById('review-mod-name').innerText = data.mod_name;
         document.getElementById('review-mod-type').innerText = data.type;
@@ -155,37 +174,91 @@ const View = {
 
         document.getElementById('unmapped-panel').classList.add('hidden');
 
-        // Reset styles for full width
-        // const rightPanel = document.getElementById('mapped-list').parentElement;
-        // rightPanel.parentElement.classList.remove('md:flex-row'); // remove flex row if needed logic
+        const total = document.createElement('div');
+        total.className = 'p-2 text-xs font-mono text-[#666] border-b border-[#222]';
+        total.innerText = `${data.total_files} files, ${(data.total_bytes / 1024 / 1024).toFixed(1)} MB`;
+        mappedContainer.appendChild(total);
 
-        let html = '';
-        data.mapped_files.forEach(f => {
-            let color = 'text-[#aaa]'; // Default source
-            let targetColor = 'text-[#22c55e]'; // Green
-            let icon = '<i class="fas fa-arrow-right text-[10px] mx-2 opacity-30"></i>';
-            let targetText = f.target;
+        View.renderPreviewLevel(mappedContainer, data.temp_id,
+            {folders: data.folders, files: [], total_files: 0, offset: 0, path: ''}, 0);
+        document.getElementById('review-modal').classList.remove('hidden');
+    },
 
-            if (f.status === 'addon') {
-                targetColor = 'text-yellow-500'; // Addon dir
-            }
+    renderPreviewLevel: (container, tempId, level, depth) => {
+        const indent = `${depth * 16 + 8}px`;
+
+        level.folders.forEach(folder => {
+            const row = document.createElement('div');
+            row.className = 'flex items-center p-2 hover:bg-[#222] border-b border-[#222] text-xs font-mono transition cursor-pointer';
+            row.style.paddingLeft = indent;
+
+            const badges = Object.entries(folder.statuses).map(([status, count]) => {
+                const color = status === 'hof' ? 'text-[#ff8128]' : (status === 'addon' ? 'text-yellow-500' : 'text-[#22c55e]');
+                return `<span class="${color} ml-2">${status}: ${count}</span>`;
+            }).join('');
+            row.innerHTML = `
+                <i class="fas fa-chevron-right text-[10px] w-4 text-[#555] transition"></i>
+                <i class="fas fa-folder text-[#555] mr-2"></i>
+                <span class="folder-name text-[#ccc] flex-1 break-all"></span>
+                <span class="text-[#555]">${folder.files}</span>${badges}`;
+            row.querySelector('.folder-name').innerText = folder.path === '_hofs' ? '[ HOF LIBRARY ]' : folder.name;
+
+            const children = document.createElement('div');
+            children.className = 'hidden';
+            row.onclick = async () => {
+                const caret = row.querySelector('.fa-chevron-right');
+                if (!children.dataset.loaded) {
+                    children.dataset.loaded = '1';
+                    const sub = await pywebview.api.preview_folder(tempId, folder.path, 0);
+                    if (sub) View.renderPreviewLevel(children, tempId, sub, depth + 1);
+                }
+                children.classList.toggle('hidden');
+                caret.classList.toggle('rotate-90');
+            };
+
+            container.appendChild(row);
+            container.appendChild(children);
+        });
+
+        View.appendPreviewFiles(container, tempId, level, depth);
+    },
 
+    appendPreviewFiles: (container, tempId, level, depth) => {
+        level.files.forEach(f => {
+            let targetColor = 'text-[#22c55e]'; // Green
+            let targetText = f.target;
+            if (f.status === 'addon') targetColor = 'text-yellow-500'; // Addon dir
             if (f.status === 'hof') {
                 targetColor = 'text-[#ff8128] font-bold';
                 targetText = '[ HOF LIBRARY ]';
             }
 
-            html += `
-            <div class="flex items-center p-2 hover:bg-[#222] border-b border-[#222] text-xs font-mono transition">
-                <div class="w-1/2 break-all text-[#666] pl-2">${f.source}</div>
+            const row = document.createElement('div');
+            row.className = 'flex items-center p-2 hover:bg-[#222] border-b border-[#222] text-xs font-mono transition';
+            row.style.paddingLeft = `${depth * 16 + 24}px`;
+            row.innerHTML = `
+                <div class="w-1/2 break-all text-[#666] pl-2 src"></div>
                 <div class="w-1/2 break-all ${targetColor} flex items-center">
-                   ${icon} ${targetText}
-                </div>
-            </div>`;
+                   <i class="fas fa-arrow-right text-[10px] mx-2 opacity-30"></i> <span class="dst"></span>
+                </div>`;
+            row.querySelector('.src').innerText = f.source;
+            row.querySelector('.dst').innerText = targetText;
+            container.appendChild(row);
         });
 
-        mappedContainer.innerHTML = html;
-        document.getElementById('review-modal').classList.remove('hidden');
+        const shown = level.offset + level.files.length;
+        if (shown < level.total_files) {
+            const more = document.createElement('div');
+            more.className = 'p-2 text-xs font-mono text-[#ff8128] hover:bg-[#222] cursor-pointer border-b border-[#222]';
+            more.style.paddingLeft = `${depth * 16 + 24}px`;
+            more.innerText = `... ${level.total_files - shown} more`;
+            more.onclick = async () => {
+                more.remove();
+                const next = await pywebview.api.preview_folder(tempId, level.path, shown);
+                if (next) View.appendPreviewFiles(container, tempId, next, depth);
+            };
+            container.appendChild(more);
+        }
     },
 
     hideReviewModal: () => {